@@ -0,0 +1,111 @@
+"""
+基于asyncio的数据报传输
+
+由事件循环接管连接的套接字，收到数据报后解码（含分片重组）并交给消息处理函数，
+发送时通过事件循环的数据报传输写出，所有套接字共用一个事件循环，不再需要每个套接字一个线程
+"""
+import asyncio
+import logging
+from typing import Tuple, Union
+
+from communication.multicast_connection import Connection, MulticastServer, MulticastClient, MessageHandler
+from communication.udp_connection import UdpServer, UdpClient
+
+
+class DatagramEndpoint(asyncio.DatagramProtocol):
+    """
+    异步数据报端点
+    """
+
+    # 连接
+    __connection: Connection = None
+
+    # 消息处理函数
+    __handler: MessageHandler = None
+
+    def __init__(self, connection: Connection, handler: MessageHandler):
+        """
+        初始化
+        :param connection: 连接
+        :param handler: 消息处理函数
+        """
+        self.__connection = connection
+        self.__handler = handler
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        """
+        事件循环接管套接字后，连接的发送改为通过传输写出
+        :param transport:
+        :return:
+        """
+        self.__connection.attach_transport(transport)
+
+    def datagram_received(self, data: bytes, address: Union[Tuple[str, int], str]):
+        """
+        收到数据报
+        :param data: 数据报
+        :param address: 来源地址
+        :return:
+        """
+        try:
+            completed, msg = self.__connection.feed(data, address)
+            if completed:
+                self.__handler(msg, address)
+        except Exception as e:
+            logging.warning(f"连接{self.__connection.name}处理来自{address}的数据异常：{e}")
+
+    def error_received(self, exc: Exception):
+        """
+        发送或接收出错
+        :param exc:
+        :return:
+        """
+        logging.warning(f"连接{self.__connection.name}传输异常：{exc}")
+
+    def connection_lost(self, exc: Exception):
+        """
+        传输关闭
+        :param exc:
+        :return:
+        """
+        self.__connection.attach_transport(None)
+
+
+class AsyncConnection:
+    """
+    异步连接
+    """
+
+    async def open(self: Connection, handler: MessageHandler) -> asyncio.DatagramTransport:
+        """
+        由当前事件循环接管套接字
+        :param handler: 消息处理函数
+        :return: 数据报传输
+        """
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: DatagramEndpoint(self, handler), sock=self.raw_socket)
+        return transport
+
+
+class AsyncMulticastServer(AsyncConnection, MulticastServer):
+    """
+    异步组播器
+    """
+
+
+class AsyncMulticastClient(AsyncConnection, MulticastClient):
+    """
+    异步组播客户端
+    """
+
+
+class AsyncUdpServer(AsyncConnection, UdpServer):
+    """
+    异步UDP服务端
+    """
+
+
+class AsyncUdpClient(AsyncConnection, UdpClient):
+    """
+    异步UDP客户端
+    """
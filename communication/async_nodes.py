@@ -0,0 +1,283 @@
+"""
+基于asyncio的节点
+
+节点的所有套接字与定时器都运行在同一个事件循环中，消息处理与定时任务复用同步节点的实现；
+读写配置仓储等阻塞的文件操作在节点的阻塞任务线程中执行，不阻塞事件循环中的数据报处理。
+主节点的配置拉取TCP服务端仍以线程方式运行（见TcpServer.serve），组播消息默认在事件循环中直接处理，不启动工作队列线程。
+需要在事件循环中启动：
+
+    async def main():
+        node = AsyncMasterNode(AsyncMulticastServer(...), AsyncUdpServer(...), ...)
+        node.start()
+        await node.wait_closed()
+
+    asyncio.run(main())
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from communication.async_connection import AsyncConnection, AsyncMulticastServer, AsyncMulticastClient, AsyncUdpServer, AsyncUdpClient
+from communication.message import MessagePackage
+from communication.multicast_connection import MessageHandler
+from communication.nodes import ServiceNode, SlaveNode, MasterNode
+from settings.repository import LocalNodeClientRepository, LocalSettingRepository
+
+
+class AsyncNode:
+    """
+    异步节点
+    """
+
+    # 运行中的任务
+    __tasks: List[asyncio.Task] = None
+
+    # 已打开的（连接, 数据报传输）
+    __transports: List[Tuple[AsyncConnection, asyncio.DatagramTransport]] = None
+
+    # 关闭事件
+    __closed: asyncio.Event = None
+
+    # 阻塞任务线程（单线程，阻塞的消息处理与定时任务按提交顺序执行）
+    __executor: ThreadPoolExecutor = None
+
+    def __init__(self):
+        """
+        初始化
+        """
+        self.__tasks = []
+        self.__transports = []
+        self.__closed = asyncio.Event()
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="async-blocking")
+
+    def _start_task(self, coroutine):
+        """
+        在当前事件循环中启动任务
+        :param coroutine:
+        :return:
+        """
+        self.__tasks.append(asyncio.get_running_loop().create_task(coroutine))
+
+    async def _open(self, connection: AsyncConnection, handler: MessageHandler):
+        """
+        由事件循环接管连接的套接字
+        :param connection: 连接
+        :param handler: 消息处理函数
+        :return:
+        """
+        self.__transports.append((connection, await connection.open(handler)))
+
+    def _in_executor(self, handler: MessageHandler) -> MessageHandler:
+        """
+        包装会阻塞的消息处理函数，收到的消息交给阻塞任务线程处理
+        :param handler: 消息处理函数
+        :return:
+        """
+        def submit(msg: MessagePackage, address):
+            future = asyncio.get_running_loop().run_in_executor(self.__executor, handler, msg, address)
+            future.add_done_callback(self.__log_exception)
+        return submit
+
+    @staticmethod
+    def __log_exception(future: asyncio.Future):
+        """
+        记录阻塞任务线程中消息处理的异常
+        :param future:
+        :return:
+        """
+        if not future.cancelled() and future.exception() is not None:
+            logging.warning(f"处理消息异常：{future.exception()}")
+
+    async def _repeat(self, tick: Callable[[], float], blocking: bool = False):
+        """
+        定时执行任务，任务返回距下次执行的秒数
+        :param tick: 任务
+        :param blocking: 任务是否会阻塞（为True时在阻塞任务线程中执行）
+        :return:
+        """
+        while self.running:
+            try:
+                delay = await asyncio.get_running_loop().run_in_executor(self.__executor, tick) if blocking else tick()
+            except Exception as e:
+                logging.warning(f"定时任务执行异常：{e}")
+                delay = 1
+            await asyncio.sleep(delay)
+
+    def _close_tasks(self):
+        """
+        取消任务并关闭传输，需在关闭连接的套接字之前调用
+        :return:
+        """
+        for task in self.__tasks:
+            task.cancel()
+        for connection, transport in self.__transports:
+            transport.close()
+            # 传输在下一轮事件循环中才释放套接字，立即恢复直接使用套接字发送，关闭时发出的消息不经过已关闭的传输
+            connection.attach_transport(None)
+        self.__tasks.clear()
+        self.__transports.clear()
+        self.__executor.shutdown(wait=False)
+        self.__closed.set()
+
+    async def wait_closed(self):
+        """
+        等待节点关闭
+        :return:
+        """
+        await self.__closed.wait()
+
+
+class AsyncServiceNode(AsyncNode, ServiceNode):
+    """
+    异步服务节点
+    """
+
+    # UDP客户端
+    __udp_client: AsyncUdpClient = None
+
+    def __init__(self, udp_client: AsyncUdpClient, **kwargs):
+        """
+        初始化
+        :param udp_client:
+        """
+        AsyncNode.__init__(self)
+        ServiceNode.__init__(self, udp_client, **kwargs)
+        self.__udp_client = udp_client
+
+    def _run(self):
+        """
+        在当前事件循环中运行接收与心跳
+        :return:
+        """
+        self._start_task(self.__serve())
+
+    async def __serve(self):
+        """
+        运行
+        :return:
+        """
+        await self._open(self.__udp_client, self._handle_message)
+        await self._repeat(self._heartbeat)
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        self._close_tasks()
+        ServiceNode.close(self)
+
+
+class AsyncSlaveNode(AsyncNode, SlaveNode):
+    """
+    异步从节点
+    """
+
+    # 组播代理端
+    __multicast_client: AsyncMulticastClient = None
+
+    # UDP服务端
+    __udp_server: AsyncUdpServer = None
+
+    def __init__(self, multicast_client: AsyncMulticastClient, udp_server: AsyncUdpServer, *args, **kwargs):
+        """
+        初始化
+        :param multicast_client: 组播代理端
+        :param udp_server: UDP服务端
+        """
+        AsyncNode.__init__(self)
+        self.__multicast_client = multicast_client or AsyncMulticastClient()
+        self.__udp_server = udp_server
+        SlaveNode.__init__(self, self.__multicast_client, udp_server, *args, **kwargs)
+
+    def _run(self):
+        """
+        在当前事件循环中运行组播接收、握手或心跳发送与本地UDP接收
+        :return:
+        """
+        self._start_task(self.__serve())
+
+    async def __serve(self):
+        """
+        运行
+        :return:
+        """
+        await self._open(self.__multicast_client, self._handle_multicast_message)
+        # 模块组播组的接收端需为AsyncMulticastServer
+        for connection in self._group_connections():
+            await self._open(connection, self._handle_multicast_message)
+        await self._open(self.__udp_server, self._handle_local_message)
+        self._start_task(self._repeat(self._expire_connections))
+        for connection in self._reliable_connections():
+            self._start_task(self._repeat(connection.retransmit))
+        await self._repeat(self._handshake_or_heartbeat)
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        self._close_tasks()
+        SlaveNode.close(self)
+
+
+class AsyncMasterNode(AsyncNode, MasterNode):
+    """
+    异步主节点
+    """
+
+    # 组播器
+    __multicast_server: AsyncMulticastServer = None
+
+    # UDP服务端
+    __udp_server: AsyncUdpServer = None
+
+    def __init__(self, multicast_server: AsyncMulticastServer, udp_server: AsyncUdpServer,
+                 node_client_repository: LocalNodeClientRepository,
+                 local_setting_repository: LocalSettingRepository, **kwargs):
+        """
+        初始化
+        :param multicast_server: 组播服务端
+        :param udp_server: UDP服务端
+        :param node_client_repository: 节点代理端仓储
+        :param local_setting_repository: 本地配置仓储
+        :param kwargs: 同MasterNode
+        """
+        AsyncNode.__init__(self)
+        MasterNode.__init__(self, multicast_server, udp_server, node_client_repository, local_setting_repository, **kwargs)
+        self.__multicast_server = multicast_server
+        self.__udp_server = udp_server
+
+    def _run(self):
+        """
+        在当前事件循环中运行组播接收、定期广播与UDP服务端监听，配置拉取的TCP服务端仍以线程方式运行；
+        配置变更通知与定期广播读取配置仓储，在阻塞任务线程中执行
+        :return:
+        """
+        self._start_task(self.__serve())
+        self._start_tcp_server()
+
+    async def __serve(self):
+        """
+        运行
+        :return:
+        """
+        await self._open(self.__multicast_server, self._dispatch_multicast_message)
+        await self._open(self.__udp_server, self._in_executor(self._handle_udp_message))
+        self._start_task(self._repeat(self._expire_connections))
+        for connection in self._reliable_connections():
+            self._start_task(self._repeat(connection.retransmit))
+        for connection in self._paced_connections():
+            self._start_task(self._repeat(connection.flush))
+        if self.cluster:
+            self._start_task(self._repeat(self._master_heartbeat))
+        await self._repeat(self._broadcast_configuration_change, blocking=True)
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        self._close_tasks()
+        MasterNode.close(self)
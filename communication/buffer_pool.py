@@ -0,0 +1,64 @@
+import collections
+from typing import Deque
+
+
+class BufferPool:
+    """
+    接收缓冲区池
+
+    预先分配固定大小的缓冲区，接收数据时借出，解码完成后归还，避免每个数据报都重新分配内存
+    """
+
+    # 缓冲区大小
+    __buffer_size: int = None
+
+    # 池中最多保留的缓冲区数量
+    __capacity: int = None
+
+    # 空闲缓冲区
+    __buffers: Deque[bytearray] = None
+
+    def __init__(self, buffer_size: int = 2000, capacity: int = 4):
+        """
+        初始化
+        :param buffer_size: 缓冲区大小
+        :param capacity: 池中最多保留的缓冲区数量
+        """
+        self.__buffer_size = buffer_size
+        self.__capacity = capacity
+        self.__buffers = collections.deque()
+
+    @property
+    def buffer_size(self) -> int:
+        """
+        获取缓冲区大小
+        :return:
+        """
+        return self.__buffer_size
+
+    @property
+    def idle_count(self) -> int:
+        """
+        获取空闲缓冲区数量
+        :return:
+        """
+        return len(self.__buffers)
+
+    def acquire(self) -> bytearray:
+        """
+        借出缓冲区，池为空时新建
+        :return:
+        """
+        try:
+            return self.__buffers.pop()
+        except IndexError:
+            return bytearray(self.__buffer_size)
+
+    def release(self, buffer: bytearray):
+        """
+        归还缓冲区，池已满时直接丢弃
+        :param buffer: 缓冲区
+        :return:
+        """
+        if len(buffer) == self.__buffer_size and len(self.__buffers) < self.__capacity:
+            self.__buffers.append(buffer)
@@ -0,0 +1,324 @@
+"""
+消息编解码器
+
+1、JSON编解码器（兼容旧版本节点，作为协商失败时的回退方案）
+2、二进制编解码器（固定结构的消息头 + 二进制消息体，配置版本列表按列编码）
+"""
+import abc
+import json
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+
+from communication.fragment import Fragmenter
+from communication.message import MessagePackage, MessageType
+
+# 可解码的数据类型
+Data = Union[bytes, bytearray, memoryview]
+
+
+class MessageCodec(metaclass=abc.ABCMeta):
+    """
+    消息编解码器
+    """
+
+    # 编解码器名称
+    name: str = None
+
+    @abc.abstractmethod
+    def encode(self, message_package: MessagePackage, sender: str = None) -> bytes:
+        """
+        编码
+        :param message_package: 消息包
+        :param sender: 消息发送者
+        :return:
+        """
+        pass
+
+    @abc.abstractmethod
+    def decode(self, data: Data) -> MessagePackage:
+        """
+        解码
+        :param data: 数据
+        :return:
+        """
+        pass
+
+    @abc.abstractmethod
+    def match(self, data: Data) -> bool:
+        """
+        判断数据是否为此编解码器的格式
+        :param data: 数据
+        :return:
+        """
+        pass
+
+
+class JsonCodec(MessageCodec):
+    """
+    JSON编解码器
+    """
+
+    name = "json"
+
+    def encode(self, message_package: MessagePackage, sender: str = None) -> bytes:
+        """
+        编码
+        :param message_package: 消息包
+        :param sender: 消息发送者
+        :return:
+        """
+        return message_package.to_json(sender)
+
+    def decode(self, data: Data) -> MessagePackage:
+        """
+        解码
+        :param data: 数据
+        :return:
+        """
+        return MessagePackage.from_json(str(data, "utf-8"))
+
+    def match(self, data: Data) -> bool:
+        """
+        JSON数据以“{”开头
+        :param data: 数据
+        :return:
+        """
+        return len(data) > 0 and data[0] == 0x7B
+
+
+class BinaryCodec(MessageCodec):
+    """
+    二进制编解码器
+
+    消息头（大端）：魔数(1) + 版本(1) + 消息类型(1) + 发送者长度(2) + 接收者长度(2)
+    随后依次为发送者、接收者（UTF-8）与消息体，消息内容为空时消息体不占字节。
+
+    消息体以类型(1)开头：
+    0：紧凑JSON
+    1：配置版本列表按列编码，数量(4) + 各版本的类型(每个1字节) + 字符串长度(4) + 以NUL分隔的名称与版本（UTF-8，先全部名称后全部版本），
+       其余字段为紧凑JSON。配置变更与广播消息的主体是配置版本列表，按列编码省去每个版本的键名与引号，
+       编解码只需一次字符串拼接与拆分，不逐个字符解析JSON
+    """
+
+    name = "binary"
+
+    # 魔数
+    MAGIC = 0xC7
+
+    # 协议版本
+    VERSION = 1
+
+    # 消息头结构
+    HEADER = struct.Struct("!BBBHH")
+
+    # 消息体类型：紧凑JSON
+    BODY_JSON = 0
+
+    # 消息体类型：配置版本列表按列编码
+    BODY_VERSIONS = 1
+
+    # 配置版本数量与字符串长度
+    COUNT = struct.Struct("!I")
+
+    # 空值长度标识（用于区分None与空字符串）
+    NONE_LENGTH = 0xFFFF
+
+    # 消息体编码器（复用实例，避免每次编码重新构造）
+    __body_encoder: json.JSONEncoder = json.JSONEncoder(separators=(",", ":"))
+
+    # 消息类型索引
+    __message_types: Dict[int, MessageType] = {message_type.value: message_type for message_type in MessageType}
+
+    def encode(self, message_package: MessagePackage, sender: str = None) -> bytes:
+        """
+        编码
+        :param message_package: 消息包
+        :param sender: 消息发送者
+        :return:
+        """
+        sender = message_package.sender if sender is None else sender
+        sender_data = sender.encode("utf-8") if sender is not None else b""
+        receiver_data = message_package.receiver.encode("utf-8") if message_package.receiver is not None else b""
+        if len(sender_data) >= self.NONE_LENGTH or len(receiver_data) >= self.NONE_LENGTH:
+            raise ValueError("消息发送者或接收者过长")
+        content = message_package.message_content
+        body = self.__encode_body(content) if content is not None else b""
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, message_package.message_type.value,
+                                  len(sender_data) if sender is not None else self.NONE_LENGTH,
+                                  len(receiver_data) if message_package.receiver is not None else self.NONE_LENGTH)
+        return b"".join((header, sender_data, receiver_data, body))
+
+    def decode(self, data: Data) -> MessagePackage:
+        """
+        解码
+        :param data: 数据
+        :return:
+        """
+        view = memoryview(data)
+        magic, version, message_type, sender_length, receiver_length = self.HEADER.unpack_from(view)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"不支持的二进制消息版本：{version}")
+        offset = self.HEADER.size
+        sender = None
+        if sender_length != self.NONE_LENGTH:
+            sender = str(view[offset:offset + sender_length], "utf-8")
+            offset += sender_length
+        receiver = None
+        if receiver_length != self.NONE_LENGTH:
+            receiver = str(view[offset:offset + receiver_length], "utf-8")
+            offset += receiver_length
+        content = None
+        if offset < len(view):
+            content = self.__decode_body(view[offset:])
+        return MessagePackage(self.__message_types[message_type], content, receiver, sender)
+
+    def __encode_body(self, content) -> bytes:
+        """
+        编码消息体，配置版本列表按列编码，不符合列格式时整体编码为JSON
+        :param content: 消息内容
+        :return:
+        """
+        versions = content.get("versions") if isinstance(content, dict) else None
+        if isinstance(versions, list) and versions:
+            try:
+                names, version_values, types = [], [], bytearray()
+                for version in versions:
+                    if len(version) != 3:
+                        raise ValueError("配置版本包含其他字段")
+                    names.append(version["name"])
+                    version_values.append(version["version"])
+                    types.append(version["type"])
+                strings = "\0".join(names + version_values)
+                if strings.count("\0") != 2 * len(versions) - 1:
+                    raise ValueError("配置版本包含NUL字符")
+            except (KeyError, TypeError, ValueError):
+                pass
+            else:
+                strings_data = strings.encode("utf-8")
+                rest = self.__body_encoder.encode({key: value for key, value in content.items() if key != "versions"}).encode("utf-8")
+                return b"".join((bytes((self.BODY_VERSIONS,)), self.COUNT.pack(len(versions)), types,
+                                 self.COUNT.pack(len(strings_data)), strings_data, rest))
+        return bytes((self.BODY_JSON,)) + self.__body_encoder.encode(content).encode("utf-8")
+
+    def __decode_body(self, view: memoryview):
+        """
+        解码消息体
+        :param view: 消息体
+        :return: 消息内容
+        """
+        if view[0] == self.BODY_JSON:
+            return json.loads(str(view[1:], "utf-8"))
+        if view[0] != self.BODY_VERSIONS:
+            raise ValueError(f"不支持的二进制消息体类型：{view[0]}")
+        count, = self.COUNT.unpack_from(view, 1)
+        offset = 1 + self.COUNT.size
+        types = bytes(view[offset:offset + count])
+        offset += count
+        length, = self.COUNT.unpack_from(view, offset)
+        offset += self.COUNT.size
+        strings = str(view[offset:offset + length], "utf-8").split("\0")
+        if len(strings) != 2 * count or len(types) != count:
+            raise ValueError("配置版本列表长度不一致")
+        content = json.loads(str(view[offset + length:], "utf-8"))
+        content["versions"] = [{"name": name, "version": version, "type": version_type}
+                               for name, version, version_type in zip(strings[:count], strings[count:], types)]
+        return content
+
+    def match(self, data: Data) -> bool:
+        """
+        二进制数据以魔数开头
+        :param data: 数据
+        :return:
+        """
+        return len(data) > 0 and data[0] == self.MAGIC
+
+
+class PreparedMessage:
+    """
+    预编码消息
+
+    按（编解码器, 发送者, 数据报大小）缓存编码并分片后的数据报，同一消息发送到多个地址时只编码一次
+    """
+
+    # 消息包
+    __message_package: MessagePackage = None
+
+    # 已编码的数据报
+    __datagrams: Dict[Tuple[str, str, int], List[bytes]] = None
+
+    def __init__(self, message_package: MessagePackage):
+        """
+        初始化
+        :param message_package: 消息包
+        """
+        self.__message_package = message_package
+        self.__datagrams = {}
+
+    @property
+    def message_package(self) -> MessagePackage:
+        """
+        获取消息包
+        :return:
+        """
+        return self.__message_package
+
+    def get_datagrams(self, codec: MessageCodec, sender: str, fragmenter: Fragmenter) -> List[bytes]:
+        """
+        获取编码并分片后的数据报，首次获取时编码
+        :param codec: 编解码器
+        :param sender: 消息发送者
+        :param fragmenter: 分片器
+        :return:
+        """
+        key = (codec.name, sender, fragmenter.max_datagram_size)
+        datagrams = self.__datagrams.get(key)
+        if datagrams is None:
+            datagrams = fragmenter.split(codec.encode(self.__message_package, sender))
+            self.__datagrams[key] = datagrams
+        return datagrams
+
+
+JSON_CODEC = JsonCodec()
+
+BINARY_CODEC = BinaryCodec()
+
+# 已注册的编解码器
+CODECS: Dict[str, MessageCodec] = {codec.name: codec for codec in (BINARY_CODEC, JSON_CODEC)}
+
+# 本节点支持的编解码器（按优先级排序）
+SUPPORTED_CODECS: List[str] = [BINARY_CODEC.name, JSON_CODEC.name]
+
+
+def get_codec(name: Optional[str]) -> MessageCodec:
+    """
+    获取编解码器，未知名称回退到JSON编解码器
+    :param name: 编解码器名称
+    :return:
+    """
+    return CODECS.get(name, JSON_CODEC)
+
+
+def negotiate_codec(peer_codecs: Optional[List[str]], local_codecs: List[str] = None) -> str:
+    """
+    协商编解码器：按本节点的优先级选择双方都支持的编解码器，没有时回退到JSON
+    :param peer_codecs: 对端支持的编解码器
+    :param local_codecs: 本节点支持的编解码器
+    :return:
+    """
+    if peer_codecs:
+        for name in local_codecs or SUPPORTED_CODECS:
+            if name in peer_codecs and name in CODECS:
+                return name
+    return JSON_CODEC.name
+
+
+def decode_message(data: Data) -> MessagePackage:
+    """
+    根据数据格式自动选择编解码器解码
+    :param data: 数据
+    :return:
+    """
+    for codec in CODECS.values():
+        if codec.match(data):
+            return codec.decode(data)
+    raise ValueError("未知的消息格式")
@@ -1,7 +1,29 @@
 import socket
+import struct
 import threading
 import time
-from typing import Tuple, Union
+from typing import Callable, Dict, Hashable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from communication.timing_wheel import TimingWheel
+
+
+class PeerCredentials(NamedTuple):
+    """
+    本机对端进程的凭据
+    """
+
+    # 进程ID
+    pid: int
+
+    # 用户ID
+    uid: int
+
+    # 用户组ID
+    gid: int
+
+
+# 凭据的内存布局（struct ucred）
+PEER_CREDENTIALS_STRUCT = struct.Struct("3i")
 
 
 class ConnectionInfo:
@@ -37,6 +59,7 @@ class ConnectionInfo:
         self.__port = port
         self.__lock = kwargs.get("lock") or threading.Lock()
         self.__connection_ts = time.time()
+        self.__last_heartbeat_ts = self.__connection_ts
 
     @property
     def socket(self) -> socket:
@@ -68,7 +91,7 @@ class ConnectionInfo:
         获取连接地址
         :return:
         """
-        return self.__address, self.__port if self.__port > 0 else self.__address
+        return (self.__address, self.__port) if self.__port > 0 else self.__address
 
     @property
     def lock(self) -> threading.Lock:
@@ -123,10 +146,10 @@ class ConnectionInfo:
         :param address:
         :return:
         """
-        if isinstance(address, str):
-            return self.__address == address
-        elif isinstance(address, tuple):
+        if isinstance(address, tuple):
             return self.__address == address[0] and self.__port == address[1]
+        # 本机套接字的地址为路径或抽象地址（bytes）
+        return self.__address == address
 
     @staticmethod
     def from_address(address: Union[str, Tuple]):
@@ -137,3 +160,131 @@ class ConnectionInfo:
         """
         return ConnectionInfo(None, address[0], address[1]) if isinstance(address, tuple) else ConnectionInfo(None, address, 0)
 
+
+class ConnectionRegistry:
+    """
+    连接表
+
+    按键（地址或（地址, 端口号））索引连接信息，查找、添加与移除为O(1)；
+    遍历使用不可变的快照，广播与通知时不需要持有锁，快照只在连接增减后重建一次；
+    每次心跳在时间轮中重新调度连接的截止时间，超时未心跳的连接按时间轮的刻度移除
+    """
+
+    # 地址 -> 键
+    __key: Callable[[Union[str, Tuple]], Hashable] = None
+
+    # 键 -> 连接信息
+    __connections: Dict[Hashable, ConnectionInfo] = None
+
+    # 连接快照（连接增减后置空，下次遍历时重建）
+    __snapshot: Optional[Tuple[ConnectionInfo, ...]] = None
+
+    # 连接表锁
+    __lock: threading.Lock = None
+
+    # 心跳超时（秒）
+    __expire: float = 60 * 60
+
+    # 心跳超时时间轮
+    __timing_wheel: TimingWheel = None
+
+    def __init__(self, key: Callable[[Union[str, Tuple]], Hashable] = None, expire: float = 60 * 60, tick: float = 1.0):
+        """
+        初始化
+        :param key: 由地址生成键的函数，默认以完整地址为键
+        :param expire: 心跳超时（秒）
+        :param tick: 超时检查的精度（秒）
+        """
+        self.__key = key or (lambda address: address)
+        self.__connections = {}
+        self.__lock = threading.Lock()
+        self.__expire = expire
+        self.__timing_wheel = TimingWheel(tick)
+
+    @property
+    def tick(self) -> float:
+        """
+        获取超时检查的精度（秒），即调用remove_expired的间隔
+        :return:
+        """
+        return self.__timing_wheel.tick
+
+    def __len__(self) -> int:
+        return len(self.__connections)
+
+    def __iter__(self) -> Iterator[ConnectionInfo]:
+        return iter(self.snapshot())
+
+    def get(self, address: Union[str, Tuple]) -> Optional[ConnectionInfo]:
+        """
+        按地址查找连接信息
+        :param address: 地址
+        :return:
+        """
+        return self.__connections.get(self.__key(address))
+
+    def touch(self, address: Union[str, Tuple]) -> Tuple[ConnectionInfo, bool]:
+        """
+        更新连接的心跳时间，不存在时添加；键相同而地址不同时（如子节点重启后端口变化）替换为新的连接
+        :param address: 地址
+        :return: 连接信息，是否为新的连接
+        """
+        key = self.__key(address)
+        with self.__lock:
+            # 与超时移除在同一把锁中进行，刚心跳的连接不会被并发推进的时间轮移除
+            self.__timing_wheel.schedule(key, time.monotonic() + self.__expire)
+            connection_info = self.__connections.get(key)
+            if connection_info is not None and connection_info.equal(address):
+                connection_info.update_heartbeat_ts()
+                return connection_info, False
+            connection_info = self.__connections[key] = ConnectionInfo.from_address(address)
+            self.__snapshot = None
+            return connection_info, True
+
+    def remove(self, address: Union[str, Tuple]) -> Optional[ConnectionInfo]:
+        """
+        移除连接
+        :param address: 地址
+        :return: 移除的连接信息
+        """
+        key = self.__key(address)
+        with self.__lock:
+            self.__timing_wheel.cancel(key)
+            connection_info = self.__connections.pop(key, None)
+            if connection_info is not None:
+                self.__snapshot = None
+            return connection_info
+
+    def remove_expired(self) -> List[ConnectionInfo]:
+        """
+        推进时间轮，移除超时未心跳的连接（按刻度定期调用）
+        :return: 移除的连接信息
+        """
+        expired = []
+        with self.__lock:
+            # 取出到期的键与移除连接之间不能插入心跳，否则会移除刚刚重新调度的连接
+            for key in self.__timing_wheel.advance():
+                connection_info = self.__connections.pop(key, None)
+                if connection_info is not None:
+                    expired.append(connection_info)
+            if expired:
+                self.__snapshot = None
+        return expired
+
+    def snapshot(self) -> Tuple[ConnectionInfo, ...]:
+        """
+        获取连接快照，遍历快照不需要持有锁
+        :return:
+        """
+        snapshot = self.__snapshot
+        if snapshot is None:
+            with self.__lock:
+                snapshot = self.__snapshot = tuple(self.__connections.values())
+        return snapshot
+
+    def destinations(self) -> List[Union[str, Tuple[str, int]]]:
+        """
+        获取所有连接的地址
+        :return:
+        """
+        return [connection_info.socket_address for connection_info in self.snapshot()]
@@ -0,0 +1,234 @@
+"""
+数据报分片与重组
+
+超过单个数据报大小的消息在发送时拆分为多个分片，接收端按（来源地址, 消息ID）重组，
+未完成的消息超时后被淘汰，重组缓冲区占用的内存有上限
+"""
+import collections
+import itertools
+import logging
+import random
+import struct
+import time
+from typing import List, Optional, Tuple, Union, OrderedDict
+
+
+class Fragmenter:
+    """
+    分片器
+    """
+
+    # 魔数
+    MAGIC = 0xC8
+
+    # 分片协议版本
+    VERSION = 1
+
+    # 分片头：魔数(1) + 版本(1) + 消息ID(4) + 分片序号(2) + 分片总数(2)
+    HEADER = struct.Struct("!BBIHH")
+
+    # 单个数据报的最大字节数
+    __max_datagram_size: int = None
+
+    # 消息ID生成器
+    __message_ids: itertools.count = None
+
+    def __init__(self, max_datagram_size: int = 1400):
+        """
+        初始化
+        :param max_datagram_size: 单个数据报的最大字节数（含分片头）
+        """
+        if max_datagram_size <= self.HEADER.size:
+            raise ValueError("max_datagram_size is too small")
+        self.__max_datagram_size = max_datagram_size
+        # 随机起始，避免节点重启后与对端残留的未完成消息ID冲突
+        self.__message_ids = itertools.count(random.getrandbits(32))
+
+    @property
+    def max_datagram_size(self) -> int:
+        """
+        获取单个数据报的最大字节数
+        :return:
+        """
+        return self.__max_datagram_size
+
+    def split(self, data: bytes) -> List[bytes]:
+        """
+        拆分数据，不超过单个数据报大小时原样返回
+        :param data: 编码后的消息
+        :return:
+        """
+        if len(data) <= self.__max_datagram_size:
+            return [data]
+        chunk_size = self.__max_datagram_size - self.HEADER.size
+        count = (len(data) + chunk_size - 1) // chunk_size
+        if count > 0xFFFF:
+            raise ValueError(f"消息过大，无法分片：{len(data)}字节")
+        message_id = next(self.__message_ids) & 0xFFFFFFFF
+        view = memoryview(data)
+        return [self.HEADER.pack(self.MAGIC, self.VERSION, message_id, index, count) + view[index * chunk_size:(index + 1) * chunk_size]
+                for index in range(count)]
+
+    @classmethod
+    def is_fragment(cls, data) -> bool:
+        """
+        判断数据是否为分片
+        :param data:
+        :return:
+        """
+        return len(data) > cls.HEADER.size and data[0] == cls.MAGIC
+
+
+class _PendingMessage:
+    """
+    未完成重组的消息
+    """
+
+    __slots__ = ("fragments", "received", "size", "created_ts")
+
+    def __init__(self, count: int):
+        self.fragments: List[Optional[bytes]] = [None] * count
+        self.received = 0
+        self.size = 0
+        self.created_ts = time.monotonic()
+
+
+class FragmentReassembler:
+    """
+    分片重组器
+    """
+
+    # 未完成消息的超时时间（秒）
+    __timeout: float = None
+
+    # 最多同时重组的消息数量
+    __max_pending: int = None
+
+    # 重组缓冲区最多占用的字节数
+    __max_bytes: int = None
+
+    # 未完成的消息（按创建时间排序）
+    __pending: OrderedDict[Tuple, _PendingMessage] = None
+
+    # 当前占用的字节数
+    __pending_bytes: int = 0
+
+    # 已丢弃的消息（后续到达的分片直接忽略）
+    __dropped: OrderedDict[Tuple, float] = None
+
+    def __init__(self, timeout: float = 10, max_pending: int = 64, max_bytes: int = 4 * 1024 * 1024):
+        """
+        初始化
+        :param timeout: 未完成消息的超时时间（秒）
+        :param max_pending: 最多同时重组的消息数量
+        :param max_bytes: 重组缓冲区最多占用的字节数
+        """
+        self.__timeout = timeout
+        self.__max_pending = max_pending
+        self.__max_bytes = max_bytes
+        self.__pending = collections.OrderedDict()
+        self.__pending_bytes = 0
+        self.__dropped = collections.OrderedDict()
+
+    @property
+    def pending_count(self) -> int:
+        """
+        获取未完成的消息数量
+        :return:
+        """
+        return len(self.__pending)
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        获取当前占用的字节数
+        :return:
+        """
+        return self.__pending_bytes
+
+    def add(self, data, address: Union[Tuple[str, int], str]) -> Optional[bytes]:
+        """
+        添加分片
+        :param data: 分片数据
+        :param address: 来源地址
+        :return: 消息全部分片到齐时返回完整数据，否则返回None
+        """
+        _, version, message_id, index, count = Fragmenter.HEADER.unpack_from(data)
+        if version != Fragmenter.VERSION or index >= count:
+            logging.warning(f"丢弃来自{address}的无效分片")
+            return None
+        self.__evict_expired()
+        key = (address, message_id)
+        if key in self.__dropped:
+            return None
+        pending = self.__pending.get(key)
+        if pending is None:
+            if len(self.__pending) >= self.__max_pending:
+                self.__evict_oldest()
+            pending = _PendingMessage(count)
+            self.__pending[key] = pending
+        elif len(pending.fragments) != count:
+            logging.warning(f"丢弃来自{address}的消息{message_id}：分片总数不一致")
+            self.__drop(key)
+            return None
+        if pending.fragments[index] is None:
+            payload = bytes(data[Fragmenter.HEADER.size:])
+            # 超出内存上限时优先淘汰最早的未完成消息
+            while self.__pending_bytes + len(payload) > self.__max_bytes and next(iter(self.__pending)) != key:
+                self.__evict_oldest()
+            if self.__pending_bytes + len(payload) > self.__max_bytes:
+                logging.warning(f"丢弃来自{address}的消息{message_id}：超出重组缓冲区上限")
+                self.__drop(key)
+                return None
+            pending.fragments[index] = payload
+            pending.received += 1
+            pending.size += len(payload)
+            self.__pending_bytes += len(payload)
+        if pending.received == count:
+            self.__remove(key)
+            return b"".join(pending.fragments)
+        return None
+
+    def __remove(self, key: Tuple):
+        """
+        移除未完成的消息
+        :param key:
+        :return:
+        """
+        pending = self.__pending.pop(key)
+        self.__pending_bytes -= pending.size
+
+    def __drop(self, key: Tuple):
+        """
+        丢弃未完成的消息，并记录下来以忽略其后续分片
+        :param key:
+        :return:
+        """
+        self.__remove(key)
+        self.__dropped[key] = time.monotonic()
+        if len(self.__dropped) > self.__max_pending:
+            self.__dropped.popitem(last=False)
+
+    def __evict_oldest(self):
+        """
+        淘汰最早的未完成消息
+        :return:
+        """
+        key = next(iter(self.__pending))
+        logging.warning(f"淘汰未完成的分片消息{key}")
+        self.__drop(key)
+
+    def __evict_expired(self):
+        """
+        淘汰超时的未完成消息
+        :return:
+        """
+        expire_ts = time.monotonic() - self.__timeout
+        while self.__pending:
+            key, pending = next(iter(self.__pending.items()))
+            if pending.created_ts > expire_ts:
+                break
+            logging.warning(f"分片消息{key}重组超时")
+            self.__drop(key)
+        while self.__dropped and next(iter(self.__dropped.values())) <= expire_ts:
+            self.__dropped.popitem(last=False)
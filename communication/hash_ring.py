@@ -0,0 +1,104 @@
+"""
+一致性哈希环
+
+多个主节点组成环，每个主节点在环上放置若干虚拟节点，子节点按IP地址的哈希落在环上，顺时针遇到的第一个虚拟节点所属的主节点负责该子节点。
+主节点加入或退出时只有相邻区间的子节点更换主节点，其余子节点不受影响；虚拟节点使各主节点负责的子节点数量大致相同。
+"""
+import bisect
+import hashlib
+import threading
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+
+def hash_of(key: str) -> int:
+    """
+    获取键在环上的位置（各进程一致，不使用带随机盐的内置hash）
+    :param key: 键
+    :return:
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    一致性哈希环
+    """
+
+    # 每个成员的虚拟节点数量
+    __replicas: int = 64
+
+    # 成员
+    __members: FrozenSet[str] = frozenset()
+
+    # 虚拟节点的位置（从小到大排序）与所属的成员
+    __points: Tuple[List[int], List[str]] = ([], [])
+
+    # 环锁
+    __lock: threading.Lock = None
+
+    def __init__(self, members: Iterable[str] = (), replicas: int = 64):
+        """
+        初始化
+        :param members: 初始成员
+        :param replicas: 每个成员的虚拟节点数量
+        """
+        self.__replicas = replicas
+        self.__lock = threading.Lock()
+        self.__rebuild(frozenset(members))
+
+    @property
+    def members(self) -> FrozenSet[str]:
+        """
+        获取成员
+        :return:
+        """
+        return self.__members
+
+    def __len__(self) -> int:
+        return len(self.__members)
+
+    def add(self, member: str) -> bool:
+        """
+        添加成员
+        :param member: 成员
+        :return: 成员是否变化
+        """
+        with self.__lock:
+            if member in self.__members:
+                return False
+            self.__rebuild(self.__members | {member})
+            return True
+
+    def remove(self, member: str) -> bool:
+        """
+        移除成员
+        :param member: 成员
+        :return: 成员是否变化
+        """
+        with self.__lock:
+            if member not in self.__members:
+                return False
+            self.__rebuild(self.__members - {member})
+            return True
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        获取负责键的成员
+        :param key: 键
+        :return: 环为空时返回空
+        """
+        positions, owners = self.__points
+        if not positions:
+            return None
+        index = bisect.bisect(positions, hash_of(key))
+        return owners[index % len(owners)]
+
+    def __rebuild(self, members: FrozenSet[str]):
+        """
+        重新生成虚拟节点（查找时不加锁，整体替换位置与成员）
+        :param members: 成员
+        :return:
+        """
+        points = sorted((hash_of(f"{member}#{replica}"), member) for member in members for replica in range(self.__replicas))
+        self.__points = ([point[0] for point in points], [point[1] for point in points])
+        self.__members = members
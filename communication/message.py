@@ -1,7 +1,7 @@
 import json
 import pickle
 from enum import Enum
-from typing import Dict
+from typing import Dict, List
 
 
 class MessageType(Enum):
@@ -24,6 +24,14 @@ class MessageType(Enum):
     HEARTBEAT_RESPONSE = 6
     # 关闭（服务节点向子节点发送关闭消息）
     CONNECTION_CLOSE = 7
+    # 配置内容（主节点回复子节点的配置拉取请求）
+    CONFIGURATION_RESPONSE = 8
+    # 摘要请求（子节点向主节点请求摘要树节点的子节点摘要或桶内的配置版本）
+    DIGEST_REQUEST = 9
+    # 摘要回复（主节点回复子节点的摘要请求）
+    DIGEST_RESPONSE = 10
+    # 主节点心跳（多主节点模式下主节点向组播组广播自己的存活，组成一致性哈希环）
+    MASTER_HEARTBEAT = 11
 
 class MessagePackage:
     """
@@ -42,24 +50,27 @@ class MessagePackage:
     # 消息发送者
     __from: str = None
 
-    def __init__(self, message_type: MessageType, message_content: Dict=None, receiver: str=None):
+    def __init__(self, message_type: MessageType, message_content: Dict=None, receiver: str=None, sender: str=None):
         """
         初始化
         @param message_type: 消息类型
         @param message_content: 消息内容
+        @param receiver: 消息接收者
+        @param sender: 消息发送者
         """
         self.__message_type = message_type
         self.__message_content = message_content
         self.__to = receiver
+        self.__from = sender
 
     def to_data(self, sender) -> bytes:
         """
         转换为数据
         :return:
         """
-        msg = MessagePackage(self.__message_type, self.__message_content, self.__to)
-        msg.__from = sender
-        return pickle.dumps(msg.to_dict())
+        data = self.to_dict()
+        data["from"] = sender
+        return pickle.dumps(data)
 
     def to_dict(self) -> Dict:
         """
@@ -138,9 +149,7 @@ class MessagePackage:
         :param data:
         :return:
         """
-        message_package = MessagePackage(data["message_type"], data["message_content"], data["to"])
-        message_package.__from = data["from"]
-        return message_package
+        return MessagePackage(data["message_type"], data["message_content"], data["to"], data["from"])
 
     @staticmethod
     def from_json(json_str: str) -> "MessagePackage":
@@ -152,3 +161,29 @@ class MessagePackage:
         data = json.loads(json_str)
         data["message_type"] = MessageType(data["message_type"])
         return MessagePackage.from_dict(data)
+
+
+def batch_contents(items: List[Dict], max_size: int, reserved_size: int = 200) -> List[List[Dict]]:
+    """
+    将多个消息内容条目按数据报大小分批，每批编码后不超过一个数据报
+    :param items: 消息内容条目
+    :param max_size: 单个数据报的最大字节数
+    :param reserved_size: 为消息头、发送者与接收者预留的字节数
+    :return:
+    """
+    batches = []
+    batch = []
+    batch_size = 0
+    budget = max_size - reserved_size
+    for item in items:
+        # 按默认分隔符估算，JSON与二进制编码的实际大小都不会超过此值
+        item_size = len(json.dumps(item).encode("utf-8")) + 2
+        if batch and batch_size + item_size > budget:
+            batches.append(batch)
+            batch = []
+            batch_size = 0
+        batch.append(item)
+        batch_size += item_size
+    if batch:
+        batches.append(batch)
+    return batches
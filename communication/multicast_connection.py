@@ -1,10 +1,25 @@
 import abc
+import asyncio
 import logging
 import socket
+import threading
 import uuid
-from typing import Union, Tuple
+from typing import Union, Tuple, Dict, List, Iterable, Callable, Optional, Set
 
-from communication.message import MessagePackage
+from communication.buffer_pool import BufferPool
+from communication.codec import MessageCodec, PreparedMessage, SUPPORTED_CODECS, get_codec, decode_message
+from communication.connection_info import PeerCredentials
+from communication.fragment import Fragmenter, FragmentReassembler
+from communication.message import MessagePackage, MessageType
+from communication.pacer import Pacer, PRIORITY_BULK, PRIORITY_CONTROL
+from communication.reliable import ReliableChannel
+
+# 消息处理函数
+MessageHandler = Callable[[MessagePackage, Union[Tuple[str, int], str]], None]
+
+# 控制消息（启用发送限速时优先发送）
+CONTROL_MESSAGE_TYPES = frozenset({MessageType.HANDSHAKE_REQUEST, MessageType.HANDSHAKE_RESPONSE, MessageType.HEARTBEAT_REQUEST,
+                                   MessageType.HEARTBEAT_RESPONSE, MessageType.CONNECTION_CLOSE, MessageType.MASTER_HEARTBEAT})
 
 
 class Connection(metaclass=abc.ABCMeta):
@@ -24,6 +39,39 @@ class Connection(metaclass=abc.ABCMeta):
     # 连接名称
     __name: str = None
 
+    # 默认编解码器
+    __codec: MessageCodec = None
+
+    # 本连接支持的编解码器
+    __codecs: List[str] = None
+
+    # 对端协商后的编解码器
+    __peer_codecs: Dict[Union[Tuple[str, int], str], MessageCodec] = None
+
+    # 接收缓冲区池（为空时每次接收都分配新的数据）
+    __buffer_pool: BufferPool = None
+
+    # 分片器
+    __fragmenter: Fragmenter = None
+
+    # 分片重组器
+    __reassembler: FragmentReassembler = None
+
+    # 异步传输及其所在的事件循环与线程（由事件循环接管套接字后通过传输发送，其他线程发送时交由事件循环写出）
+    __transport: Optional[Tuple[asyncio.DatagramTransport, asyncio.AbstractEventLoop, int]] = None
+
+    # 可靠通道（接收可靠数据并回复确认；启用可靠发送时负责重传）
+    __reliable_channel: ReliableChannel = None
+
+    # 是否启用可靠发送
+    __reliable: bool = False
+
+    # 支持可靠通道的对端
+    __reliable_peers: set = None
+
+    # 发送限速器（为空时不限速）
+    __pacer: Optional[Pacer] = None
+
     @property
     def address(self) -> str:
         """
@@ -48,6 +96,70 @@ class Connection(metaclass=abc.ABCMeta):
         """
         return self.__name
 
+    @property
+    def raw_socket(self) -> socket:
+        """
+        获取套接字
+        :return:
+        """
+        return self.__socket
+
+    @property
+    def selectable(self):
+        """
+        获取供选择器等待可读的对象，默认为套接字
+        :return:
+        """
+        return self.__socket
+
+    @property
+    def pending(self) -> bool:
+        """
+        是否有已接收完整、不需要等待可读即可返回的消息（反应器处理完一条消息后继续处理）
+        :return:
+        """
+        return False
+
+    @property
+    def max_datagram_size(self) -> int:
+        """
+        获取单个数据报的最大字节数
+        :return:
+        """
+        return self.__fragmenter.max_datagram_size
+
+    @property
+    def reliable(self) -> bool:
+        """
+        是否启用可靠发送
+        :return:
+        """
+        return self.__reliable
+
+    @property
+    def reliable_channel(self) -> ReliableChannel:
+        """
+        获取可靠通道
+        :return:
+        """
+        return self.__reliable_channel
+
+    @property
+    def pacer(self) -> Optional[Pacer]:
+        """
+        获取发送限速器（未启用发送限速时为空）
+        :return:
+        """
+        return self.__pacer
+
+    @property
+    def codecs(self) -> List[str]:
+        """
+        获取本连接支持的编解码器
+        :return:
+        """
+        return self.__codecs
+
     def __init__(self, address: str, port: int, **kwargs):
         """
         初始化
@@ -57,34 +169,245 @@ class Connection(metaclass=abc.ABCMeta):
         self.__name = kwargs.get("name") or uuid.uuid4().hex
         self.__address = address
         self.__port = port
+        self.__codec = get_codec(kwargs.get("codec"))
+        self.__codecs = kwargs.get("codecs") or SUPPORTED_CODECS
+        self.__peer_codecs = {}
+        if "buffer_pool" in kwargs:
+            self.__buffer_pool = kwargs.get("buffer_pool")
+        elif kwargs.get("buffer_pool_size", 4) > 0:
+            self.__buffer_pool = BufferPool(kwargs.get("buffer_size", 2000), kwargs.get("buffer_pool_size", 4))
+        self.__fragmenter = Fragmenter(kwargs.get("max_datagram_size", 1400))
+        self.__reassembler = FragmentReassembler(kwargs.get("fragment_timeout", 10),
+                                                 kwargs.get("max_pending_fragments", 64),
+                                                 kwargs.get("max_fragment_bytes", 4 * 1024 * 1024))
+        self.__reliable = kwargs.get("reliable", False)
+        self.__reliable_peers = set()
+        self.__reliable_channel = ReliableChannel(self.__send_reliable_datagram, **kwargs.get("reliable_options", {}))
+        if kwargs.get("pacing"):
+            self.__pacer = Pacer(self.__write_datagram, **kwargs.get("pacing"))
         self.__socket = self._generate_connection()
 
-    def send(self, message_package: MessagePackage, destination: Union[Tuple[str, int], str] =None):
+    def set_peer_codec(self, destination: Union[Tuple[str, int], str], codec_name: str):
+        """
+        设置与对端协商后的编解码器
+        :param destination: 对端地址
+        :param codec_name: 编解码器名称
+        :return:
+        """
+        self.__peer_codecs[destination] = get_codec(codec_name)
+
+    def get_peer_codec(self, destination: Union[Tuple[str, int], str] = None) -> MessageCodec:
+        """
+        获取发送到对端时使用的编解码器，未协商时使用默认编解码器
+        :param destination: 对端地址
+        :return:
+        """
+        return self.__peer_codecs.get(destination, self.__codec) if destination else self.__codec
+
+    def set_peer_reliable(self, destination: Union[Tuple[str, int], str], reliable: bool):
+        """
+        设置对端是否支持可靠通道（握手时对端声明）
+        :param destination: 对端地址
+        :param reliable:
+        :return:
+        """
+        if reliable:
+            self.__reliable_peers.add(destination)
+        else:
+            self.__reliable_peers.discard(destination)
+
+    def send(self, message_package: Union[MessagePackage, PreparedMessage], destination: Union[Tuple[str, int], str] =None, reliable: bool = False):
         """
         发送数据
-        :param message_package: 消息包
+        :param message_package: 消息包或预编码消息
+        :param destination: 目标地址
+        :param reliable: 是否可靠发送（本连接启用可靠发送且对端支持时生效，否则照常发送）
+        :return:
+        """
+        codec = self.get_peer_codec(destination)
+        if isinstance(message_package, PreparedMessage):
+            datagrams = message_package.get_datagrams(codec, self.__name, self.__fragmenter)
+            message_type = message_package.message_package.message_type
+        else:
+            # 超过单个数据报大小的消息拆分为多个分片发送
+            datagrams = self.__fragmenter.split(codec.encode(message_package, self.__name))
+            message_type = message_package.message_type
+        if reliable and self.__reliable and destination in self.__reliable_peers:
+            for datagram in datagrams:
+                self.__reliable_channel.send(datagram, destination)
+            return
+        priority = PRIORITY_CONTROL if message_type in CONTROL_MESSAGE_TYPES else PRIORITY_BULK
+        for datagram in datagrams:
+            self.__send_datagram(datagram, destination, priority)
+
+    def __send_reliable_datagram(self, datagram: bytes, destination: Union[Tuple[str, int], str]):
+        """
+        发送可靠通道的数据或确认，确认按控制消息优先发送
+        :param datagram: 数据报
+        :param destination: 目标地址
+        :return:
+        """
+        self.__send_datagram(datagram, destination, PRIORITY_CONTROL if ReliableChannel.is_ack(datagram) else PRIORITY_BULK)
+
+    def __send_datagram(self, datagram: bytes, destination: Union[Tuple[str, int], str] = None, priority: int = PRIORITY_BULK):
+        """
+        发送一个数据报，启用发送限速时超出速率的数据报排队
+        :param datagram: 数据报
+        :param destination: 目标地址
+        :param priority: 优先级
+        :return:
+        """
+        if self.__pacer is not None:
+            self.__pacer.send(datagram, destination, priority)
+        else:
+            self.__write_datagram(datagram, destination)
+
+    def __write_datagram(self, datagram: bytes, destination: Union[Tuple[str, int], str] = None):
+        """
+        写出一个数据报
+        :param datagram: 数据报
         :param destination: 目标地址
         :return:
         """
-        if destination:
-            self.__socket.sendto(message_package.to_json(self.__name), destination)
+        transport = self.__transport
+        if transport is not None:
+            if transport[2] == threading.get_ident():
+                transport[0].sendto(datagram, destination)
+            else:
+                # 工作线程或拉取线程发送时，传输不是线程安全的
+                transport[1].call_soon_threadsafe(transport[0].sendto, datagram, destination)
+        elif destination:
+            self._sendto(datagram, destination)
         else:
-            self.__socket.send(message_package.to_json(self.__name))
+            self.__socket.send(datagram)
+
+    def retransmit(self) -> float:
+        """
+        重传超时未确认的可靠数据
+        :return: 距下次需要重传检查的秒数
+        """
+        return self.__reliable_channel.retransmit()
+
+    def flush(self) -> float:
+        """
+        发出发送限速排队中的数据报
+        :return: 距下次需要发送的秒数
+        """
+        return self.__pacer.flush() if self.__pacer is not None else 1.0
+
+    def _sendto(self, datagram: bytes, destination: Union[Tuple[str, int], str]):
+        """
+        发送一个数据报到目标地址
+        :param datagram: 数据报
+        :param destination: 目标地址
+        :return:
+        """
+        self.__socket.sendto(datagram, destination)
+
+    def attach_transport(self, transport):
+        """
+        关联异步传输，关联后发送的数据交由事件循环写出
+        :param transport: 异步数据报传输，为None时恢复直接使用套接字发送
+        :return:
+        """
+        self.__transport = (transport, asyncio.get_running_loop(), threading.get_ident()) if transport is not None else None
+
+    def send_all(self, message_package: Union[MessagePackage, PreparedMessage], destinations: Iterable[Union[Tuple[str, int], str]], reliable: bool = False):
+        """
+        发送同一消息到多个地址，消息只按每种编解码器编码一次
+        :param message_package: 消息包或预编码消息
+        :param destinations: 目标地址
+        :param reliable: 是否可靠发送
+        :return:
+        """
+        prepared_message = message_package if isinstance(message_package, PreparedMessage) else PreparedMessage(message_package)
+        for destination in destinations:
+            try:
+                self.send(prepared_message, destination, reliable)
+            except Exception as e:
+                logging.warning(f"发送数据到{destination}失败：{e}")
 
     def receive(self, size: int=2000) -> Tuple[MessagePackage, Union[str, Tuple[str, int]]]:
         """
         接收数据
+
+        配置了缓冲区池时，数据直接接收到池中的缓冲区并通过memoryview解码，解码完成后缓冲区归还到池中
+        （解码后的消息不再引用缓冲区）；收到分片时持续接收，直到消息的全部分片到齐
         :param size:
         :return:
         """
-        data, address = self.__socket.recvfrom(size)
+        while True:
+            completed, msg, address = self.receive_datagram(size)
+            if completed:
+                return msg, address
+
+    def receive_datagram(self, size: int=2000) -> Tuple[bool, MessagePackage, Union[str, Tuple[str, int]]]:
+        """
+        接收一个数据报，套接字可读时调用不会阻塞
+        :param size:
+        :return: 消息是否完整，消息，来源地址
+        """
+        if self.__buffer_pool is None or size > self.__buffer_pool.buffer_size:
+            data, address = self._receive(size)
+            completed, msg = self.feed(data, address)
+        else:
+            buffer = self.__buffer_pool.acquire()
+            try:
+                length, address = self._receive_into(buffer, size)
+                with memoryview(buffer)[:length] as view:
+                    completed, msg = self.feed(view, address)
+            finally:
+                self.__buffer_pool.release(buffer)
+        return completed, msg, address
+
+    def _receive(self, size: int) -> Tuple[bytes, Union[str, Tuple[str, int]]]:
+        """
+        从套接字接收一个数据报
+        :param size:
+        :return: 数据报，来源地址
+        """
+        return self.__socket.recvfrom(size)
+
+    def _receive_into(self, buffer: bytearray, size: int) -> Tuple[int, Union[str, Tuple[str, int]]]:
+        """
+        从套接字接收一个数据报到缓冲区
+        :param buffer:
+        :param size:
+        :return: 数据报长度，来源地址
+        """
+        return self.__socket.recvfrom_into(buffer, size)
+
+    def get_peer_credentials(self, address: Union[Tuple[str, int], str]) -> Optional[PeerCredentials]:
+        """
+        获取对端进程的凭据，仅本机套接字支持
+        :param address: 对端地址
+        :return:
+        """
+        return None
+
+    def feed(self, data, address: Union[Tuple[str, int], str]) -> Tuple[bool, MessagePackage]:
+        """
+        解码收到的数据报，分片数据报交由重组器重组
+        :param data: 数据报
+        :param address: 来源地址
+        :return: 消息是否完整，消息
+        """
         msg = None
         if data:
             try:
-                msg = MessagePackage.from_json(data)
+                if ReliableChannel.is_reliable(data):
+                    # 可靠数据回复确认后取出其中的数据报，确认与重复数据不再处理
+                    data = self.__reliable_channel.receive(data, address)
+                    if data is None:
+                        return False, None
+                if Fragmenter.is_fragment(data):
+                    data = self.__reassembler.add(data, address)
+                    if data is None:
+                        return False, None
+                msg = decode_message(data)
             except Exception as e:
                 logging.error(f"数据解析失败：{e}")
-        return msg, address
+        return True, msg
 
     def close(self):
         """
@@ -111,21 +434,80 @@ class MulticastServer(Connection):
     组播器
     """
 
+    # 加入组播组使用的本机接口地址
+    __interface: str = "127.0.0.1"
+
+    # 额外加入的组播组
+    __groups: Set[str] = None
+
     def __init__(self, address: str = None, port: int = None, **kwargs):
+        """
+
+        :param address: 组播地址
+        :param port: 组播端口号
+        :param kwargs: interface 加入组播组使用的本机接口地址（默认127.0.0.1）
+        """
         address = address or "224.0.0.1"
         port = 10000 if port is None else port
+        self.__interface = kwargs.get("interface", "127.0.0.1")
+        self.__groups = set()
         super().__init__(address, port, **kwargs)
 
+    @property
+    def groups(self) -> Set[str]:
+        """
+        获取额外加入的组播组
+        :return:
+        """
+        return set(self.__groups)
+
+    def join(self, address: str):
+        """
+        加入组播组（同一端口上接收多个组的数据，网卡与交换机只投递已加入的组）
+        :param address: 组播地址
+        :return:
+        """
+        if address != self.address and address not in self.__groups:
+            self.raw_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self.__membership(address))
+            self.__groups.add(address)
+
+    def leave(self, address: str):
+        """
+        退出组播组
+        :param address: 组播地址
+        :return:
+        """
+        if address in self.__groups:
+            self.raw_socket.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self.__membership(address))
+            self.__groups.discard(address)
+
+    def __membership(self, address: str) -> bytes:
+        """
+        生成组播组成员参数
+        :param address: 组播地址
+        :return:
+        """
+        return socket.inet_aton(address) + socket.inet_aton(self.__interface)
+
+    def broadcast(self, message_package: MessagePackage):
+        """
+        广播数据到组播组（多主节点模式下主节点之间通过组播组交换心跳）
+        :param message_package: 消息包
+        :return:
+        """
+        super().send(message_package, (self.address, self.port))
+
     def _generate_connection(self, family=socket.AF_INET, type=socket.SOCK_DGRAM) -> socket:
         """
         初始化套接字
         :return:
         """
         connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # 绑定前设置地址复用，同一主机上的多个主节点均可接收组播
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         connection.bind(('', self.port))
         # 加入组播组
-        connection.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        connection.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, socket.inet_aton(self.address) + socket.inet_aton('127.0.0.1'))
+        connection.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self.__membership(self.address))
         return connection
 
 
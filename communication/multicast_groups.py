@@ -0,0 +1,110 @@
+"""
+按模块划分的组播组
+
+模块按名称的哈希分到固定数量的组，每组一个组播地址（从基准地址起连续分配），主节点把变化的模块发送到所在组的组播地址，
+子节点只加入订阅的模块所在的组（IP_ADD_MEMBERSHIP），过滤由网卡与交换机完成，未订阅的主机不会收到无关的变更数据。
+主节点握手时下发分组方案，子节点不需要单独配置组播地址。
+"""
+import ipaddress
+import zlib
+from typing import Iterable, Optional, Set
+
+
+class GroupPlan:
+    """
+    分组方案
+    """
+
+    # 基准组播地址（第0组）
+    __address: str = None
+
+    # 组播端口号（所有组相同）
+    __port: int = None
+
+    # 组数量
+    __count: int = 16
+
+    def __init__(self, address: str, port: int, count: int = 16):
+        """
+        初始化
+        :param address: 基准组播地址，第i组的地址为基准地址加i
+        :param port: 组播端口号
+        :param count: 组数量
+        """
+        if count < 1:
+            raise ValueError(f"invalid group count: {count}")
+        last = ipaddress.IPv4Address(address) + (count - 1)
+        if not ipaddress.IPv4Address(address).is_multicast or not last.is_multicast:
+            raise ValueError(f"invalid multicast group range: {address} + {count}")
+        self.__address = address
+        self.__port = port
+        self.__count = count
+
+    @property
+    def address(self) -> str:
+        """
+        获取基准组播地址
+        :return:
+        """
+        return self.__address
+
+    @property
+    def port(self) -> int:
+        """
+        获取组播端口号
+        :return:
+        """
+        return self.__port
+
+    @property
+    def count(self) -> int:
+        """
+        获取组数量
+        :return:
+        """
+        return self.__count
+
+    def group_of(self, module_name: str) -> int:
+        """
+        获取模块所在的组（各进程一致，不使用带随机盐的内置hash）
+        :param module_name: 模块名称
+        :return:
+        """
+        return zlib.crc32(module_name.encode("utf-8")) % self.__count
+
+    def address_of(self, group: int) -> str:
+        """
+        获取组的组播地址
+        :param group: 组序号
+        :return:
+        """
+        return str(ipaddress.IPv4Address(self.__address) + group)
+
+    def groups_of(self, module_names: Optional[Iterable[str]]) -> Set[int]:
+        """
+        获取模块所在的组
+        :param module_names: 模块名称，为空时为所有组
+        :return:
+        """
+        if module_names is None:
+            return set(range(self.__count))
+        return {self.group_of(module_name) for module_name in module_names}
+
+    def to_dict(self) -> dict:
+        """
+        转换为字典（握手时下发）
+        :return:
+        """
+        return {"address": self.__address, "port": self.__port, "count": self.__count}
+
+    @staticmethod
+    def from_dict(data: dict) -> "GroupPlan":
+        """
+        从字典创建
+        :param data:
+        :return:
+        """
+        return GroupPlan(data["address"], data["port"], data.get("count", 16))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, GroupPlan) and self.to_dict() == other.to_dict()
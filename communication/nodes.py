@@ -3,15 +3,31 @@
 2、远程组播放地址与端口
 """
 import logging
+import random
 import threading
 import time
-from typing import List, Tuple, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, List, Set, Tuple, Union, Optional
+from communication.codec import negotiate_codec
 from communication.multicast_connection import Connection, MulticastServer, MulticastClient
-from communication.connection_info import ConnectionInfo
-from communication.message import MessagePackage, MessageType
+from communication.reactor import Reactor
+from communication.connection_info import ConnectionInfo, ConnectionRegistry
+from communication.hash_ring import HashRing
+from communication.message import MessagePackage, MessageType, batch_contents
+from communication.multicast_groups import GroupPlan
+from communication.tcp_connection import TcpServer, TcpConnectionPool, FramedSocket
+from communication.timing_wheel import TimingWheel
+from communication.work_queue import WorkQueue
 from communication.udp_connection import UdpServer, UdpClient
 from node_config import save_slave_node_config_master_address
 from settings.repository import LocalNodeClientRepository, LocalSettingRepository
+from settings.digest import VersionDigest, DEPTH
+from settings.cache import ConfigurationCache
+from settings.membership import MembershipIndex
+from settings.revision import RevisionIndex
+from settings.setting import SettingVersion, SettingVersionType, SettingSection
+from settings.snapshot import SnapshotReader, SnapshotWriter
+from settings.subscription import SubscriptionIndex
 
 logging.root.setLevel(logging.INFO)
 logging.basicConfig(format='%(asctime)s - %(pathname)s[line:%(lineno)d] - %(levelname)s: %(message)s')
@@ -36,13 +52,42 @@ class ServiceNode:
     # 从节点是否连接
     __client_node_connected: bool = False
 
+    # 配置快照读取方
+    __snapshot_reader: SnapshotReader = None
+
+    # 使用的模块（为空时使用所有模块）
+    __modules: Optional[List[str]] = None
+
     def __init__(self, udp_client: UdpClient, **kwargs):
         """
         初始化
         :param udp_client:
+        :param kwargs: name 服务节点名称，snapshot_path 配置快照路径（默认使用从节点握手时告知的路径），
+                       modules 使用的模块，握手时向从节点声明，只在其中的模块变化时接收通知（默认使用所有模块）
         """
         self.__udp_client = udp_client
         self.__name = kwargs.get("name", "未定义")
+        self.__modules = list(kwargs["modules"]) if kwargs.get("modules") is not None else None
+        if kwargs.get("snapshot_path"):
+            self.__snapshot_reader = SnapshotReader(kwargs.get("snapshot_path"))
+
+    @property
+    def configuration(self) -> Dict[str, SettingSection]:
+        """
+        获取从节点发布的配置（直接读取共享内存快照，不等待从节点）
+        :return: 模块名称 -> 配置项组
+        """
+        if self.__snapshot_reader is None:
+            return {}
+        return self.__snapshot_reader.read()[1]
+
+    @property
+    def running(self) -> bool:
+        """
+        是否运行
+        :return:
+        """
+        return self.__running
 
     def __receive(self):
         """
@@ -54,20 +99,48 @@ class ServiceNode:
             msg = ''
             try:
                 msg, address = self.__udp_client.receive()
-                if msg:
-                    if msg.message_type == MessageType.HANDSHAKE_RESPONSE:
-                        logging.info(f"服务节点接收到从节点{address}的响应握手成功")
-                        self.__client_node_connected = True
-                    elif msg.message_type == MessageType.HEARTBEAT_RESPONSE:
-                        logging.info(f"服务节点接收到从节点{address}的响应心跳成功")
-                    elif msg.message_type == MessageType.CONFIGURATION_CHANGE:
-                        logging.info(f"服务节点接收到从节点{address}的配置变更通知")
-                        # TODO 拉取针对节点的完整的配置信息
-                else:
-                    logging.info("服务节点接收消息为空")
+                self._handle_message(msg, address)
             except Exception as e:
                 logging.error(f"服务节点接收消息{msg}异常{e}" )
-            time.sleep(30)
+                time.sleep(30)
+
+    def _handle_message(self, msg: MessagePackage, address: Union[Tuple[str, int], str]):
+        """
+        处理从节点发送的消息
+        :param msg: 消息
+        :param address: 从节点地址
+        :return:
+        """
+        if msg:
+            if msg.message_type == MessageType.HANDSHAKE_RESPONSE:
+                logging.info(f"服务节点接收到从节点{address}的响应握手成功")
+                # 使用从节点协商后的编解码器
+                self.__udp_client.set_peer_codec(self.__udp_client.server_address, (msg.message_content or {}).get("codec"))
+                self.__client_node_connected = True
+                self.__load_snapshot(msg.message_content)
+            elif msg.message_type == MessageType.HEARTBEAT_RESPONSE:
+                logging.info(f"服务节点接收到从节点{address}的响应心跳成功")
+            elif msg.message_type == MessageType.CONFIGURATION_CHANGE:
+                logging.info(f"服务节点接收到从节点{address}的配置变更通知，变化的模块：{(msg.message_content or {}).get('modules', '全部')}")
+                self.__load_snapshot(msg.message_content)
+        else:
+            logging.info("服务节点接收消息为空")
+
+    def __load_snapshot(self, content: Optional[dict]):
+        """
+        按通知中的快照路径与代数读取从节点发布的配置
+        :param content: 通知内容 {"snapshot": 快照路径, "generation": 代数}
+        :return:
+        """
+        content = content or {}
+        if self.__snapshot_reader is None and content.get("snapshot"):
+            self.__snapshot_reader = SnapshotReader(content["snapshot"])
+        if self.__snapshot_reader is None:
+            return
+        generation, setting_sections = self.__snapshot_reader.read()
+        if generation < content.get("generation", 0):
+            logging.warning(f"服务节点读取配置快照的代数{generation}落后于通知的代数{content['generation']}")
+        logging.info(f"服务节点读取配置快照，代数{generation}，模块{len(setting_sections)}个")
 
     def __heartbeat(self):
         """
@@ -75,18 +148,28 @@ class ServiceNode:
         :return:
         """
         while self.__running:
-            if self.__client_node_connected:
-                try:
-                    self.__udp_client.send(MessagePackage(message_type=MessageType.HEARTBEAT_REQUEST, message_content={"name": self.__name}))
-                    logging.info(f"服务节点向从节点{self.__udp_client.address}:{self.__udp_client.port}发送心跳")
-                except Exception as e:
-                    logging.error("心跳异常", e)
-                time.sleep(30)
-            else:
-                client_address = f"{self.__udp_client.address}:{self.__udp_client.port}"
-                logging.info(f"服务节点向从节点{client_address}发送握手请求")
-                self.__udp_client.send(MessagePackage(message_type=MessageType.HANDSHAKE_REQUEST, message_content={"name": self.__name}))
-                time.sleep(10)
+            time.sleep(self._heartbeat())
+
+    def _heartbeat(self) -> float:
+        """
+        发送一次心跳，未连接从节点时发送握手请求
+        :return: 距下次发送的秒数
+        """
+        if self.__client_node_connected:
+            try:
+                self.__udp_client.send(MessagePackage(message_type=MessageType.HEARTBEAT_REQUEST, message_content={"name": self.__name}))
+                logging.info(f"服务节点向从节点{self.__udp_client.address}:{self.__udp_client.port}发送心跳")
+            except Exception as e:
+                logging.error(f"心跳异常{e}")
+            return 30
+        else:
+            client_address = f"{self.__udp_client.address}:{self.__udp_client.port}"
+            logging.info(f"服务节点向从节点{client_address}发送握手请求")
+            content = {"name": self.__name, "codecs": self.__udp_client.codecs, "reliable": True}
+            if self.__modules is not None:
+                content["modules"] = self.__modules
+            self.__udp_client.send(MessagePackage(message_type=MessageType.HANDSHAKE_REQUEST, message_content=content))
+            return 10
 
     def start(self):
         """
@@ -96,8 +179,15 @@ class ServiceNode:
         if not self.__running:
             logging.info(f"服务节点【{self.__name}】开始运行，目标从节点地址=>{self.__udp_client.address}:{self.__udp_client.port}")
             self.__running = True
-            threading.Thread(target=self.__receive).start()
-            threading.Thread(target=self.__heartbeat).start()
+            self._run()
+
+    def _run(self):
+        """
+        以线程方式运行接收与心跳
+        :return:
+        """
+        threading.Thread(target=self.__receive).start()
+        threading.Thread(target=self.__heartbeat).start()
 
     def close(self):
         """
@@ -106,8 +196,14 @@ class ServiceNode:
         """
         if self.__running:
             self.__running = False
-            self.__udp_client.send(MessagePackage(message_type=MessageType.CONNECTION_CLOSE, message_content={"name": self.__name}))
+            try:
+                self.__udp_client.send(MessagePackage(message_type=MessageType.CONNECTION_CLOSE, message_content={"name": self.__name}))
+            except OSError as e:
+                # 本机套接字的从节点未运行时无法发送
+                logging.warning(f"服务节点发送关闭消息失败：{e}")
             self.__udp_client.close()
+            if self.__snapshot_reader:
+                self.__snapshot_reader.close()
 
     def __del__(self):
         """
@@ -145,24 +241,144 @@ class SlaveNode:
     # 主节点连接
     __master_node_address: Union[Tuple[str, int], str] = None
 
-    # 代理端连接
-    __client_node_connections: List[ConnectionInfo] = []
-
-    # 代理端连接锁
-    __client_node_connections_lock: threading.Lock = threading.Lock()
+    # 服务节点连接（按服务节点地址索引）
+    __client_node_connections: ConnectionRegistry = None
 
     # 是否运行
     __running: bool = False
 
-    def __init__(self, multicast_client: MulticastClient, udp_server: UdpServer, master_node_address: Optional[Tuple[str, int]]=None):
+    # 运行方式（thread：每个套接字一个线程，reactor：单线程反应器）
+    __io_mode: str = "thread"
+
+    # 单线程反应器
+    __reactor: Reactor = None
+
+    # 本地配置仓储（保存从主节点拉取的配置）
+    __setting_repository: LocalSettingRepository = None
+
+    # 主节点配置拉取端口
+    __master_config_port: int = None
+
+    # 配置拉取连接池
+    __tcp_pool: TcpConnectionPool = None
+
+    # 配置拉取线程（拉取不阻塞接收线程、反应器或事件循环）
+    __pull_executor: ThreadPoolExecutor = None
+
+    # 并行拉取配置的线程（限制同时进行的拉取请求数量）
+    __fetch_executor: ThreadPoolExecutor = None
+
+    # 一次拉取请求的最多模块数量
+    __pull_batch_size: int = 32
+
+    # 服务节点使用的模块（按服务节点地址索引，未声明的服务节点使用所有模块）
+    __service_modules: Dict[Union[Tuple[str, int], str], FrozenSet[str]] = None
+
+    # 配置快照写入方（本机服务节点通过共享内存读取配置）
+    __snapshot_writer: SnapshotWriter = None
+
+    # 配置缓存（重启时恢复已应用的修订号与配置版本）
+    __cache: ConfigurationCache = None
+
+    # 主节点的纪元
+    __master_epoch: Optional[str] = None
+
+    # 已应用的主节点配置修订号
+    __applied_revision: int = 0
+
+    # 分多条消息下发的配置版本已处理的部分（纪元, 基准修订号, 修订号[, "group"]） -> 序号（模块组播组为（组序号, 序号））
+    __pending_parts: Dict[tuple, set] = None
+
+    # 上次请求补发配置版本时的（纪元, 修订号, 时间）
+    __last_revision_request: Tuple[Optional[str], int, float] = (None, -1, 0)
+
+    # 本地配置版本摘要树（与主节点广播的根摘要比较）
+    __digest: VersionDigest = None
+
+    # 上次开始比较摘要树时的（主节点根摘要, 时间）
+    __last_digest_check: Tuple[Optional[str], float] = (None, 0)
+
+    # 上次收到主节点消息的时间
+    __master_seen_ts: float = 0
+
+    # 向主节点发送心跳的间隔（秒）
+    __heartbeat_interval: float = 30
+
+    # 主节点无响应的超时（秒），超时后重新握手
+    __master_timeout: float = 90
+
+    # 订阅的模块（为空时订阅所有模块）
+    __modules: Optional[List[str]] = None
+
+    # 模块组播组的接收端（绑定主节点分组方案的组播端口，只加入订阅的模块所在的组）
+    __group_listener: Optional[MulticastServer] = None
+
+    # 已加入的模块组播组
+    __joined_groups: Set[int] = frozenset()
+
+    # 握手重试的初始间隔（秒）
+    __handshake_interval: float = 3
+
+    # 握手重试的最大间隔（秒）
+    __handshake_max_interval: float = 60
+
+    # 连续未成功的握手次数（重试间隔按此指数增长）
+    __handshake_attempts: int = 0
+
+    def __init__(self, multicast_client: MulticastClient, udp_server: UdpServer, master_node_address: Optional[Tuple[str, int]]=None, **kwargs):
         """
         初始化
         :param multicast_client: 组播代理端
-        :param udp_server: UDP服务端
+        :param udp_server: UDP服务端（或本机套接字服务端，见communication.unix_connection.create_local_server）
+        :param master_node_address: 主节点地址
+        :param kwargs: io_mode 运行方式，thread（默认）或reactor；setting_repository 本地配置仓储；tcp_pool 配置拉取连接池；
+                       snapshot_path 配置快照路径；cache_path 配置缓存路径；heartbeat_timeout 服务节点的心跳超时（秒）；
+                       heartbeat_interval 向主节点发送心跳的间隔（秒），master_timeout 主节点无响应的超时（秒），超时后重新握手；
+                       modules 本机服务使用的模块，握手时向主节点声明订阅，主节点只下发其中模块的配置版本（默认订阅所有模块）；
+                       group_listener 模块组播组的接收端，如MulticastServer(port=分组方案的端口号, interface=本机地址)，
+                       端口与主节点的分组方案相同时通过组播组接收配置变更；
+                       handshake_interval 握手重试的初始间隔（秒，默认3），handshake_max_interval 握手重试的最大间隔（秒，默认60）；
+                       pull_concurrency 同时进行的配置拉取请求数量（默认4），pull_batch_size 一次拉取请求的最多模块数量（默认32）
         """
         self.__multicast_client = multicast_client or MulticastClient()
         self.__udp_server = udp_server
         self.__master_node_address = master_node_address
+        self.__io_mode = kwargs.get("io_mode", "thread")
+        if self.__io_mode not in ("thread", "reactor"):
+            raise ValueError(f"unsupported io_mode: {self.__io_mode}")
+        self.__setting_repository = kwargs.get("setting_repository") or LocalSettingRepository(store_dir_path="/tmp/smart_store/slave")
+        self.__tcp_pool = kwargs.get("tcp_pool") or TcpConnectionPool()
+        self.__pull_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slave-pull")
+        self.__fetch_executor = ThreadPoolExecutor(max_workers=max(1, kwargs.get("pull_concurrency", 4)), thread_name_prefix="slave-fetch")
+        self.__pull_batch_size = max(1, kwargs.get("pull_batch_size", 32))
+        self.__service_modules = {}
+        self.__snapshot_writer = SnapshotWriter(kwargs.get("snapshot_path", "/tmp/smart_store/slave/config.snapshot"))
+        self.__cache = ConfigurationCache(kwargs.get("cache_path", "/tmp/smart_store/slave/cache.json"))
+        self.__pending_parts = {}
+        self.__digest = VersionDigest()
+        self.__client_node_connections = ConnectionRegistry(expire=kwargs.get("heartbeat_timeout", 90))
+        self.__heartbeat_interval = kwargs.get("heartbeat_interval", 30)
+        self.__master_timeout = kwargs.get("master_timeout", 90)
+        self.__modules = list(kwargs["modules"]) if kwargs.get("modules") is not None else None
+        self.__group_listener = kwargs.get("group_listener")
+        self.__handshake_interval = kwargs.get("handshake_interval", 3)
+        self.__handshake_max_interval = kwargs.get("handshake_max_interval", 60)
+
+    @property
+    def running(self) -> bool:
+        """
+        是否运行
+        :return:
+        """
+        return self.__running
+
+    @property
+    def applied_revision(self) -> int:
+        """
+        获取已应用的主节点配置修订号
+        :return:
+        """
+        return self.__applied_revision
 
     def start(self):
         """
@@ -176,14 +392,122 @@ class SlaveNode:
         """
         if not self.__running:
             self.__running = True
+            self.__master_seen_ts = time.monotonic()
             logging.info(f"从节点开始运行，注册广播地址=>{self.__multicast_client.address}:{self.__multicast_client.port}，监听UDP地址=>{self.__udp_server.address}:{self.__udp_server.port}，主节点地址=>{self.__master_node_address}")
-            # 启动组播代理端
-            threading.Thread(target=self.__multicast_receive, args=(self.__multicast_client,)).start()
-            # 启动组播握手或心跳发送线程
-            threading.Thread(target=self.__handshake_or_heartbeat).start()
+            if self.__cache.load():
+                # 从缓存恢复修订号与摘要树，握手时只需获取之后变化的配置版本
+                self.__master_epoch = self.__cache.epoch
+                self.__applied_revision = self.__cache.revision
+                setting_versions = self.__cache.setting_versions
+                self.__digest.update(setting_versions, complete=True)
+                logging.info(f"从节点从配置缓存恢复修订号{self.__applied_revision}，模块{len(setting_versions)}个")
+            # 在后台与本地配置比较
+            self.__pull_executor.submit(self.__load_digest)
+            if self.__snapshot_writer.generation == 0:
+                # 首次运行时发布本地已有的配置，重启时沿用上次发布的快照
+                self.__pull_executor.submit(self.__publish_snapshot)
+            self._run()
+
+    def _run(self):
+        """
+        以线程方式运行组播接收、握手或心跳发送与本地UDP接收
+        :return:
+        """
+        if self.__io_mode == "reactor":
+            self.__run_reactor()
+            return
+        # 启动组播代理端
+        threading.Thread(target=self.__multicast_receive, args=(self.__multicast_client,)).start()
+        # 启动模块组播组接收线程
+        for connection in self._group_connections():
+            threading.Thread(target=self.__multicast_receive, args=(connection,)).start()
+        # 启动组播握手或心跳发送线程
+        threading.Thread(target=self.__handshake_or_heartbeat).start()
+
+        # 启动UDP服务端接收线程
+        threading.Thread(target=self.__udp_server_receive).start()
+
+        # 启动可靠发送的重传线程
+        if self.__udp_server.reliable:
+            threading.Thread(target=self.__retransmit).start()
+
+        # 启动服务节点心跳超时检查线程
+        threading.Thread(target=self.__expire_connections).start()
+
+    def __retransmit(self):
+        """
+        重传发送到服务节点的可靠数据
+        :return:
+        """
+        while self.__running:
+            time.sleep(self.__udp_server.retransmit())
+
+    def __expire_connections(self):
+        """
+        定期移除心跳超时的服务节点
+        :return:
+        """
+        while self.__running:
+            time.sleep(self._expire_connections())
+
+    def _expire_connections(self) -> float:
+        """
+        移除心跳超时的服务节点，超时的服务节点不再接收配置变更通知
+        :return: 距下次检查的秒数
+        """
+        for connection_info in self.__client_node_connections.remove_expired():
+            self.__service_modules.pop(connection_info.socket_address, None)
+            logging.info(f"从节点移除心跳超时的服务节点{connection_info.full_address}")
+        return self.__client_node_connections.tick
 
-            # 启动UDP服务端接收线程
-            threading.Thread(target=self.__udp_server_receive).start()
+    def _reliable_connections(self) -> List[Connection]:
+        """
+        启用可靠发送、需要定时重传的连接
+        :return:
+        """
+        return [self.__udp_server] if self.__udp_server.reliable else []
+
+    def _group_connections(self) -> List[Connection]:
+        """
+        接收模块组播组消息的连接
+        :return:
+        """
+        return [self.__group_listener] if self.__group_listener else []
+
+    def __run_reactor(self):
+        """
+        以单线程反应器运行：组播套接字、本地UDP套接字与心跳定时器复用同一个线程
+        :return:
+        """
+        self.__reactor = Reactor()
+        self.__reactor.register(self.__multicast_client, self._handle_multicast_message)
+        for connection in self._group_connections():
+            self.__reactor.register(connection, self._handle_multicast_message)
+        self.__reactor.register(self.__udp_server, self._handle_local_message)
+        self.__reactor.repeat(self._handshake_or_heartbeat)
+        self.__reactor.repeat(self._expire_connections)
+        for connection in self._reliable_connections():
+            self.__reactor.repeat(connection.retransmit)
+        threading.Thread(target=self.__reactor.run).start()
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        if self.__running:
+            self.__running = False
+            if self.__reactor:
+                self.__reactor.stop()
+            self.__multicast_client.close()
+            if self.__group_listener:
+                self.__group_listener.close()
+            self.__udp_server.close()
+            # 快照在进行中的拉取完成后关闭，快照文件保留，重启期间服务节点仍可读取
+            self.__pull_executor.submit(self.__snapshot_writer.close)
+            self.__pull_executor.shutdown(wait=False)
+            self.__fetch_executor.shutdown(wait=False)
+            self.__tcp_pool.close()
 
     def __handshake_or_heartbeat(self):
         """
@@ -191,77 +515,417 @@ class SlaveNode:
         :return:
         """
         while self.__running:
-            if self.__master_node_address is None:
-                # 组播发送握手请求
-                logging.info("从节点广播发送握手请求")
-                self.__multicast_client.broadcast(MessagePackage(MessageType.HANDSHAKE_REQUEST, None))
-                time.sleep(3)
-            else:
-                # UDP发送心跳请求
-                logging.info(f"从节点发送心跳请求至主节点{self.__master_node_address}")
-                self.__multicast_client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, None), self.__master_node_address)
-                time.sleep(30)
+            time.sleep(self._handshake_or_heartbeat())
+
+    def _handshake_or_heartbeat(self) -> float:
+        """
+        未连接主节点时组播发送握手请求，否则发送心跳请求；主节点超时无响应时重新握手
+        :return: 距下次发送的秒数
+        """
+        if self.__master_node_address is not None and time.monotonic() - self.__master_seen_ts > self.__master_timeout:
+            logging.warning(f"从节点与主节点{self.__master_node_address}的心跳超时，重新握手")
+            self.__master_node_address = None
+        if self.__master_node_address is None:
+            # 组播发送握手请求
+            logging.info("从节点广播发送握手请求")
+            content = self.__revision_content(codecs=self.__multicast_client.codecs, reliable=True)
+            if self.__modules is not None:
+                content["modules"] = self.__modules
+            if self.__group_listener:
+                content["group_port"] = self.__group_listener.port
+            self.__multicast_client.broadcast(MessagePackage(MessageType.HANDSHAKE_REQUEST, content))
+            return self.__handshake_backoff()
+        else:
+            # UDP发送心跳请求
+            logging.info(f"从节点发送心跳请求至主节点{self.__master_node_address}")
+            # 心跳携带已应用的修订号，落后时主节点补发变化的配置版本
+            self.__multicast_client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, self.__revision_content() or None), self.__master_node_address)
+            return self.__heartbeat_interval
+
+    def __handshake_backoff(self) -> float:
+        """
+        握手重试间隔按连续未成功的次数指数增长到最大间隔，并在后一半区间内随机抖动（不小于初始间隔），
+        主节点重启时大量子节点的握手分散到不同时间，不会同时重试
+        :return: 距下次握手的秒数
+        """
+        delay = min(self.__handshake_max_interval, self.__handshake_interval * 2 ** min(self.__handshake_attempts, 16))
+        self.__handshake_attempts += 1
+        return random.uniform(max(self.__handshake_interval, delay / 2), delay)
 
     def __multicast_receive(self, multicast: Connection):
         """
         接收主组消息
+        :return:
+        """
+        while self.__running:
+            try:
+                msg, address = multicast.receive()
+                self._handle_multicast_message(msg, address)
+            except Exception as ex:
+                logging.warning("从节点处理主节点消息异常：" + str(ex))
+
+    def _handle_multicast_message(self, msg: MessagePackage, address: Union[Tuple[str, int], str]):
+        """
+        处理主节点消息
 
         1、主节点握手成功响应消息
         2、主节点配置变更通知
+        :param msg: 消息
+        :param address: 主节点地址
         :return:
         """
-        while self.__running:
-            msg, address = multicast.receive()
-            # 忽略自己发送的消息
-            if msg.sender != multicast.name and (msg.receiver == multicast.name or msg.receiver is None):
-                # 只接受一个主节点的握手成功响应消息
-                if msg.message_type == MessageType.HANDSHAKE_RESPONSE:
-                    if self.__master_node_address is None:
-                        # 握手成功响应消息
-                        self.__master_node_address = address
-                        logging.info(f"从节点成功连接到主节点{self.__master_node_address}")
-                        ip_address = self.__master_node_address[0] if isinstance(self.__master_node_address, tuple) else self.__master_node_address
-                        port = self.__master_node_address[1] if isinstance(self.__master_node_address, tuple) else 0
-                        save_slave_node_config_master_address(ip_address, port)
-                elif msg.message_type == MessageType.CONFIGURATION_CHANGE:
-                    # 配置变更通知
+        multicast = self.__multicast_client
+        # 忽略无法解析的消息与自己发送的消息
+        if msg and msg.sender != multicast.name and (msg.receiver == multicast.name or msg.receiver is None):
+            if address == self.__master_node_address:
+                self.__master_seen_ts = time.monotonic()
+            # 只接受一个主节点的握手成功响应消息
+            if msg.message_type == MessageType.HANDSHAKE_RESPONSE:
+                content = msg.message_content or {}
+                # 合并回复的握手成功消息列出窗口内接受的所有子节点及其编解码器，未列出本节点时忽略
+                accepted = dict(content["accepted"]) if "accepted" in content else {multicast.name: content.get("codec")}
+                if self.__master_node_address is None and multicast.name in accepted:
+                    # 握手成功响应消息
+                    self.__master_node_address = address
+                    self.__master_seen_ts = time.monotonic()
+                    self.__handshake_attempts = 0
+                    # 使用主节点协商后的编解码器
+                    multicast.set_peer_codec(address, accepted[multicast.name])
+                    self.__master_config_port = (msg.message_content or {}).get("config_port")
+                    self.__join_groups((msg.message_content or {}).get("groups"))
+                    logging.info(f"从节点成功连接到主节点{self.__master_node_address}")
+                    ip_address = self.__master_node_address[0] if isinstance(self.__master_node_address, tuple) else self.__master_node_address
+                    port = self.__master_node_address[1] if isinstance(self.__master_node_address, tuple) else 0
+                    # 写入配置文件不阻塞接收线程或事件循环
+                    self.__pull_executor.submit(save_slave_node_config_master_address, ip_address, port)
+            elif msg.message_type == MessageType.CONFIGURATION_CHANGE and "group" in (msg.message_content or {}):
+                # 模块组播组的配置变更只接受已连接的主节点发送到已加入的组的消息，组内未订阅的模块不处理
+                content = msg.message_content
+                if address == self.__master_node_address and content["group"] in self.__joined_groups:
+                    logging.info(f"接收到主节点{address}在组播组{content['group']}发送的配置变更通知：" + str(msg))
+                    self.__master_config_port = content.get("config_port", self.__master_config_port)
+                    setting_versions = [setting_version for setting_version in self.__unpack_setting_versions(msg)
+                                        if self.__modules is None or setting_version.name in self.__modules]
+                    self.__process_configuration_change(setting_versions, address, content)
+            elif msg.message_type in (MessageType.CONFIGURATION_CHANGE, MessageType.CONFIGURATION_BROADCAST):
+                # 配置变更通知（不含配置版本的定期广播只携带修订号与根摘要，不记录日志）
+                if (msg.message_content or {}).get("versions", True):
                     if msg.receiver == multicast.name:
                         logging.info(f"接收到主节点{self.__master_node_address}发送的配置变更通知：" + str(msg))
                     else:
                         logging.info(f"接收到主节点{self.__master_node_address}广播的配置变更通知：" + str(msg))
-                    self.__process_configuration_change(msg, address)
+                self.__master_config_port = (msg.message_content or {}).get("config_port", self.__master_config_port)
+                self.__process_configuration_change(self.__unpack_setting_versions(msg), address, msg.message_content)
+            elif msg.message_type == MessageType.DIGEST_RESPONSE:
+                # 摘要树比较在拉取线程中执行，与配置的保存保持顺序
+                self.__pull_executor.submit(self.__handle_digest_response, address, msg.message_content or {})
+            elif msg.message_type == MessageType.CONNECTION_CLOSE and address == self.__master_node_address:
+                # 多主节点模式下主节点不再负责本节点，立即重新握手，由哈希环上新的负责主节点接受
+                logging.info(f"从节点被主节点{address}释放，重新握手")
+                self.__master_node_address = None
+                self._handshake_or_heartbeat()
 
-    def __process_configuration_change(self, msg: MessagePackage, address: Union[Tuple[str, int], str] ):
+    def __join_groups(self, plan: Optional[dict]):
+        """
+        按主节点下发的分组方案加入订阅的模块所在的组播组，退出不再需要的组
+        :param plan: 分组方案{"address": 基准组播地址, "port": 端口号, "count": 组数量}，为空时退出所有组
+        :return:
+        """
+        if not self.__group_listener:
+            return
+        addresses = set()
+        joined_groups = set()
+        if plan:
+            group_plan = GroupPlan.from_dict(plan)
+            if group_plan.port != self.__group_listener.port:
+                logging.warning(f"从节点组播组接收端口{self.__group_listener.port}与主节点的分组方案{group_plan.port}不一致")
+            else:
+                joined_groups = group_plan.groups_of(self.__modules)
+                addresses = {group_plan.address_of(group) for group in joined_groups}
+        try:
+            for address in self.__group_listener.groups - addresses:
+                self.__group_listener.leave(address)
+            for address in addresses:
+                self.__group_listener.join(address)
+        except OSError as e:
+            logging.warning(f"从节点加入模块组播组失败：{e}")
+            joined_groups = set()
+        self.__joined_groups = frozenset(joined_groups)
+        if joined_groups:
+            logging.info(f"从节点加入模块组播组：{sorted(addresses)}")
+
+    @staticmethod
+    def __unpack_setting_versions(msg: MessagePackage) -> List[SettingVersion]:
+        """
+        解包配置版本，批量消息的内容为{"versions": [...]}，兼容旧版本主节点每条消息一个版本
+        :param msg: 配置变更消息
+        :return:
+        """
+        content = msg.message_content
+        if not content:
+            return []
+        return [SettingVersion.from_dict(version) for version in content.get("versions", [content])]
+
+    def __process_configuration_change(self, setting_versions: List[SettingVersion], address: Union[Tuple[str, int], str], content: Optional[dict] = None):
         """
         处理配置变更
         1、从主节点拉取完整的配置信息
         2、生成并存储配置文件
         3、通知服务节点
-        :param msg: 配置变更消息
+        :param setting_versions: 主节点的配置版本
+        :param address: 主节点地址
+        :param content: 消息内容（携带纪元与修订号）
+        :return:
+        """
+        if not setting_versions and "revision" not in (content or {}):
+            return
+        # 拉取在独立线程中执行，完成后通知服务节点；修订号在拉取线程中按消息顺序推进
+        self.__pull_executor.submit(self.__apply_configuration_change, address, setting_versions, content or {})
+
+    def __apply_configuration_change(self, address: Union[Tuple[str, int], str], setting_versions: List[SettingVersion], content: dict):
+        """
+        比较主节点与本地的配置版本，只拉取版本不一致的模块并推进已应用的修订号，缺少基准修订号之前的变更时请求主节点补发
+        :param address: 主节点地址
+        :param setting_versions: 主节点的配置版本
+        :param content: 消息内容
+        :return:
+        """
+        if "revision" in content and not self.__is_applicable(content):
+            self.__request_missing_revisions(address)
+        module_names = [setting_version.name for setting_version in self.__digest.changed(setting_versions)]
+        if module_names and not self.__pull_configuration_from_master_node(address, module_names):
+            return
+        if "revision" in content and self.__is_applicable(content):
+            self.__advance_revision(content)
+        if content.get("digest") and content.get("epoch") == self.__master_epoch and content.get("revision") == self.__applied_revision:
+            # 修订号一致时比较根摘要，发现漏掉或本地被改动的模块
+            self.__check_digest(address, content["digest"])
+
+    def __load_digest(self):
+        """
+        按本地配置计算摘要树，与配置缓存不一致时以本地配置为准
+        :return:
+        """
+        setting_versions = [SettingVersion(setting_section.module_name, setting_section.version, SettingVersionType.SECTION)
+                            for setting_section in self.__setting_repository.get_all()]
+        if {setting_version.name: setting_version.version for setting_version in setting_versions} != \
+                {setting_version.name: setting_version.version for setting_version in self.__cache.setting_versions}:
+            logging.info("从节点配置缓存与本地配置不一致，以本地配置为准")
+            self.__cache.update(setting_versions, complete=True)
+        self.__digest.update(setting_versions, complete=True)
+
+    def __check_digest(self, address: Union[Tuple[str, int], str], root: str):
+        """
+        根摘要不一致时从根节点开始逐层比较摘要树（同一根摘要5秒内只比较一次）
+        :param address: 主节点地址
+        :param root: 主节点的根摘要
+        :return:
+        """
+        if self.__digest.root == root:
+            return
+        last_root, ts = self.__last_digest_check
+        if last_root == root and time.monotonic() - ts < 5:
+            return
+        self.__last_digest_check = (root, time.monotonic())
+        logging.info(f"从节点配置摘要与主节点{address}不一致，开始逐层比较")
+        self.__send_to_master(address, MessagePackage(MessageType.DIGEST_REQUEST, {"nodes": [[0, 0]]}))
+
+    def __handle_digest_response(self, address: Union[Tuple[str, int], str], content: dict):
+        """
+        处理主节点的摘要回复：继续比较不一致的子节点，到达桶时比较桶内的配置版本，
+        拉取版本不一致或缺少的模块，删除主节点已不存在的模块
+        :param address: 主节点地址
+        :param content: 回复内容
+        :return:
+        """
+        if "children" in content:
+            differing = self.__digest.differing(tuple(child) for child in content["children"])
+            nodes = [[level, index] for level, index in differing if level < DEPTH]
+            buckets = [index for level, index in differing if level == DEPTH]
+            if nodes:
+                self.__send_to_master(address, MessagePackage(MessageType.DIGEST_REQUEST, {"nodes": nodes}))
+            if buckets:
+                self.__send_to_master(address, MessagePackage(MessageType.DIGEST_REQUEST, {"buckets": buckets}))
+            return
+        module_names = []
+        removed_names = []
+        for bucket, versions in content.get("buckets", []):
+            local_versions = self.__digest.bucket_versions([bucket]).get(bucket, {})
+            module_names.extend(name for name, version in versions.items() if name not in local_versions or local_versions[name] != version)
+            removed_names.extend(name for name in local_versions if name not in versions)
+        if removed_names:
+            for module_name in removed_names:
+                self.__setting_repository.delete(module_name)
+            self.__digest.remove(removed_names)
+            self.__cache.update(removed_names=removed_names)
+            logging.info(f"从节点删除主节点已不存在的模块：{removed_names}")
+        if module_names:
+            logging.info(f"从节点按摘要比较结果拉取模块：{module_names}")
+            self.__pull_configuration_from_master_node(address, module_names)
+        elif removed_names:
+            self.__publish_snapshot()
+            self.__notify_configuration_to_local_node(removed_names)
+
+    def __send_to_master(self, address: Union[Tuple[str, int], str], msg: MessagePackage):
+        """
+        发送消息到主节点
+        :param address: 主节点地址
+        :param msg: 消息
+        :return:
+        """
+        try:
+            self.__multicast_client.send(msg, address)
+        except OSError as e:
+            logging.warning(f"发送消息到主节点{address}失败：{e}")
+
+    def __is_applicable(self, content: dict) -> bool:
+        """
+        配置版本能否在已应用的修订号上应用：全部模块的配置版本，或基准修订号不晚于已应用的修订号的变化
+        :param content: 消息内容
+        :return:
+        """
+        since = content.get("since")
+        return since is None or (content.get("epoch") == self.__master_epoch and since <= self.__applied_revision)
+
+    def __advance_revision(self, content: dict):
+        """
+        同一修订号的配置版本全部处理后推进已应用的修订号
+        :param content: 消息内容
+        :return:
+        """
+        epoch, since, revision = content.get("epoch"), content.get("since"), content["revision"]
+        if "group" in content:
+            # 模块组播组的变更按组分多条消息发送，只需收齐已加入的组的部分
+            key = (epoch, since, revision, "group")
+            part = (content["group"], content.get("part", 0))
+            parts = sum(count for group, count in content.get("groups", []) if group in self.__joined_groups)
+        else:
+            key = (epoch, since, revision)
+            part = content.get("part", 0)
+            parts = content.get("parts", 1)
+        if parts > 1:
+            received = self.__pending_parts.setdefault(key, set())
+            received.add(part)
+            if len(received) < parts:
+                if len(self.__pending_parts) > 64:
+                    # 丢失部分消息的修订号不会再完成，淘汰最早的
+                    del self.__pending_parts[next(iter(self.__pending_parts))]
+                return
+            del self.__pending_parts[key]
+        if epoch != self.__master_epoch or revision > self.__applied_revision:
+            self.__master_epoch = epoch
+            self.__applied_revision = revision
+            self.__cache.advance(epoch, revision)
+            logging.info(f"从节点已应用主节点配置修订号{revision}")
+
+    def __request_missing_revisions(self, address: Union[Tuple[str, int], str]):
+        """
+        请求主节点补发已应用的修订号之后变化的配置版本（同一修订号5秒内只请求一次）
         :param address: 主节点地址
         :return:
         """
-        # 比较子节点与主节点的配置版本，如果版本不一至则执行下面的操作
-        self.__pull_configuration_from_master_node(address)
-        # 通知服务节点
-        self.__notify_configuration_to_local_node()
+        epoch, revision, ts = self.__last_revision_request
+        if (epoch, revision) == (self.__master_epoch, self.__applied_revision) and time.monotonic() - ts < 5:
+            return
+        self.__last_revision_request = (self.__master_epoch, self.__applied_revision, time.monotonic())
+        logging.info(f"从节点请求主节点{address}补发修订号{self.__applied_revision}之后的配置版本")
+        self.__send_to_master(address, MessagePackage(MessageType.CONFIGURATION_REQUEST, self.__revision_content()))
+
+    def __revision_content(self, **content) -> dict:
+        """
+        附加已应用的纪元与修订号的消息内容（尚未应用过主节点的配置版本时不附加）
+        :param content:
+        :return:
+        """
+        if self.__master_epoch is not None:
+            content["epoch"] = self.__master_epoch
+            content["revision"] = self.__applied_revision
+        return content
 
-    def __pull_configuration_from_master_node(self, address: Union[Tuple[str, int], str]):
+    def __pull_configuration_from_master_node(self, address: Union[Tuple[str, int], str], module_names: List[str]) -> bool:
         """
-        从主节点拉取配置后生成并存储配置文件
+        从主节点拉取配置后生成并存储配置文件，再通知服务节点
+
+        模块按批次并行拉取（同时进行的请求数量受拉取线程数量限制），拉取结果在拉取线程中按顺序保存，
+        只保存并通知版本与本地不同的模块，部分批次失败时已拉取的模块照常保存
+        :param address: 主节点地址
+        :param module_names: 拉取的模块
+        :return: 是否全部拉取成功
+        """
+        if not isinstance(address, tuple) or not self.__master_config_port:
+            logging.warning(f"主节点{address}未提供配置拉取端口，跳过拉取")
+            return False
+        batches = [module_names[index:index + self.__pull_batch_size] for index in range(0, len(module_names), self.__pull_batch_size)]
+        futures = [self.__fetch_executor.submit(self.__fetch_setting_sections, address, batch) for batch in batches]
+        succeeded = True
+        setting_sections: Dict[str, SettingSection] = {}
+        for future in futures:
+            result = future.result()
+            if result is None:
+                succeeded = False
+                continue
+            for setting_section in result:
+                setting_sections[setting_section.module_name] = setting_section
+        setting_versions = self.__digest.changed(SettingVersion(setting_section.module_name, setting_section.version, SettingVersionType.SECTION)
+                                                 for setting_section in setting_sections.values())
+        for setting_version in setting_versions:
+            self.__setting_repository.save(setting_sections[setting_version.name], setting_version.name)
+        changed_names = [setting_version.name for setting_version in setting_versions]
+        logging.info(f"从主节点{address}拉取配置完成：{module_names}，变化的模块：{changed_names}")
+        if changed_names:
+            self.__digest.update(setting_versions)
+            self.__cache.update(setting_versions)
+            self.__publish_snapshot()
+            # 通知使用变化的模块的服务节点
+            self.__notify_configuration_to_local_node(changed_names)
+        return succeeded
+
+    def __fetch_setting_sections(self, address: Tuple[str, int], module_names: List[str]) -> Optional[List[SettingSection]]:
+        """
+        通过连接池拉取一批模块的配置（在并行拉取线程中执行）
         :param address: 主节点地址
+        :param module_names: 拉取的模块
+        :return: 拉取失败时为空
+        """
+        try:
+            response = self.__tcp_pool.request((address[0], self.__master_config_port),
+                                               MessagePackage(MessageType.CONFIGURATION_REQUEST, {"modules": module_names}))
+        except Exception as e:
+            logging.warning(f"从主节点{address}拉取配置失败：{e}")
+            return None
+        return [SettingSection.from_dict(section) for section in (response.message_content or {}).get("sections", [])]
+
+    def __publish_snapshot(self):
+        """
+        将本地配置发布到共享内存快照（只在配置拉取线程中写入）
+        :return:
+        """
+        setting_sections = {setting_section.module_name: setting_section for setting_section in self.__setting_repository.get_all()}
+        generation = self.__snapshot_writer.publish(setting_sections)
+        logging.info(f"从节点发布配置快照，代数{generation}，模块{len(setting_sections)}个")
+
+    def __snapshot_content(self, **content) -> dict:
+        """
+        附加配置快照路径与代数的消息内容
+        :param content:
         :return:
         """
-        # TODO 从主节点拉取配置后生成并存储配置文件
+        content["snapshot"] = self.__snapshot_writer.path
+        content["generation"] = self.__snapshot_writer.generation
+        return content
 
-    def __notify_configuration_to_local_node(self):
+    def __notify_configuration_to_local_node(self, module_names: List[str]):
         """
-        通知服务节点
+        通知服务节点配置快照的新代数及变化的模块，服务节点从共享内存读取配置；声明了使用的模块的服务节点只在其中的模块变化时通知
+        :param module_names: 变化的模块
         :return:
         """
-        with self.__client_node_connections_lock:
-            for connection in self.__client_node_connections:
-                self.__send_configuration_to_local_node(connection)
+        service_modules = dict(self.__service_modules)
+        destinations = [destination for destination in self.__client_node_connections.destinations()
+                        if destination not in service_modules or not service_modules[destination].isdisjoint(module_names)]
+        # 同一通知只编码一次后发送到所有服务节点
+        self.__udp_server.send_all(MessagePackage(MessageType.CONFIGURATION_CHANGE, self.__snapshot_content(modules=module_names)),
+                                   destinations, reliable=True)
 
     def __send_configuration_to_local_node(self, connection: ConnectionInfo):
         """
@@ -270,7 +934,7 @@ class SlaveNode:
         :return:
         """
         try:
-            self.__udp_server.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, None), connection.socket_address)
+            self.__udp_server.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, self.__snapshot_content()), connection.socket_address, reliable=True)
         except Exception as e:
             logging.warning("向服务节点发送配置信息失败，原因：{}".format(e))
 
@@ -282,41 +946,55 @@ class SlaveNode:
         while self.__running:
             try:
                 msg, address = self.__udp_server.receive()
-                with self.__client_node_connections_lock:
-                    filter_node_connections = [node_connection for node_connection in self.__client_node_connections if node_connection.equal(address)]
-                    if len(filter_node_connections) == 0:
-                        connection_info = ConnectionInfo.from_address(address)
-                        self.__client_node_connections.append(connection_info)
-                    else:
-                        connection_info = filter_node_connections[0]
-                        connection_info.update_heartbeat_ts()
-
-                    if msg.message_type == MessageType.HEARTBEAT_REQUEST:
-                        # 心跳请求
-                        logging.info(f"从节点接收到服务节点{address}的心跳请求")
-                        response = MessagePackage(MessageType.HEARTBEAT_RESPONSE, None)
-                        self.__udp_server.send(response, address)
-                    elif msg.message_type == MessageType.HANDSHAKE_REQUEST:
-                        # 握手请求
-                        logging.info(f"从节点接收到服务节点{address}的握手请求")
-                        self.__udp_server.send(MessagePackage(MessageType.HANDSHAKE_RESPONSE, None), address)
-                    elif msg.message_type == MessageType.CONNECTION_CLOSE:
-                        with self.__client_node_connections_lock:
-                            self.__client_node_connections.remove(connection_info)
-                            logging.info(f"从节点关闭服务节点{address}的连接")
-                            break
-                    elif msg.message_type == MessageType.CONFIGURATION_REQUEST:
-                        # 发送配置信息到服务节点
-                        # 解释一下为什么需要请求而不是直接获取
-                        # 1、因为有可能配置信息还没有完全准备好，所以需要等待
-                        # 2、有可能本地的配置版本与主节点的配置版本相同，所以发送请求可以避免重复读取配置
-                        # 3、方便代理端的开发，代理端只需要接收配置变更通知即可
-                        self.__send_configuration_to_local_node(connection_info)
-                    else:
-                        logging.info(f"从节点接收到服务节点{address}的数据：" + str(msg))
+                self._handle_local_message(msg, address)
             except Exception as ex:
                 logging.warning("从节点处理代理端连接异常：" + str(ex))
 
+    def _handle_local_message(self, msg: MessagePackage, address: Union[Tuple[str, int], str]):
+        """
+        处理服务节点消息
+        :param msg: 消息
+        :param address: 服务节点地址
+        :return:
+        """
+        if not msg:
+            return
+        if msg.message_type == MessageType.CONNECTION_CLOSE:
+            self.__client_node_connections.remove(address)
+            self.__service_modules.pop(address, None)
+            logging.info(f"从节点关闭服务节点{address}的连接")
+            return
+        connection_info, _ = self.__client_node_connections.touch(address)
+
+        if msg.message_type == MessageType.HEARTBEAT_REQUEST:
+            # 心跳请求
+            logging.info(f"从节点接收到服务节点{address}的心跳请求")
+            response = MessagePackage(MessageType.HEARTBEAT_RESPONSE, None)
+            self.__udp_server.send(response, address)
+        elif msg.message_type == MessageType.HANDSHAKE_REQUEST:
+            # 握手请求，本机套接字附带服务节点进程的凭据
+            credentials = self.__udp_server.get_peer_credentials(address)
+            logging.info(f"从节点接收到服务节点{address}的握手请求" + (f"（进程{credentials.pid}，用户{credentials.uid}）" if credentials else ""))
+            codec = negotiate_codec((msg.message_content or {}).get("codecs"), self.__udp_server.codecs)
+            self.__udp_server.set_peer_codec(address, codec)
+            self.__udp_server.set_peer_reliable(address, (msg.message_content or {}).get("reliable", False))
+            # 记录服务节点使用的模块，只在其中的模块变化时通知
+            modules = (msg.message_content or {}).get("modules")
+            if modules is not None:
+                self.__service_modules[address] = frozenset(modules)
+            else:
+                self.__service_modules.pop(address, None)
+            self.__udp_server.send(MessagePackage(MessageType.HANDSHAKE_RESPONSE, self.__snapshot_content(codec=codec)), address)
+        elif msg.message_type == MessageType.CONFIGURATION_REQUEST:
+            # 发送配置信息到服务节点
+            # 解释一下为什么需要请求而不是直接获取
+            # 1、因为有可能配置信息还没有完全准备好，所以需要等待
+            # 2、有可能本地的配置版本与主节点的配置版本相同，所以发送请求可以避免重复读取配置
+            # 3、方便代理端的开发，代理端只需要接收配置变更通知即可
+            self.__send_configuration_to_local_node(connection_info)
+        else:
+            logging.info(f"从节点接收到服务节点{address}的数据：" + str(msg))
+
 class MasterNode:
 
     """
@@ -329,6 +1007,9 @@ class MasterNode:
 
     UDP服务端
     1、接收变更配置通知
+
+    TCP服务端
+    1、按长度前缀分帧响应子节点的配置拉取请求
     """
 
     # 组播器
@@ -343,32 +1024,162 @@ class MasterNode:
     # 节点代理端仓储
     __node_client_repository: LocalNodeClientRepository
 
+    # 子节点成员索引（接收路径上只做内存查找）
+    __membership: MembershipIndex = None
+
     # 本地配置仓储
     __local_setting_repository: LocalSettingRepository
 
-    # 代理端连接
-    __client_connections: List[ConnectionInfo]
+    # 子节点连接（按子节点IP地址索引，每台主机一个子节点）
+    __client_connections: ConnectionRegistry = None
+
+    # 定期广播配置摘要的间隔（秒）
+    __broadcast_interval: float = 10
+
+    # 定期从本地配置仓储重新读取配置版本的间隔（秒）
+    __refresh_interval: float = 60 * 60
+
+    # 上次从本地配置仓储读取全部配置版本的时间
+    __refreshed_ts: float = 0
+
+    # TCP服务端（子节点拉取完整配置）
+    __tcp_server: TcpServer = None
+
+    # 配置修订号索引（广播只发送子节点已应用的修订号之后变化的模块）
+    __revision_index: RevisionIndex = None
+
+    # 配置版本摘要树（定期只广播根摘要）
+    __digest: VersionDigest = None
 
-    # 代理端连接锁
-    __client_connections_lock: threading.Lock()
+    # 是否以多主节点模式运行（主节点组成一致性哈希环，每个主节点只负责环上属于自己的子节点）
+    __cluster: bool = False
 
+    # 主节点标识（哈希环的成员）
+    __master_id: str = None
+
+    # 主节点一致性哈希环
+    __ring: HashRing = None
+
+    # 其他主节点的心跳超时时间轮
+    __master_expiry: TimingWheel = None
+
+    # 主节点心跳间隔（秒）
+    __master_heartbeat_interval: float = 5
+
+    # 其他主节点的心跳超时（秒）
+    __master_timeout: float = 15
+
+    # 组播消息工作队列（为空时在接收线程中直接处理）
+    __work_queue: Optional[WorkQueue] = None
+
+    # 子节点模块订阅索引（配置变更只发送到订阅了变化模块的子节点）
+    __subscriptions: SubscriptionIndex = None
+
+    # 模块组播组的分组方案（为空时配置变更逐个发送到子节点）
+    __group_plan: Optional[GroupPlan] = None
+
+    # 合并回复握手的窗口（秒），为0时立即回复
+    __handshake_window: float = 0.05
+
+    # 一次合并回复的最多握手数量
+    __handshake_batch_size: int = 32
+
+    # 等待合并回复的握手（子节点地址, 子节点名称, 编解码器, 子节点上报的内容）
+    __pending_handshakes: List[Tuple[Tuple[str, int], str, str, dict]] = None
+
+    # 握手合并锁
+    __handshake_lock: threading.Lock = None
 
     def __init__(self, multicast_server: MulticastServer, udp_server: UdpServer,
                  node_client_repository: LocalNodeClientRepository,
-                 local_setting_repository: LocalSettingRepository):
+                 local_setting_repository: LocalSettingRepository, **kwargs):
         """
         初始化
         :param multicast_server: 组播服务端
         :param udp_server: UDP服务端 (用于接收配置相关服务的配置变更通知)
         :param node_client_repository: 节点代理端仓储
         :param local_setting_repository: 本地配置仓储
+        :param kwargs: broadcast_interval 定期广播配置摘要的间隔（秒），refresh_interval 定期重新读取本地配置仓储的间隔（秒），
+                       tcp_server 配置拉取的TCP服务端（默认在pull_address:pull_port上创建，为None时不提供配置拉取），
+                       pull_address 配置拉取的监听地址（默认0.0.0.0），pull_port 配置拉取的端口号（默认20003），heartbeat_timeout 子节点的心跳超时（秒）；
+                       cluster 是否以多主节点模式运行，master_id 主节点标识（默认为组播服务端名称），
+                       master_heartbeat_interval 主节点心跳间隔（秒），master_timeout 其他主节点的心跳超时（秒）；
+                       workers 处理组播消息的工作线程数量（默认0，在接收线程中直接处理；大于0时消息在工作线程中并发处理），
+                       queue_size 最多排队的组播消息数量，queue_policies 队列已满时各消息类型的策略（见communication.work_queue）；
+                       change_groups 模块组播组的分组方案{"address": 基准组播地址, "port": 端口号, "count": 组数量}或GroupPlan；
+                       handshake_window 合并回复握手的窗口（秒，默认0.05，为0时立即回复），handshake_batch_size 一次合并回复的最多握手数量
         """
         self.__multicast_server = multicast_server
         self.__udp_server = udp_server
         self.__node_client_repository = node_client_repository
+        self.__membership = MembershipIndex(node_client_repository)
         self.__local_setting_repository = local_setting_repository
-        self.__client_connections = []
-        self.__client_connections_lock = threading.Lock()
+        self.__client_connections = ConnectionRegistry(lambda address: address[0], kwargs.get("heartbeat_timeout", 90))
+        self.__broadcast_interval = kwargs.get("broadcast_interval", 10)
+        self.__refresh_interval = kwargs.get("refresh_interval", 60 * 60)
+        if "tcp_server" in kwargs:
+            self.__tcp_server = kwargs["tcp_server"]
+        else:
+            self.__tcp_server = TcpServer(kwargs.get("pull_address", "0.0.0.0"), kwargs.get("pull_port", 20003))
+        self.__revision_index = RevisionIndex()
+        self.__digest = VersionDigest()
+        self.__subscriptions = SubscriptionIndex()
+        change_groups = kwargs.get("change_groups")
+        self.__group_plan = GroupPlan.from_dict(change_groups) if isinstance(change_groups, dict) else change_groups
+        self.__handshake_window = kwargs.get("handshake_window", 0.05)
+        self.__handshake_batch_size = kwargs.get("handshake_batch_size", 32)
+        self.__pending_handshakes = []
+        self.__handshake_lock = threading.Lock()
+        self.__cluster = kwargs.get("cluster", False)
+        self.__master_id = kwargs.get("master_id") or multicast_server.name
+        self.__ring = HashRing([self.__master_id])
+        self.__master_expiry = TimingWheel()
+        self.__master_heartbeat_interval = kwargs.get("master_heartbeat_interval", 5)
+        self.__master_timeout = kwargs.get("master_timeout", 15)
+        if kwargs.get("workers", 0) > 0:
+            self.__work_queue = WorkQueue(self._handle_multicast_message, workers=kwargs["workers"],
+                                          max_size=kwargs.get("queue_size", 1024), policies=kwargs.get("queue_policies"),
+                                          name="master-worker")
+
+    @property
+    def running(self) -> bool:
+        """
+        是否运行
+        :return:
+        """
+        return self.__running
+
+    @property
+    def revision(self) -> int:
+        """
+        获取当前配置修订号
+        :return:
+        """
+        return self.__revision_index.revision
+
+    @property
+    def cluster(self) -> bool:
+        """
+        是否以多主节点模式运行
+        :return:
+        """
+        return self.__cluster
+
+    @property
+    def master_id(self) -> str:
+        """
+        获取主节点标识
+        :return:
+        """
+        return self.__master_id
+
+    @property
+    def masters(self) -> List[str]:
+        """
+        获取哈希环上存活的主节点
+        :return:
+        """
+        return sorted(self.__ring.members)
 
     def start(self):
         """
@@ -381,53 +1192,375 @@ class MasterNode:
         """
         if not self.__running:
             self.__running = True
+            self.__refresh_revisions()
+            if self.__work_queue:
+                self.__work_queue.start()
             logging.info(f"启动主节点，组播监听地址=>{self.__multicast_server.address}:{self.__multicast_server.port}，UDP监听地址=>{self.__udp_server.address}:{self.__udp_server.port}")
-            # 启动组播接收线程
-            threading.Thread(target=self.__multicast_receive).start()
+            self._run()
+
+    def _run(self):
+        """
+        以线程方式运行组播接收、定期广播与UDP服务端监听
+        :return:
+        """
+        # 启动组播接收线程
+        threading.Thread(target=self.__multicast_receive).start()
+
+        # 定期广播配置变更信息
+        threading.Thread(target=self.__broadcast_configuration_change).start()
+
+        # 启动UDP服务端监听线程
+        threading.Thread(target=self.__udp_server_receive).start()
+
+        # 启动可靠发送的重传线程
+        if self.__multicast_server.reliable:
+            threading.Thread(target=self.__retransmit).start()
+
+        # 启动限速发送线程
+        if self.__multicast_server.pacer:
+            threading.Thread(target=self.__flush).start()
+
+        # 启动子节点心跳超时检查线程
+        threading.Thread(target=self.__expire_connections).start()
+
+        # 启动主节点心跳线程
+        if self.__cluster:
+            threading.Thread(target=self.__master_heartbeat).start()
+
+        self._start_tcp_server()
+
+    def __retransmit(self):
+        """
+        重传发送到子节点的可靠数据
+        :return:
+        """
+        while self.__running:
+            time.sleep(self.__multicast_server.retransmit())
+
+    def _reliable_connections(self) -> List[Connection]:
+        """
+        启用可靠发送、需要定时重传的连接
+        :return:
+        """
+        return [self.__multicast_server] if self.__multicast_server.reliable else []
+
+    def __flush(self):
+        """
+        按限速发出排队的数据报
+        :return:
+        """
+        pacer = self.__multicast_server.pacer
+        while self.__running:
+            pacer.wait(self.__multicast_server.flush())
+
+    def __expire_connections(self):
+        """
+        定期移除心跳超时的子节点
+        :return:
+        """
+        while self.__running:
+            time.sleep(self._expire_connections())
+
+    def _expire_connections(self) -> float:
+        """
+        移除心跳超时的子节点，超时的子节点不再接收配置变更通知
+        :return: 距下次检查的秒数
+        """
+        for connection_info in self.__client_connections.remove_expired():
+            logging.info(f"主节点移除心跳超时的子节点{connection_info.full_address}")
+            self.__subscriptions.unsubscribe(connection_info.address)
+        return self.__client_connections.tick
+
+    def __master_heartbeat(self):
+        """
+        定期广播主节点心跳
+        :return:
+        """
+        while self.__running:
+            time.sleep(self._master_heartbeat())
+
+    def _master_heartbeat(self) -> float:
+        """
+        从哈希环移除心跳超时的主节点，并向组播组广播自己的心跳；
+        移除的主节点负责的子节点心跳无响应后重新握手，由环上新的负责主节点接受
+        :return: 距下次心跳的秒数
+        """
+        for master_id in self.__master_expiry.advance():
+            if self.__ring.remove(master_id):
+                logging.warning(f"主节点{master_id}心跳超时，当前主节点：{self.masters}")
+        self.__multicast_server.broadcast(MessagePackage(MessageType.MASTER_HEARTBEAT, {"id": self.__master_id}))
+        return self.__master_heartbeat_interval
+
+    def __handle_master_heartbeat(self, content: Optional[dict]):
+        """
+        处理其他主节点的心跳：加入哈希环并更新心跳超时，新的主节点加入时立即回复自己的心跳，
+        并释放环上已不属于自己的子节点
+        :param content: {"id": 主节点标识}
+        :return:
+        """
+        master_id = (content or {}).get("id")
+        if not master_id or master_id == self.__master_id:
+            return
+        self.__master_expiry.schedule(master_id, time.monotonic() + self.__master_timeout)
+        if self.__ring.add(master_id):
+            logging.info(f"主节点{master_id}加入，当前主节点：{self.masters}")
+            self.__multicast_server.broadcast(MessagePackage(MessageType.MASTER_HEARTBEAT, {"id": self.__master_id}))
+            self.__release_client_nodes()
+
+    def __owns(self, client_node_ip_address: str) -> bool:
+        """
+        子节点是否由本主节点负责（单主节点模式下负责所有子节点）
+        :param client_node_ip_address: 子节点IP地址
+        :return:
+        """
+        return not self.__cluster or self.__ring.owner(client_node_ip_address) == self.__master_id
+
+    def __release_client_nodes(self):
+        """
+        断开哈希环上已不属于自己的子节点，子节点收到关闭消息后重新握手
+        :return:
+        """
+        for connection_info in self.__client_connections.snapshot():
+            if not self.__owns(connection_info.address):
+                self.__release_client_node(connection_info.socket_address, "rebalance")
+
+    def __release_client_node(self, address: Tuple[str, int], reason: str):
+        """
+        断开子节点，子节点收到关闭消息后重新握手
+        :param address: 子节点地址
+        :param reason: 原因（rebalance：哈希环上已不属于自己，handshake：未在本主节点握手）
+        :return:
+        """
+        logging.info(f"主节点释放子节点{address[0]}:{address[1]}，原因：{reason}")
+        self.__client_connections.remove(address)
+        self.__subscriptions.unsubscribe(address[0])
+        self.__multicast_server.send(MessagePackage(MessageType.CONNECTION_CLOSE, {"reason": reason}), address)
+
+    def _paced_connections(self) -> List[Connection]:
+        """
+        启用发送限速、需要定时发出排队数据的连接
+        :return:
+        """
+        return [self.__multicast_server] if self.__multicast_server.pacer else []
+
+    @property
+    def send_statistics(self) -> Optional[Dict[str, int]]:
+        """
+        获取组播器的发送统计（未启用发送限速时为空）
+        :return: 已发送、曾经排队、丢弃与当前排队的数据报数量
+        """
+        pacer = self.__multicast_server.pacer
+        return pacer.statistics if pacer else None
+
+    @property
+    def receive_statistics(self) -> Optional[Dict[str, Union[int, float, Dict[str, int]]]]:
+        """
+        获取组播消息工作队列的统计（在接收线程中直接处理时为空）
+        :return: 已入队、已处理、当前与最大排队数量、按消息类型的丢弃数量、排队等待与处理时间
+        """
+        return self.__work_queue.statistics if self.__work_queue else None
+
+    def _start_tcp_server(self):
+        """
+        启动TCP服务端线程，持久连接上的请求由TCP服务端的工作线程池处理
+        :return:
+        """
+        if self.__tcp_server:
+            threading.Thread(target=self.__tcp_server.serve, args=(self.__handle_tcp_connection,)).start()
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        if self.__running:
+            self.__running = False
+            if self.__work_queue:
+                self.__work_queue.close()
+            self.__multicast_server.close()
+            self.__udp_server.close()
+            if self.__tcp_server:
+                self.__tcp_server.close()
+
+    def __handle_tcp_connection(self, connection_info: ConnectionInfo) -> bool:
+        """
+        处理持久连接上的一个配置拉取请求
+        :param connection_info: 连接信息
+        :return: 子节点已关闭连接时返回False
+        """
+        framed_socket = FramedSocket(connection_info.socket, sender=self.__tcp_server.name)
+        msg = framed_socket.receive()
+        if msg is None:
+            return False
+        framed_socket.send(self._handle_tcp_request(msg, connection_info.socket_address))
+        return True
 
-            # 定期广播配置变更信息
-            threading.Thread(target=self.__broadcast_configuration_change).start()
+    def _handle_tcp_request(self, msg: MessagePackage, address: Union[Tuple[str, int], str]) -> MessagePackage:
+        """
+        处理配置拉取请求，请求内容为{"modules": [...]}，不指定模块时返回所有模块的配置
+        :param msg: 请求消息
+        :param address: 子节点地址
+        :return: 响应消息
+        """
+        ip_address = address[0] if isinstance(address, tuple) else address
+        if msg.message_type != MessageType.CONFIGURATION_REQUEST or not self.__membership.contains(ip_address):
+            logging.warning(f"主节点拒绝子节点{address}的TCP请求：{msg}")
+            return MessagePackage(MessageType.CONFIGURATION_RESPONSE, {"sections": []})
+        module_names = (msg.message_content or {}).get("modules")
+        if module_names is None:
+            setting_sections = self.__local_setting_repository.get_all()
+        else:
+            setting_sections = [self.__local_setting_repository.get(module_name) for module_name in module_names]
+        logging.info(f"主节点向子节点{address}发送配置：{module_names or '全部模块'}")
+        return MessagePackage(MessageType.CONFIGURATION_RESPONSE,
+                              {"sections": [setting_section.to_dict() for setting_section in setting_sections if setting_section]})
 
-            # 启动UDP服务端监听线程
-            threading.Thread(target=self.__udp_server_receive).start()
+    def __configuration_content(self, **content) -> dict:
+        """
+        附加配置拉取端口的消息内容
+        :param content:
+        :return:
+        """
+        if self.__tcp_server:
+            content["config_port"] = self.__tcp_server.port
+        return content
 
     def __multicast_receive(self):
         """
         接收组播消息
+        :return:
+        """
+        while self.__running:
+            try:
+                msg, client_node_address = self.__multicast_server.receive()
+                self._dispatch_multicast_message(msg, client_node_address)
+            except Exception as e:
+                logging.warning(f"主节点处理组播消息异常：{e}")
+
+    def _dispatch_multicast_message(self, msg: MessagePackage, client_node_address: Tuple[str, int]):
+        """
+        接收路径只把解码后的消息放入工作队列，由工作线程处理，队列已满时按消息类型的策略丢弃
+        :param msg: 消息
+        :param client_node_address: 子节点地址
+        :return:
+        """
+        # 忽略无法解析的消息与自己发送的消息
+        if not msg or msg.sender == self.__multicast_server.name:
+            return
+        if self.__work_queue:
+            self.__work_queue.submit(msg, client_node_address)
+        else:
+            self._handle_multicast_message(msg, client_node_address)
+
+    def _handle_multicast_message(self, msg: MessagePackage, client_node_address: Tuple[str, int]):
+        """
+        处理组播消息
 
         1、子节点握手请求消息
         1.1、识别此子节点是否是自己的子节点，如果是执行下面的操作
         1.2、是否已经存在此子节点，如果不存在则添加到子节点列表中，更新子节心跳时间
         1.3、回复握手成功消息
         1.4、下发配置版本地址
+        :param msg: 消息
+        :param client_node_address: 子节点地址
         :return:
         """
-        while self.__running:
-            msg, client_node_address = self.__multicast_server.receive()
-
-            client_node_ip_address:str = client_node_address[0]
-            port = client_node_address[1]
-
-            # 忽略自己发送的消息
-            if msg.sender != self.__multicast_server.name:
-                # 识别此子节点是否是自己的子节点，如果是执行下面的操作
-                if self.__node_client_repository.get(client_node_ip_address):
-                    if msg.message_type == MessageType.HANDSHAKE_REQUEST:
-                        logging.info(f"主节点收到从节点{client_node_ip_address}:{port}的握手请求")
-                        # 处理子节点心跳
-                        self.__hand_client_node_heartbeat(client_node_ip_address, port)
-                        # 回复握手成功消息
-                        self.__multicast_server.send(MessagePackage(MessageType.HANDSHAKE_RESPONSE, None, msg.sender), client_node_address)
-                        # 下发配置版本
-                        self.__send_configuration_to_client_node(client_node_address, msg.sender)
-                    elif msg.message_type == MessageType.HEARTBEAT_REQUEST:
-                        # 处理子节点心跳
-                        logging.info(f"主节点收到从节点{client_node_ip_address}:{port}的心跳")
-                        self.__hand_client_node_heartbeat(client_node_ip_address, port)
-                    elif msg.message_type == MessageType.CONFIGURATION_REQUEST:
-                        # 发送配置信息到服务节点
-                        logging.info(f"主节点收到从节点{client_node_ip_address}:{port}的配置请求")
-                        self.__send_configuration_to_client_node(client_node_address, msg.sender)
+        client_node_ip_address:str = client_node_address[0]
+        port = client_node_address[1]
+
+        # 忽略无法解析的消息与自己发送的消息
+        if msg and msg.sender != self.__multicast_server.name:
+            if msg.message_type == MessageType.MASTER_HEARTBEAT:
+                # 多主节点模式下维护哈希环
+                if self.__cluster:
+                    self.__handle_master_heartbeat(msg.message_content)
+            # 识别此子节点是否是自己的子节点，如果是执行下面的操作
+            elif self.__membership.contains(client_node_ip_address):
+                if msg.message_type == MessageType.HANDSHAKE_REQUEST:
+                    # 多主节点模式下只有哈希环上负责此子节点的主节点回复握手
+                    if not self.__owns(client_node_ip_address):
+                        return
+                    logging.info(f"主节点收到从节点{client_node_ip_address}:{port}的握手请求")
+                    # 处理子节点心跳
+                    self.__hand_client_node_heartbeat(client_node_ip_address, port)
+                    # 记录子节点订阅的模块，不声明时订阅所有模块；接收端口与分组方案一致的子节点通过模块组播组接收配置变更
+                    content = msg.message_content or {}
+                    multicast = self.__group_plan is not None and content.get("group_port") == self.__group_plan.port
+                    self.__subscriptions.subscribe(client_node_ip_address, client_node_address, content.get("modules"),
+                                                   self.__revision_index.get_all, multicast)
+                    # 协商编解码器，旧版本子节点不携带编解码器列表时回退到JSON
+                    codec = negotiate_codec((msg.message_content or {}).get("codecs"), self.__multicast_server.codecs)
+                    self.__multicast_server.set_peer_codec(client_node_address, codec)
+                    self.__multicast_server.set_peer_reliable(client_node_address, (msg.message_content or {}).get("reliable", False))
+                    # 握手窗口内的握手合并回复
+                    self.__accept_handshake(client_node_address, msg.sender, codec, content)
+                elif msg.message_type == MessageType.HEARTBEAT_REQUEST:
+                    # 哈希环变化后不再负责的子节点重新握手
+                    if not self.__owns(client_node_ip_address):
+                        self.__release_client_node(client_node_address, "rebalance")
+                        return
+                    # 未在本主节点握手（如主节点重启或子节点更换端口）的子节点重新握手以声明订阅的模块
+                    if not self.__subscriptions.is_subscribed(client_node_ip_address, client_node_address):
+                        self.__release_client_node(client_node_address, "handshake")
+                        return
+                    # 处理子节点心跳
+                    logging.info(f"主节点收到从节点{client_node_ip_address}:{port}的心跳")
+                    self.__hand_client_node_heartbeat(client_node_ip_address, port)
+                    # 回复心跳，子节点据此判断主节点存活
+                    self.__multicast_server.send(MessagePackage(MessageType.HEARTBEAT_RESPONSE, None, msg.sender), client_node_address)
+                    # 子节点落后时补发变化的配置版本
+                    if self.__is_behind(msg.message_content):
+                        self.__send_configuration_to_client_node(client_node_address, msg.sender, msg.message_content)
+                elif msg.message_type == MessageType.CONFIGURATION_REQUEST:
+                    # 发送配置信息到服务节点
+                    logging.info(f"主节点收到从节点{client_node_ip_address}:{port}的配置请求")
+                    self.__send_configuration_to_client_node(client_node_address, msg.sender, msg.message_content)
+                elif msg.message_type == MessageType.DIGEST_REQUEST:
+                    # 子节点逐层比较摘要树
+                    self.__send_digest_to_client_node(client_node_address, msg.sender, msg.message_content or {})
+
+    def __accept_handshake(self, address: Tuple[str, int], sender: str, codec: str, reported: dict):
+        """
+        记录已接受的握手，窗口内的第一个握手启动定时器，窗口结束或数量达到上限时合并回复
+        :param address: 子节点地址
+        :param sender: 子节点名称
+        :param codec: 协商的编解码器
+        :param reported: 子节点上报的{"epoch": 纪元, "revision": 已应用的修订号}
+        :return:
+        """
+        with self.__handshake_lock:
+            self.__pending_handshakes.append((address, sender, codec, reported))
+            pending = len(self.__pending_handshakes)
+        if self.__handshake_window <= 0 or pending >= self.__handshake_batch_size:
+            self.__flush_handshakes()
+        elif pending == 1:
+            timer = threading.Timer(self.__handshake_window, self.__flush_handshakes)
+            timer.daemon = True
+            timer.start()
+
+    def __flush_handshakes(self):
+        """
+        合并回复窗口内的握手：一条握手成功消息列出所有接受的子节点及其编解码器，只编码一次发送到这些子节点；
+        已应用的修订号与订阅的模块相同的子节点下发同一组配置版本消息
+        :return:
+        """
+        with self.__handshake_lock:
+            pending, self.__pending_handshakes = self.__pending_handshakes, []
+        if not pending:
+            return
+        logging.info(f"主节点合并回复{len(pending)}个子节点的握手")
+        response = self.__configuration_content(accepted=[[sender, codec] for _, sender, codec, _ in pending])
+        if self.__group_plan:
+            response["groups"] = self.__group_plan.to_dict()
+        self.__multicast_server.send_all(MessagePackage(MessageType.HANDSHAKE_RESPONSE, response), [address for address, _, _, _ in pending])
+        # 下发子节点已应用的修订号之后变化的配置版本
+        groups: Dict[Tuple[Optional[int], Optional[FrozenSet[str]]], List[Tuple[str, int]]] = {}
+        for address, _, _, reported in pending:
+            key = (self.__since_of(reported), self.__subscriptions.subscription(address[0]))
+            groups.setdefault(key, []).append(address)
+        for (since, subscription), destinations in groups.items():
+            for content in self.__version_contents(since, subscription):
+                self.__multicast_server.send_all(MessagePackage(MessageType.CONFIGURATION_BROADCAST, content), destinations, reliable=True)
 
     def __hand_client_node_heartbeat(self, client_node_ip_address, port):
         """
@@ -436,29 +1569,157 @@ class MasterNode:
         :param port:
         :return:
         """
-        with self.__client_connections_lock:
-            # 是否已经存在此子节点，如果不存在则添加到子节点列表中，更新子节心跳时间
-            filter_client_connections = [client_connection for client_connection in self.__client_connections if client_connection.equal(client_node_ip_address)]
-            if len(filter_client_connections) == 0:
-                connection_info = ConnectionInfo.from_address(client_node_ip_address)
-                self.__client_connections.append(connection_info)
+        # 不存在时添加，已存在时更新心跳时间，子节点重启后端口变化时替换为新的连接
+        self.__client_connections.touch((client_node_ip_address, port))
+
+    def __refresh_revisions(self, module_names: List[str] = None) -> List[SettingVersion]:
+        """
+        从本地配置仓储读取模块的配置版本，版本变化的模块记录新的修订号
+        :param module_names: 变化的模块，为空时读取所有模块
+        :return: 版本变化的模块
+        """
+        if module_names is None:
+            setting_versions = self.__local_setting_repository.get_module_setting_versions()
+            self.__refreshed_ts = time.monotonic()
+            self.__digest.update(setting_versions, complete=True)
+            self.__subscriptions.update(setting_versions, complete=True)
+            return self.__revision_index.update(setting_versions, complete=True)
+        setting_versions = []
+        removed_names = []
+        for module_name in module_names:
+            setting_section = self.__local_setting_repository.get(module_name)
+            if setting_section:
+                setting_versions.append(SettingVersion(setting_section.module_name, setting_section.version, SettingVersionType.SECTION))
             else:
-                connection_info = filter_client_connections[0]
-                connection_info.update_heartbeat_ts()
+                removed_names.append(module_name)
+        self.__revision_index.remove(removed_names)
+        self.__digest.remove(removed_names)
+        self.__digest.update(setting_versions)
+        self.__subscriptions.update(setting_versions, removed_names)
+        return self.__revision_index.update(setting_versions)
+
+    def __is_behind(self, content: Optional[dict]) -> bool:
+        """
+        子节点上报的修订号是否落后于主节点
+        :param content: 子节点上报的{"epoch": 纪元, "revision": 已应用的修订号}
+        :return:
+        """
+        content = content or {}
+        return content.get("epoch") != self.__revision_index.epoch or content.get("revision", 0) < self.__revision_index.revision
 
-    def __send_configuration_to_client_node(self, address, receiver: str = None, send_way=MessageType.CONFIGURATION_BROADCAST):
+    def __version_contents(self, since: Optional[int] = None, subscription: Optional[FrozenSet[str]] = None) -> List[dict]:
         """
-        下发配置版本到子节点
+        生成配置版本消息内容，多个配置版本打包到尽可能少的数据报中
+
+        内容为{"versions": [...], "epoch": 纪元, "revision": 修订号, "since": 基准修订号, "part": 序号, "parts": 总数, "digest": 根摘要}，
+        since为空时为全部模块的配置版本，否则只包含基准修订号之后变化的模块；没有变化时也生成一条内容，子节点据此确认已是最新。
+        指定订阅的模块集合时只包含其中的模块，根摘要为该模块集合的摘要树的根摘要
+        :param since: 基准修订号
+        :param subscription: 订阅的模块集合，为空时为所有模块
+        :return:
+        """
+        revision = self.__revision_index.revision
+        if since is None:
+            setting_versions = self.__revision_index.get_all()
+        else:
+            setting_versions = self.__revision_index.changes_since(since)
+        digest = self.__digest
+        if subscription is not None:
+            setting_versions = [setting_version for setting_version in setting_versions if setting_version.name in subscription]
+            digest = self.__subscriptions.digest(subscription) or digest
+        versions = [setting_version.to_dict() for setting_version in setting_versions]
+        batches = batch_contents(versions, self.__multicast_server.max_datagram_size, 320) or [[]]
+        contents = []
+        for part, batch in enumerate(batches):
+            content = self.__configuration_content(versions=batch, epoch=self.__revision_index.epoch, revision=revision,
+                                                   part=part, parts=len(batches), digest=digest.root)
+            if since is not None:
+                content["since"] = since
+            contents.append(content)
+        return contents
+
+    def __send_configuration_to_client_node(self, address, receiver: str = None, reported: Optional[dict] = None,
+                                            send_way=MessageType.CONFIGURATION_BROADCAST):
+        """
+        下发配置版本到子节点，子节点上报的纪元与主节点相同时只下发其已应用的修订号之后变化的模块
         :param address: 子节点地址
         :param receiver: 接收者
+        :param reported: 子节点上报的{"epoch": 纪元, "revision": 已应用的修订号}
         :param send_way: 发送方式（默认广播）
         :return:
         """
-        setting_versions = self.__local_setting_repository.get_module_setting_versions()
-        if setting_versions:
-            for setting_version in setting_versions:
-                # 下发配置版本地址
-                self.__multicast_server.send(MessagePackage(send_way, setting_version.to_dict(), receiver), address)
+        since = self.__since_of(reported)
+        for content in self.__version_contents(since, self.__subscriptions.subscription(address[0])):
+            self.__multicast_server.send(MessagePackage(send_way, content, receiver), address, reliable=True)
+
+    def __since_of(self, reported: Optional[dict]) -> Optional[int]:
+        """
+        子节点上报的纪元与主节点相同时以其已应用的修订号为基准修订号
+        :param reported: 子节点上报的{"epoch": 纪元, "revision": 已应用的修订号}
+        :return: 为空时需要下发全部模块的配置版本
+        """
+        reported = reported or {}
+        if reported.get("epoch") == self.__revision_index.epoch and 0 <= reported.get("revision", -1) <= self.__revision_index.revision:
+            return reported["revision"]
+        return None
+
+    def __send_digest_to_client_node(self, address, receiver: str, content: dict):
+        """
+        回复子节点的摘要请求：{"nodes": [[层, 序号], ...]}回复子节点摘要{"children": [[层, 序号, 摘要], ...]}，
+        {"buckets": [桶序号, ...]}回复桶内的配置版本{"buckets": [[桶序号, {模块名称: 版本}], ...]}
+        :param address: 子节点地址
+        :param receiver: 接收者
+        :param content: 请求内容
+        :return:
+        """
+        # 声明订阅的子节点与其订阅的模块集合的摘要树比较
+        digest = self.__subscriptions.digest(self.__subscriptions.subscription(address[0])) or self.__digest
+        if "buckets" in content:
+            buckets = digest.bucket_versions(content["buckets"])
+            response = {"buckets": [[bucket, versions] for bucket, versions in buckets.items()]}
+        else:
+            response = {"children": [list(child) for child in digest.children(tuple(node) for node in content.get("nodes", []))]}
+        self.__multicast_server.send(MessagePackage(MessageType.DIGEST_RESPONSE, response, receiver), address, reliable=True)
+
+    def __notify_configuration_change(self, module_names: List[str] = None):
+        """
+        通知订阅了变化模块的子节点配置变更，只发送本次变化的模块，订阅相同模块集合的子节点每批配置版本只编码一次
+        :param module_names: 变化的模块，为空时检查所有模块
+        :return:
+        """
+        since = self.__revision_index.revision
+        changed = self.__refresh_revisions(module_names)
+        if not changed:
+            return
+        if self.__group_plan:
+            self.__multicast_configuration_change(since)
+        for subscription, destinations in self.__subscriptions.fan_out((setting_version.name for setting_version in changed),
+                                                                       self.__group_plan is not None).items():
+            for content in self.__version_contents(since, subscription):
+                self.__multicast_server.send_all(MessagePackage(MessageType.CONFIGURATION_CHANGE, content), destinations, reliable=True)
+
+    def __multicast_configuration_change(self, since: int):
+        """
+        把基准修订号之后变化的模块按所在的组发送到各组的组播地址，只有加入了该组的子节点会收到
+
+        内容为{"versions": [...], "epoch": 纪元, "revision": 修订号, "since": 基准修订号, "group": 组序号, "part": 组内序号, "parts": 组内总数,
+        "groups": [[组序号, 组内总数], ...]}，子节点收齐已加入的组的部分后推进修订号，丢失的部分由定期广播发现并请求补发
+        :param since: 基准修订号
+        :return:
+        """
+        revision = self.__revision_index.revision
+        group_versions: Dict[int, List[dict]] = {}
+        for setting_version in self.__revision_index.changes_since(since):
+            group_versions.setdefault(self.__group_plan.group_of(setting_version.name), []).append(setting_version.to_dict())
+        group_batches = {group: batch_contents(versions, self.__multicast_server.max_datagram_size, 320)
+                         for group, versions in group_versions.items()}
+        groups = [[group, len(batches)] for group, batches in group_batches.items()]
+        for group, batches in group_batches.items():
+            destination = (self.__group_plan.address_of(group), self.__group_plan.port)
+            for part, batch in enumerate(batches):
+                content = self.__configuration_content(versions=batch, epoch=self.__revision_index.epoch, revision=revision, since=since,
+                                                       group=group, part=part, parts=len(batches), groups=groups)
+                self.__multicast_server.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, content), destination)
 
     def __broadcast_configuration_change(self):
         """
@@ -466,12 +1727,24 @@ class MasterNode:
         :return:
         """
         while self.__running:
-            logging.info("主节点定期广播配置变更信息")
-            self.__send_configuration_to_client_node((self.__multicast_server.address, self.__multicast_server.port))
-            time.sleep(60*60)
-            with self.__client_connections_lock:
-                # 移除超时的子节点
-                self.__client_connections = [client_connection for client_connection in self.__client_connections if not client_connection.is_expire()]
+            time.sleep(self._broadcast_configuration_change())
+
+    def _broadcast_configuration_change(self) -> float:
+        """
+        广播一次配置变更信息
+        :return: 距下次广播的秒数
+        """
+        groups = self.__subscriptions.groups()
+        # 只广播本次检查发现变化的模块，没有变化时只广播当前修订号与根摘要，落后的子节点请求补发，不一致的子节点逐层比较摘要树
+        since = self.__revision_index.revision
+        if time.monotonic() - self.__refreshed_ts >= self.__refresh_interval:
+            logging.info("主节点重新读取配置版本")
+            self.__refresh_revisions()
+        # 子节点的组播客户端不监听组播端口，逐个发送到已连接的子节点，订阅相同模块集合的子节点每条消息只编码一次
+        for subscription, destinations in groups.items():
+            for content in self.__version_contents(since, subscription):
+                self.__multicast_server.send_all(MessagePackage(MessageType.CONFIGURATION_BROADCAST, content), destinations)
+        return self.__broadcast_interval
 
     def __udp_server_receive(self):
         """
@@ -481,8 +1754,17 @@ class MasterNode:
         while self.__running:
             try:
                 msg, address = self.__udp_server.receive()
-                if msg.message_type == MessageType.CONFIGURATION_CHANGE:
-                    # TODO 处理并保存配置变更
-                    self.__broadcast_configuration_change()
+                self._handle_udp_message(msg, address)
             except Exception as e:
-                logging.warning(e)
\ No newline at end of file
+                logging.warning(e)
+
+    def _handle_udp_message(self, msg: MessagePackage, address: Union[Tuple[str, int], str]):
+        """
+        处理UDP客户端发送的消息
+        :param msg: 消息
+        :param address: 客户端地址
+        :return:
+        """
+        if msg and msg.message_type == MessageType.CONFIGURATION_CHANGE:
+            # 变更通知可携带{"modules": [...]}，只检查其中的模块
+            self.__notify_configuration_change((msg.message_content or {}).get("modules"))
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+发送限速
+
+令牌桶按每秒数据报数与每秒字节数限制连接的发送速率，超出速率的数据报排队，由定时任务按令牌补充的速度平滑发出，
+避免配置变更或大量子节点同时握手时瞬间发出的突发数据溢出交换机与接收方的缓冲区而被丢弃。
+控制消息（握手、心跳、确认等）优先于配置数据发送，排队已满时优先丢弃配置数据。
+"""
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Deque, Dict, Optional, Tuple, Union
+
+# 对端地址
+Address = Union[Tuple[str, int], str]
+
+# 控制消息优先级
+PRIORITY_CONTROL = 0
+
+# 数据优先级
+PRIORITY_BULK = 1
+
+
+class TokenBucket:
+    """
+    令牌桶
+    """
+
+    # 每秒补充的令牌数量（为空时不限制）
+    __rate: Optional[float] = None
+
+    # 桶容量（允许的突发数量）
+    __capacity: float = 0
+
+    # 当前令牌数量
+    __tokens: float = 0
+
+    # 上次补充令牌的时间
+    __updated: float = 0
+
+    def __init__(self, rate: Optional[float], capacity: float = None):
+        """
+        初始化
+        :param rate: 每秒补充的令牌数量，为空或0时不限制
+        :param capacity: 桶容量，默认为1/20秒补充的令牌数量（至少为1）
+        """
+        self.__rate = rate or None
+        self.__capacity = capacity if capacity is not None else max(1.0, (rate or 0) / 20)
+        self.__tokens = self.__capacity
+        self.__updated = time.monotonic()
+
+    def __refill(self, now: float):
+        """
+        按经过的时间补充令牌
+        :param now: 当前时间
+        :return:
+        """
+        if now > self.__updated:
+            self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+            self.__updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """
+        获取令牌足够还需等待的秒数（超过桶容量的数量在桶满时即视为足够）
+        :param amount: 需要的令牌数量
+        :param now: 当前时间
+        :return:
+        """
+        if self.__rate is None:
+            return 0.0
+        self.__refill(now)
+        needed = min(amount, self.__capacity) - self.__tokens
+        return needed / self.__rate if needed > 0 else 0.0
+
+    def consume(self, amount: float, now: float):
+        """
+        消耗令牌（令牌数量可以为负，之后的发送相应推迟）
+        :param amount: 令牌数量
+        :param now: 当前时间
+        :return:
+        """
+        if self.__rate is not None:
+            self.__refill(now)
+            self.__tokens -= amount
+
+
+class Pacer:
+    """
+    发送限速器
+    """
+
+    # 数据报发送函数
+    __send: Callable[[bytes, Address], None] = None
+
+    # 数据报数量令牌桶
+    __packets: TokenBucket = None
+
+    # 字节数令牌桶
+    __bytes: TokenBucket = None
+
+    # 排队的控制消息与数据（数据报, 目标地址）
+    __queues: Tuple[Deque[Tuple[bytes, Address]], Deque[Tuple[bytes, Address]]] = None
+
+    # 最多排队的数据报数量
+    __max_queue: int = 4096
+
+    # 没有排队数据时的轮询间隔（秒）
+    __idle_interval: float = 0.05
+
+    # 队列锁
+    __lock: threading.Lock = None
+
+    # 有数据排队时通知发送线程
+    __pending: threading.Event = None
+
+    # 已发送的数据报数量
+    __sent: int = 0
+
+    # 曾经排队的数据报数量
+    __queued: int = 0
+
+    # 丢弃的数据报数量
+    __dropped: int = 0
+
+    def __init__(self, send: Callable[[bytes, Address], None], **kwargs):
+        """
+        初始化
+        :param send: 数据报发送函数
+        :param kwargs: packets_per_second 每秒最多发送的数据报数量，bytes_per_second 每秒最多发送的字节数（为空或0时不限制），
+                       burst_packets / burst_bytes 允许的突发数量，max_queue 最多排队的数据报数量，idle_interval 空闲时的轮询间隔（秒）
+        """
+        self.__send = send
+        self.__packets = TokenBucket(kwargs.get("packets_per_second"), kwargs.get("burst_packets"))
+        self.__bytes = TokenBucket(kwargs.get("bytes_per_second"), kwargs.get("burst_bytes"))
+        self.__queues = (collections.deque(), collections.deque())
+        self.__max_queue = kwargs.get("max_queue", 4096)
+        self.__idle_interval = kwargs.get("idle_interval", 0.05)
+        self.__lock = threading.Lock()
+        self.__pending = threading.Event()
+
+    @property
+    def sent(self) -> int:
+        """
+        获取已发送的数据报数量
+        :return:
+        """
+        return self.__sent
+
+    @property
+    def queued(self) -> int:
+        """
+        获取曾经因超出速率而排队的数据报数量
+        :return:
+        """
+        return self.__queued
+
+    @property
+    def dropped(self) -> int:
+        """
+        获取排队已满而丢弃的数据报数量
+        :return:
+        """
+        return self.__dropped
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        获取当前排队的数据报数量
+        :return:
+        """
+        return len(self.__queues[PRIORITY_CONTROL]) + len(self.__queues[PRIORITY_BULK])
+
+    @property
+    def statistics(self) -> Dict[str, int]:
+        """
+        获取发送统计
+        :return: 已发送、曾经排队、丢弃与当前排队的数据报数量
+        """
+        return {"sent": self.__sent, "queued": self.__queued, "dropped": self.__dropped, "queue_depth": self.queue_depth}
+
+    def send(self, datagram: bytes, destination: Address, priority: int = PRIORITY_BULK):
+        """
+        发送数据报，没有令牌时排队；控制消息只需等待排队中的控制消息
+        :param datagram: 数据报
+        :param destination: 目标地址
+        :param priority: 优先级
+        :return:
+        """
+        now = time.monotonic()
+        with self.__lock:
+            waiting = self.__queues[PRIORITY_CONTROL] or (priority == PRIORITY_BULK and self.__queues[PRIORITY_BULK])
+            if not waiting and self.__delay(len(datagram), now) == 0:
+                self.__consume(len(datagram), now)
+            else:
+                self.__enqueue(datagram, destination, priority)
+                return
+        self.__send(datagram, destination)
+
+    def __enqueue(self, datagram: bytes, destination: Address, priority: int):
+        """
+        排队，队列已满时丢弃最早排队的数据，队列中全是控制消息时丢弃新的数据报
+        :param datagram: 数据报
+        :param destination: 目标地址
+        :param priority: 优先级
+        :return:
+        """
+        if self.queue_depth >= self.__max_queue:
+            self.__dropped += 1
+            if not self.__queues[PRIORITY_BULK]:
+                logging.warning(f"发送队列已满，丢弃发送到{destination}的数据")
+                return
+            _, dropped_destination = self.__queues[PRIORITY_BULK].popleft()
+            logging.warning(f"发送队列已满，丢弃发送到{dropped_destination}的数据")
+        self.__queues[priority].append((datagram, destination))
+        self.__queued += 1
+        self.__pending.set()
+
+    def __delay(self, size: int, now: float) -> float:
+        """
+        获取发送一个数据报还需等待的秒数
+        :param size: 数据报字节数
+        :param now: 当前时间
+        :return:
+        """
+        return max(self.__packets.delay(1, now), self.__bytes.delay(size, now))
+
+    def __consume(self, size: int, now: float):
+        """
+        发送一个数据报消耗令牌
+        :param size: 数据报字节数
+        :param now: 当前时间
+        :return:
+        """
+        self.__packets.consume(1, now)
+        self.__bytes.consume(size, now)
+        self.__sent += 1
+
+    def flush(self) -> float:
+        """
+        按令牌补充的速度发出排队的数据报，控制消息优先
+        :return: 距下次需要发送的秒数
+        """
+        now = time.monotonic()
+        datagrams = []
+        delay = self.__idle_interval
+        with self.__lock:
+            while True:
+                queue = self.__queues[PRIORITY_CONTROL] or self.__queues[PRIORITY_BULK]
+                if not queue:
+                    self.__pending.clear()
+                    delay = self.__idle_interval
+                    break
+                datagram, destination = queue[0]
+                delay = self.__delay(len(datagram), now)
+                if delay > 0:
+                    break
+                queue.popleft()
+                self.__consume(len(datagram), now)
+                datagrams.append((datagram, destination))
+        for datagram, destination in datagrams:
+            try:
+                self.__send(datagram, destination)
+            except OSError as e:
+                logging.warning(f"发送数据到{destination}失败：{e}")
+        return delay
+
+    def wait(self, timeout: float):
+        """
+        等待到下次需要发送的时间，期间有数据排队时提前返回（供线程方式运行的发送线程使用）
+        :param timeout: 最长等待秒数
+        :return:
+        """
+        if timeout <= 0:
+            return
+        if self.queue_depth:
+            # 排队的数据在等待令牌
+            time.sleep(timeout)
+        else:
+            self.__pending.wait(timeout)
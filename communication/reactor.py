@@ -0,0 +1,191 @@
+"""
+基于selectors的单线程反应器
+
+在一个线程中复用多个连接的套接字，并按截止时间执行定时任务，
+消息仍交给节点已有的消息处理函数
+"""
+import heapq
+import itertools
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from communication.multicast_connection import Connection, MessageHandler
+
+
+class Reactor:
+    """
+    单线程反应器
+    """
+
+    # 选择器
+    __selector: selectors.BaseSelector = None
+
+    # 定时任务（截止时间, 序号, 任务）
+    __timers: List[Tuple[float, int, Callable[[], None]]] = None
+
+    # 定时任务序号（截止时间相同时保持先后顺序）
+    __timer_sequence: itertools.count = None
+
+    # 唤醒套接字（停止时中断等待）
+    __wakeup_sockets: Tuple[socket.socket, socket.socket] = None
+
+    # 定时任务锁（允许其他线程添加定时任务）
+    __timers_lock: threading.Lock = None
+
+    # 是否运行
+    __running: bool = False
+
+    def __init__(self):
+        """
+        初始化
+        """
+        self.__selector = selectors.DefaultSelector()
+        self.__timers = []
+        self.__timer_sequence = itertools.count()
+        self.__timers_lock = threading.Lock()
+        self.__wakeup_sockets = socket.socketpair()
+        for wakeup_socket in self.__wakeup_sockets:
+            wakeup_socket.setblocking(False)
+        self.__selector.register(self.__wakeup_sockets[0], selectors.EVENT_READ, None)
+
+    @property
+    def running(self) -> bool:
+        """
+        是否运行
+        :return:
+        """
+        return self.__running
+
+    def register(self, connection: Connection, handler: MessageHandler):
+        """
+        注册连接，套接字可读时接收一个数据报并交给消息处理函数
+        :param connection: 连接
+        :param handler: 消息处理函数
+        :return:
+        """
+        self.__selector.register(connection.selectable, selectors.EVENT_READ, (connection, handler))
+
+    def call_later(self, delay: float, callback: Callable[[], None]):
+        """
+        延迟执行任务
+        :param delay: 延迟秒数
+        :param callback: 任务
+        :return:
+        """
+        with self.__timers_lock:
+            heapq.heappush(self.__timers, (time.monotonic() + delay, next(self.__timer_sequence), callback))
+        self.__wakeup()
+
+    def repeat(self, tick: Callable[[], float]):
+        """
+        定时执行任务，任务返回距下次执行的秒数
+        :param tick: 任务
+        :return:
+        """
+        def run_tick():
+            try:
+                delay = tick()
+            except Exception as e:
+                logging.warning(f"定时任务执行异常：{e}")
+                delay = 1
+            if self.__running:
+                self.call_later(delay, run_tick)
+        self.call_later(0, run_tick)
+
+    def run(self):
+        """
+        在当前线程中运行，直到停止
+        :return:
+        """
+        self.__running = True
+        try:
+            while self.__running:
+                for key, _ in self.__selector.select(self.__next_timeout()):
+                    if key.data is None:
+                        self.__drain_wakeup()
+                    else:
+                        self.__receive(*key.data)
+                self.__run_due_timers()
+        finally:
+            # 停止后未执行的定时任务一并取消
+            with self.__timers_lock:
+                self.__timers.clear()
+            self.__selector.close()
+            for wakeup_socket in self.__wakeup_sockets:
+                wakeup_socket.close()
+
+    def stop(self):
+        """
+        停止运行，未执行的定时任务被取消
+        :return:
+        """
+        if self.__running:
+            self.__running = False
+            self.__wakeup()
+
+    @staticmethod
+    def __receive(connection: Connection, handler: MessageHandler):
+        """
+        接收一个数据报并处理，连接缓存了已接收完整的消息时一并处理
+        :param connection: 连接
+        :param handler: 消息处理函数
+        :return:
+        """
+        while True:
+            try:
+                completed, msg, address = connection.receive_datagram()
+                if completed:
+                    handler(msg, address)
+            except Exception as e:
+                logging.warning(f"连接{connection.name}处理数据异常：{e}")
+                return
+            if not connection.pending:
+                return
+
+    def __next_timeout(self):
+        """
+        距最近一个定时任务的秒数，没有定时任务时一直等待
+        :return:
+        """
+        with self.__timers_lock:
+            if not self.__timers:
+                return None
+            return max(0.0, self.__timers[0][0] - time.monotonic())
+
+    def __run_due_timers(self):
+        """
+        执行已到期的定时任务
+        :return:
+        """
+        now = time.monotonic()
+        while True:
+            with self.__timers_lock:
+                if not self.__timers or self.__timers[0][0] > now:
+                    return
+                _, _, callback = heapq.heappop(self.__timers)
+            callback()
+
+    def __wakeup(self):
+        """
+        唤醒等待中的选择器
+        :return:
+        """
+        try:
+            self.__wakeup_sockets[1].send(b"\0")
+        except OSError:
+            pass
+
+    def __drain_wakeup(self):
+        """
+        读空唤醒套接字
+        :return:
+        """
+        try:
+            while self.__wakeup_sockets[0].recv(1024):
+                pass
+        except OSError:
+            pass
@@ -0,0 +1,393 @@
+"""
+可靠UDP
+
+在数据报之上为单播消息提供按对端的序号、选择确认、超时重传与滑动窗口，
+丢失的配置变更在毫秒级重传收敛，不必等待下一次全量广播，也不必改用TCP。
+
+数据：魔数(1) + 版本(1) + 类型(1) + 会话ID(4) + 序号(4) + 最小未确认序号(4) + 数据报（编码后的消息或分片）
+确认：魔数(1) + 版本(1) + 类型(1) + 会话ID(4) + 累计确认序号(4) + 选择确认位图(8)
+累计确认序号为接收方期望的下一个序号，位图第i位表示序号 累计确认序号+1+i 已收到。
+最小未确认序号在每次发送（含重传）时填写，之前的序号已确认或已被发送方放弃，接收方据此越过缺口推进累计确认序号，
+未确认的数据不超过一个窗口，选择确认位图总能覆盖。
+会话ID按对端随机生成，序号从0开始；数据全部确认后发送方状态被清理，但保留对端的会话ID与下一个序号，
+之后的发送沿用原会话继续计数，接收方不会把新数据当作重复数据丢弃。保留的序号超出上限被淘汰时使用新的会话ID，
+对端重启后同样按新会话重新计数。
+接收方收到新数据立即交付（不等待之前的序号），消息的先后由配置版本保证。
+"""
+import collections
+import logging
+import random
+import struct
+import threading
+import time
+from typing import Callable, Dict, List, Optional, OrderedDict, Set, Tuple, Union
+
+# 对端地址
+Address = Union[Tuple[str, int], str]
+
+
+class _SentPacket:
+    """
+    已发送未确认的数据
+    """
+
+    __slots__ = ("datagram", "sent_ts", "deadline", "retries")
+
+    def __init__(self, datagram: bytes, sent_ts: float, deadline: float):
+        self.datagram = datagram
+        self.sent_ts = sent_ts
+        self.deadline = deadline
+        self.retries = 0
+
+
+class _SenderState:
+    """
+    发送方状态（每个对端一个）
+    """
+
+    __slots__ = ("session", "next_sequence", "unacked", "queue", "srtt", "rttvar", "rto")
+
+    def __init__(self, session: int, next_sequence: int, initial_rto: float):
+        self.session = session
+        self.next_sequence = next_sequence
+        self.unacked: OrderedDict[int, _SentPacket] = collections.OrderedDict()
+        self.queue: collections.deque = collections.deque()
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.rto = initial_rto
+
+
+class _ReceiverState:
+    """
+    接收方状态（每个对端一个）
+    """
+
+    __slots__ = ("session", "expected", "received")
+
+    def __init__(self, session: int):
+        self.session = session
+        self.expected = 0
+        self.received: Set[int] = set()
+
+
+class ReliableChannel:
+    """
+    可靠通道
+    """
+
+    # 魔数
+    MAGIC = 0xA7
+
+    # 协议版本
+    VERSION = 1
+
+    # 数据
+    DATA = 1
+
+    # 确认
+    ACK = 2
+
+    # 数据头
+    DATA_HEADER = struct.Struct("!BBBIII")
+
+    # 确认
+    ACK_PACKET = struct.Struct("!BBBIIQ")
+
+    # 选择确认位图的位数
+    ACK_BITS = 64
+
+    # 数据报发送函数
+    __send: Callable[[bytes, Address], None] = None
+
+    # 发送窗口（每个对端最多未确认的数据数量）
+    __window: int = 64
+
+    # 窗口已满时最多排队的数据数量
+    __max_queue: int = 1024
+
+    # 最小重传超时（秒）
+    __min_rto: float = 0.05
+
+    # 最大重传超时（秒）
+    __max_rto: float = 2
+
+    # 最大重传次数，超过后放弃
+    __max_retries: int = 10
+
+    # 没有待确认数据时的轮询间隔（秒）
+    __idle_interval: float = 0.1
+
+    # 发送方状态
+    __senders: Dict[Address, _SenderState] = None
+
+    # 已清理的发送方状态保留的（会话ID, 下一个序号），按清理时间排序，超出上限时淘汰最早的对端
+    __idle_senders: OrderedDict[Address, Tuple[int, int]] = None
+
+    # 接收方状态（按最近活动排序，超出上限时淘汰最早的对端）
+    __receivers: OrderedDict[Address, _ReceiverState] = None
+
+    # 最多保留的接收方状态数量
+    __max_receivers: int = 4096
+
+    # 状态锁（发送、接收与重传可能在不同线程中）
+    __lock: threading.Lock = None
+
+    # 重传次数
+    __retransmitted: int = 0
+
+    # 放弃的数据数量（超过最大重传次数或队列已满）
+    __dropped: int = 0
+
+    def __init__(self, send: Callable[[bytes, Address], None], **kwargs):
+        """
+        初始化
+        :param send: 数据报发送函数
+        :param kwargs: window 发送窗口，max_queue 最多排队的数据数量，min_rto / max_rto 重传超时范围（秒），
+                       max_retries 最大重传次数，idle_interval 空闲时的轮询间隔（秒）
+        """
+        self.__send = send
+        self.__window = kwargs.get("window", 64)
+        self.__max_queue = kwargs.get("max_queue", 1024)
+        self.__min_rto = kwargs.get("min_rto", 0.05)
+        self.__max_rto = kwargs.get("max_rto", 2)
+        self.__max_retries = kwargs.get("max_retries", 10)
+        self.__idle_interval = kwargs.get("idle_interval", 0.1)
+        self.__senders = {}
+        self.__idle_senders = collections.OrderedDict()
+        self.__receivers = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def retransmitted(self) -> int:
+        """
+        获取重传次数
+        :return:
+        """
+        return self.__retransmitted
+
+    @property
+    def dropped(self) -> int:
+        """
+        获取放弃的数据数量
+        :return:
+        """
+        return self.__dropped
+
+    def unacked_count(self, destination: Address) -> int:
+        """
+        获取发送到对端未确认的数据数量（含排队中的数据）
+        :param destination: 对端地址
+        :return:
+        """
+        with self.__lock:
+            sender = self.__senders.get(destination)
+            return len(sender.unacked) + len(sender.queue) if sender else 0
+
+    @classmethod
+    def is_reliable(cls, data) -> bool:
+        """
+        判断数据报是否为可靠通道的数据或确认
+        :param data:
+        :return:
+        """
+        return len(data) >= cls.DATA_HEADER.size and data[0] == cls.MAGIC
+
+    @classmethod
+    def is_ack(cls, data) -> bool:
+        """
+        判断可靠通道数据报是否为确认
+        :param data:
+        :return:
+        """
+        return len(data) >= cls.ACK_PACKET.size and data[0] == cls.MAGIC and data[2] == cls.ACK
+
+    def send(self, datagram: bytes, destination: Address):
+        """
+        可靠发送一个数据报，窗口已满时排队
+        :param datagram: 数据报
+        :param destination: 对端地址
+        :return:
+        """
+        now = time.monotonic()
+        with self.__lock:
+            sender = self.__senders.get(destination)
+            if sender is None:
+                # 沿用清理前的会话与序号，否则使用新的会话
+                session, next_sequence = self.__idle_senders.pop(destination, None) or (random.getrandbits(32), 0)
+                sender = self.__senders[destination] = _SenderState(session, next_sequence, self.__min_rto * 4)
+            sequence = sender.next_sequence
+            sender.next_sequence += 1
+            if len(sender.unacked) >= self.__window:
+                if len(sender.queue) >= self.__max_queue:
+                    sender.queue.popleft()
+                    self.__dropped += 1
+                    logging.warning(f"发送到{destination}的可靠数据排队已满，丢弃最早的数据")
+                sender.queue.append((sequence, datagram))
+                return
+            sender.unacked[sequence] = _SentPacket(datagram, now, now + sender.rto)
+            packet = self.__packet(sender, sequence, datagram)
+        self.__send(packet, destination)
+
+    def __packet(self, sender: _SenderState, sequence: int, datagram: bytes) -> bytes:
+        """
+        生成数据（持有锁时调用），填写当前的最小未确认序号
+        :param sender: 发送方状态
+        :param sequence: 序号
+        :param datagram: 数据报
+        :return:
+        """
+        return self.DATA_HEADER.pack(self.MAGIC, self.VERSION, self.DATA, sender.session, sequence, min(sender.unacked)) + datagram
+
+    def receive(self, data, address: Address):
+        """
+        处理收到的可靠通道数据报
+        :param data: 数据报
+        :param address: 对端地址
+        :return: 首次收到的数据返回其中的数据报，确认与重复数据返回None
+        """
+        version, kind = data[1], data[2]
+        if version != self.VERSION:
+            logging.warning(f"丢弃来自{address}的可靠通道数据：版本{version}不支持")
+            return None
+        if kind == self.ACK:
+            if len(data) >= self.ACK_PACKET.size:
+                _, _, _, session, cumulative, bitmap = self.ACK_PACKET.unpack_from(data)
+                self.__handle_ack(address, session, cumulative, bitmap)
+            return None
+        if kind != self.DATA:
+            return None
+        _, _, _, session, sequence, floor = self.DATA_HEADER.unpack_from(data)
+        with self.__lock:
+            receiver = self.__receivers.get(address)
+            if receiver is None or receiver.session != session:
+                # 新的对端或对端重启
+                receiver = self.__receivers[address] = _ReceiverState(session)
+                if len(self.__receivers) > self.__max_receivers:
+                    self.__receivers.popitem(last=False)
+            else:
+                self.__receivers.move_to_end(address)
+            if floor > receiver.expected:
+                # 之前缺失的数据已被发送方放弃，越过缺口
+                receiver.expected = floor
+                receiver.received = {received_sequence for received_sequence in receiver.received if received_sequence >= floor}
+                while receiver.expected in receiver.received:
+                    receiver.received.discard(receiver.expected)
+                    receiver.expected += 1
+            duplicate = sequence < receiver.expected or sequence in receiver.received
+            if not duplicate:
+                receiver.received.add(sequence)
+                while receiver.expected in receiver.received:
+                    receiver.received.discard(receiver.expected)
+                    receiver.expected += 1
+            bitmap = 0
+            for received_sequence in receiver.received:
+                offset = received_sequence - receiver.expected - 1
+                if 0 <= offset < self.ACK_BITS:
+                    bitmap |= 1 << offset
+            ack = self.ACK_PACKET.pack(self.MAGIC, self.VERSION, self.ACK, session, receiver.expected, bitmap)
+        # 重复数据同样确认，对端可能没有收到之前的确认
+        self.__send(ack, address)
+        if duplicate:
+            return None
+        return data[self.DATA_HEADER.size:]
+
+    def __handle_ack(self, address: Address, session: int, cumulative: int, bitmap: int):
+        """
+        处理确认：移除已确认的数据，更新往返时间，窗口有空位时发送排队的数据
+        :param address: 对端地址
+        :param session: 会话ID
+        :param cumulative: 累计确认序号
+        :param bitmap: 选择确认位图
+        :return:
+        """
+        now = time.monotonic()
+        with self.__lock:
+            sender = self.__senders.get(address)
+            if sender is None or sender.session != session:
+                return
+            acked = [sequence for sequence in sender.unacked
+                     if sequence < cumulative or (sequence > cumulative and bitmap >> (sequence - cumulative - 1) & 1)]
+            for sequence in acked:
+                sent_packet = sender.unacked.pop(sequence)
+                if sent_packet.retries == 0:
+                    # 只用未重传的数据估算往返时间
+                    self.__update_rto(sender, now - sent_packet.sent_ts)
+            packets = self.__fill_window(sender, now)
+            if not sender.unacked and not sender.queue:
+                self.__retire(address, sender)
+        for packet in packets:
+            self.__send(packet, address)
+
+    def __retire(self, address: Address, sender: _SenderState):
+        """
+        清理没有待确认数据的发送方状态（持有锁时调用），保留会话ID与下一个序号
+        :param address: 对端地址
+        :param sender: 发送方状态
+        :return:
+        """
+        del self.__senders[address]
+        self.__idle_senders[address] = (sender.session, sender.next_sequence)
+        if len(self.__idle_senders) > self.__max_receivers:
+            self.__idle_senders.popitem(last=False)
+
+    def __fill_window(self, sender: _SenderState, now: float) -> List[bytes]:
+        """
+        窗口有空位时取出排队的数据
+        :param sender: 发送方状态
+        :param now: 当前时间
+        :return: 需要发送的数据
+        """
+        packets = []
+        while sender.queue and len(sender.unacked) < self.__window:
+            sequence, datagram = sender.queue.popleft()
+            sender.unacked[sequence] = _SentPacket(datagram, now, now + sender.rto)
+            packets.append(self.__packet(sender, sequence, datagram))
+        return packets
+
+    def __update_rto(self, sender: _SenderState, rtt: float):
+        """
+        按往返时间更新重传超时（RFC 6298）
+        :param sender: 发送方状态
+        :param rtt: 往返时间（秒）
+        :return:
+        """
+        if sender.srtt is None:
+            sender.srtt = rtt
+            sender.rttvar = rtt / 2
+        else:
+            sender.rttvar = 0.75 * sender.rttvar + 0.25 * abs(sender.srtt - rtt)
+            sender.srtt = 0.875 * sender.srtt + 0.125 * rtt
+        sender.rto = min(self.__max_rto, max(self.__min_rto, sender.srtt + 4 * sender.rttvar))
+
+    def retransmit(self) -> float:
+        """
+        重传超时未确认的数据，重传超时按重传次数指数增长
+        :return: 距下次需要检查的秒数
+        """
+        now = time.monotonic()
+        next_deadline = now + self.__idle_interval
+        packets = []
+        with self.__lock:
+            for destination, sender in list(self.__senders.items()):
+                for sequence, sent_packet in list(sender.unacked.items()):
+                    if sent_packet.deadline <= now:
+                        if sent_packet.retries >= self.__max_retries:
+                            del sender.unacked[sequence]
+                            self.__dropped += 1
+                            logging.warning(f"发送到{destination}的可靠数据{sequence}重传{sent_packet.retries}次未确认，放弃")
+                            continue
+                        sent_packet.retries += 1
+                        sent_packet.deadline = now + min(self.__max_rto, sender.rto * 2 ** sent_packet.retries)
+                        self.__retransmitted += 1
+                        packets.append((self.__packet(sender, sequence, sent_packet.datagram), destination))
+                    next_deadline = min(next_deadline, sent_packet.deadline)
+                # 放弃的数据让出窗口
+                packets.extend((packet, destination) for packet in self.__fill_window(sender, now))
+                if not sender.unacked and not sender.queue:
+                    self.__retire(destination, sender)
+        for packet, destination in packets:
+            try:
+                self.__send(packet, destination)
+            except OSError as e:
+                logging.warning(f"重传数据到{destination}失败：{e}")
+        return max(0.0, next_deadline - now)
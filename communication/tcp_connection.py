@@ -1,11 +1,99 @@
 import abc
 import logging
 import os
+import queue
+import selectors
 import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from communication.codec import MessageCodec, BINARY_CODEC, decode_message
+from communication.message import MessagePackage
 from communication.multicast_connection import Connection
 from communication.connection_info import ConnectionInfo
 
 
+class FramedSocket:
+    """
+    长度前缀分帧
+
+    每帧为4字节大端长度 + 编码后的消息，用于在TCP流上传输不受数据报大小限制的完整消息
+    """
+
+    # 帧头：消息长度
+    HEADER = struct.Struct("!I")
+
+    # 套接字
+    __socket: socket.socket = None
+
+    # 编解码器
+    __codec: MessageCodec = None
+
+    # 消息发送者
+    __sender: str = None
+
+    # 单帧最大字节数
+    __max_frame_size: int = None
+
+    def __init__(self, connection: socket.socket, codec: MessageCodec = None, sender: str = None, max_frame_size: int = 64 * 1024 * 1024):
+        """
+        初始化
+        :param connection: 已连接的套接字
+        :param codec: 编解码器（默认二进制编解码器）
+        :param sender: 消息发送者
+        :param max_frame_size: 单帧最大字节数
+        """
+        self.__socket = connection
+        self.__codec = codec or BINARY_CODEC
+        self.__sender = sender
+        self.__max_frame_size = max_frame_size
+
+    def send(self, message_package: MessagePackage):
+        """
+        发送一帧消息
+        :param message_package: 消息包
+        :return:
+        """
+        data = self.__codec.encode(message_package, self.__sender)
+        self.__socket.sendall(self.HEADER.pack(len(data)) + data)
+
+    def receive(self) -> Optional[MessagePackage]:
+        """
+        接收一帧消息
+        :return: 对端关闭连接时返回None
+        """
+        header = self.__receive_exactly(self.HEADER.size)
+        if header is None:
+            return None
+        length, = self.HEADER.unpack(header)
+        if length > self.__max_frame_size:
+            raise ValueError(f"帧长度{length}超出上限{self.__max_frame_size}")
+        data = self.__receive_exactly(length)
+        if data is None:
+            raise ConnectionError("连接在接收帧时关闭")
+        return decode_message(data)
+
+    def __receive_exactly(self, size: int) -> Optional[bytearray]:
+        """
+        接收指定字节数
+        :param size:
+        :return: 在读到任何数据前对端关闭连接时返回None
+        """
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            length = self.__socket.recv_into(view[received:])
+            if length == 0:
+                if received == 0:
+                    return None
+                raise ConnectionError("连接在接收帧时关闭")
+            received += length
+        return buffer
+
+
 class TcpConnection(Connection, metaclass=abc.ABCMeta):
     """
     TCP连接
@@ -31,6 +119,10 @@ class TcpConnection(Connection, metaclass=abc.ABCMeta):
 class TcpServer(TcpConnection):
     """
     TCP服务端
+
+    listen() 每次接受一个连接；serve() 持续接受连接，由选择器等待所有空闲连接，
+    连接上有请求到达时交给有界线程池处理一次请求，处理完成后重新等待，
+    少量工作线程即可服务大量持久连接
     """
 
     # 是否正在运行
@@ -39,6 +131,24 @@ class TcpServer(TcpConnection):
     # 连接
     __connection: socket = None
 
+    # 工作线程数
+    __max_workers: int = 16
+
+    # 最大连接数，超出时直接关闭新连接
+    __max_connections: int = 1024
+
+    # 单个请求的收发超时时间（秒）
+    __connection_timeout: float = 10
+
+    # 空闲连接的超时时间（秒）
+    __idle_timeout: float = 60
+
+    # 当前连接数
+    __connection_count: int = 0
+
+    # 选择器唤醒套接字
+    __wakeup_sockets: Tuple[socket.socket, socket.socket] = None
+
     @property
     def running(self) -> bool:
         """
@@ -47,12 +157,26 @@ class TcpServer(TcpConnection):
         """
         return self.__running
 
+    @property
+    def connection_count(self) -> int:
+        """
+        当前连接数
+        :return:
+        """
+        return self.__connection_count
+
     def __init__(self, address: str, port: int, **kwargs):
         """
         初始化
+        :param kwargs: max_workers 工作线程数，max_connections 最大连接数，
+                       connection_timeout 单个请求的收发超时时间（秒），idle_timeout 空闲连接的超时时间（秒）
         """
         self.__running = False
         super().__init__(address, port, **kwargs)
+        self.__max_workers = kwargs.get("max_workers", 16)
+        self.__max_connections = kwargs.get("max_connections", 1024)
+        self.__connection_timeout = kwargs.get("connection_timeout", 10)
+        self.__idle_timeout = kwargs.get("idle_timeout", 60)
 
     def _generate_connection(self, family=socket.AF_UNIX, type=socket.SOCK_STREAM) -> socket:
         """
@@ -61,6 +185,7 @@ class TcpServer(TcpConnection):
         """
         if self.port is not None and self.port != 0:
             self.__connection = super()._generate_connection(socket.AF_INET, socket.SOCK_STREAM)
+            self.__connection.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.__connection.bind((self.address, self.port))
         else:
             self.__connection = super()._generate_connection()
@@ -68,9 +193,9 @@ class TcpServer(TcpConnection):
         return self.__connection
 
 
-    def listen(self, backlog: int=100):
+    def listen(self, backlog: int=100) -> Optional[ConnectionInfo]:
         """
-        监听
+        监听并接受一个连接请求，重复调用时依次接受后续的连接请求
         :param backlog:
         :return:
         """
@@ -78,15 +203,147 @@ class TcpServer(TcpConnection):
             self.__running = True
             self.__connection.listen(backlog)
             logging.info((self.name or "TCP服务端") + "开始监听...")
-            # 不断接受连接请求，并创建新线程处理连接
+        if self.__running:
+            # 接受连接请求，并创建新的套接字
+            client_socket, client_address = self.__connection.accept()
+            if isinstance(client_address, tuple):
+                connection_info = ConnectionInfo(client_socket, client_address[0], client_address[1])
+            else:
+                connection_info = ConnectionInfo(client_socket, client_address, 0)
+            return connection_info
+        return None
+
+    def serve(self, handler: Callable[[ConnectionInfo], bool], backlog: int = 100):
+        """
+        持续接受连接并处理请求，直到关闭
+        :param handler: 请求处理函数，处理连接上的一个请求，返回False时关闭连接
+        :param backlog:
+        :return:
+        """
+        if self.__running:
+            return
+        self.__running = True
+        self.__connection.listen(backlog)
+        self.__connection.setblocking(False)
+        self.__wakeup_sockets = socket.socketpair()
+        for wakeup_socket in self.__wakeup_sockets:
+            wakeup_socket.setblocking(False)
+        logging.info((self.name or "TCP服务端") + f"开始监听，工作线程{self.__max_workers}个，最大连接数{self.__max_connections}")
+        selector = selectors.DefaultSelector()
+        selector.register(self.__connection, selectors.EVENT_READ, None)
+        selector.register(self.__wakeup_sockets[0], selectors.EVENT_READ, None)
+        # 处理完请求后等待重新注册的连接
+        ready_connections: queue.SimpleQueue = queue.SimpleQueue()
+        # 等待请求的空闲连接及其最后活动时间
+        idle_connections: Dict[socket.socket, Tuple[ConnectionInfo, float]] = {}
+        executor = ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix=self.name or "tcp-server")
+        try:
             while self.__running:
-                # 接受连接请求，并创建新的套接字
+                for key, _ in selector.select(min(1.0, self.__idle_timeout)):
+                    if key.fileobj is self.__connection:
+                        self.__accept(selector, idle_connections)
+                    elif key.fileobj is self.__wakeup_sockets[0]:
+                        self.__drain_wakeup()
+                    else:
+                        # 请求到达，交给工作线程处理，期间不再监听此连接
+                        selector.unregister(key.fileobj)
+                        connection_info, _ = idle_connections.pop(key.fileobj)
+                        executor.submit(self.__handle, handler, connection_info, ready_connections)
+                now = time.monotonic()
+                while not ready_connections.empty():
+                    connection_info, keep = ready_connections.get_nowait()
+                    if keep and self.__running:
+                        selector.register(connection_info.socket, selectors.EVENT_READ, None)
+                        idle_connections[connection_info.socket] = (connection_info, now)
+                    else:
+                        self.__close_connection(connection_info)
+                # 关闭空闲超时的连接
+                for connection, (connection_info, active_ts) in list(idle_connections.items()):
+                    if now - active_ts > self.__idle_timeout:
+                        selector.unregister(connection)
+                        del idle_connections[connection]
+                        self.__close_connection(connection_info)
+        finally:
+            for connection_info, _ in idle_connections.values():
+                self.__close_connection(connection_info)
+            executor.shutdown(wait=False)
+            selector.close()
+            for wakeup_socket in self.__wakeup_sockets:
+                wakeup_socket.close()
+
+    def __accept(self, selector: selectors.BaseSelector, idle_connections: Dict[socket.socket, Tuple[ConnectionInfo, float]]):
+        """
+        接受所有等待中的连接请求，超出最大连接数时直接关闭
+        :param selector: 选择器
+        :param idle_connections: 空闲连接
+        :return:
+        """
+        while True:
+            try:
                 client_socket, client_address = self.__connection.accept()
-                if isinstance(client_address, tuple):
-                    connection_info = ConnectionInfo(client_socket, client_address[0], client_address[1])
-                else:
-                    connection_info = ConnectionInfo(client_socket, client_address, 0)
-                return connection_info
+            except (BlockingIOError, InterruptedError):
+                return
+            if self.__connection_count >= self.__max_connections:
+                logging.warning((self.name or "TCP服务端") + f"连接数已达上限{self.__max_connections}，拒绝{client_address}的连接")
+                client_socket.close()
+                continue
+            client_socket.settimeout(self.__connection_timeout)
+            if isinstance(client_address, tuple):
+                connection_info = ConnectionInfo(client_socket, client_address[0], client_address[1])
+            else:
+                connection_info = ConnectionInfo(client_socket, client_address, 0)
+            self.__connection_count += 1
+            selector.register(client_socket, selectors.EVENT_READ, None)
+            idle_connections[client_socket] = (connection_info, time.monotonic())
+
+    def __handle(self, handler: Callable[[ConnectionInfo], bool], connection_info: ConnectionInfo, ready_connections: queue.SimpleQueue):
+        """
+        在工作线程中处理连接上的一个请求
+        :param handler: 请求处理函数
+        :param connection_info: 连接信息
+        :param ready_connections: 处理完成的连接
+        :return:
+        """
+        keep = False
+        try:
+            keep = handler(connection_info)
+        except Exception as e:
+            logging.warning((self.name or "TCP服务端") + f"处理{connection_info.socket_address}的请求异常：{e}")
+        ready_connections.put((connection_info, keep))
+        self.__wakeup()
+
+    def __close_connection(self, connection_info: ConnectionInfo):
+        """
+        关闭连接
+        :param connection_info: 连接信息
+        :return:
+        """
+        self.__connection_count -= 1
+        try:
+            connection_info.socket.close()
+        except OSError:
+            pass
+
+    def __wakeup(self):
+        """
+        唤醒等待中的选择器
+        :return:
+        """
+        try:
+            self.__wakeup_sockets[1].send(b"\0")
+        except OSError:
+            pass
+
+    def __drain_wakeup(self):
+        """
+        读空唤醒套接字
+        :return:
+        """
+        try:
+            while self.__wakeup_sockets[0].recv(1024):
+                pass
+        except OSError:
+            pass
 
     def close(self):
         """
@@ -95,10 +352,19 @@ class TcpServer(TcpConnection):
         """
         if self.__running:
             self.__running = False
+            # 唤醒阻塞在accept或选择器的线程
+            if self.__wakeup_sockets:
+                self.__wakeup()
+            try:
+                self.raw_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             super().close()
-            if os.path.exists(self.address):
+            if (self.port is None or self.port == 0) and os.path.exists(self.address):
                 os.remove(self.address)
             logging.info((self.name or "TCP服务端") + "关闭")
+        else:
+            super().close()
 
 
 class TcpClient(TcpConnection):
@@ -132,19 +398,177 @@ class TcpClient(TcpConnection):
             self.__connection = super()._generate_connection()
         return self.__connection
 
-    def connect(self):
+    def connect(self, timeout: float = None):
+        """
+        连接服务端
+        :param timeout: 连接及后续收发的超时时间（秒）
+        :return:
+        """
         if not self.__connected:
-            if self.port is not None and self.port != 0:
-                self.__connection.connect((self.address, self.port))
-            else:
-                self.__connection.connect(self.address)
+            try:
+                self.__connection.settimeout(timeout)
+                if self.port is not None and self.port != 0:
+                    self.__connection.connect((self.address, self.port))
+                else:
+                    self.__connection.connect(self.address)
+            except OSError:
+                # 连接失败时关闭套接字，避免重连时泄漏
+                super().close()
+                raise
             self.__connected = True
 
+    def request(self, message_package: MessagePackage) -> MessagePackage:
+        """
+        发送一帧请求并等待一帧响应
+        :param message_package: 请求消息
+        :return: 响应消息
+        """
+        framed_socket = FramedSocket(self.__connection, sender=self.name)
+        framed_socket.send(message_package)
+        response = framed_socket.receive()
+        if response is None:
+            raise ConnectionError("服务端已关闭连接")
+        return response
+
     def close(self):
         """
-        关闭
+        关闭（未连接成功的套接字同样关闭）
         :return:
         """
-        if self.__connected:
-            super().close()
-            self.__connected = False
+        super().close()
+        self.__connected = False
+
+
+class TcpConnectionPool:
+    """
+    TCP连接池
+
+    按服务端地址保持持久连接并在多次请求之间复用，省去每次拉取的TCP握手；
+    连接失败后按指数退避重连，退避期间的请求直接失败
+    """
+
+    # 每个地址最多保留的空闲连接数
+    __max_idle: int = None
+
+    # 连接及收发的超时时间（秒）
+    __timeout: float = None
+
+    # 初始退避时间（秒）
+    __backoff_initial: float = None
+
+    # 最大退避时间（秒）
+    __backoff_max: float = None
+
+    # 空闲连接
+    __idle_clients: Dict[Tuple[str, int], List[TcpClient]] = None
+
+    # 连接失败次数与下次允许重连的时间
+    __failures: Dict[Tuple[str, int], Tuple[int, float]] = None
+
+    # 连接池锁
+    __lock: threading.Lock = None
+
+    def __init__(self, max_idle: int = 4, timeout: float = 10, backoff_initial: float = 0.5, backoff_max: float = 30):
+        """
+        初始化
+        :param max_idle: 每个地址最多保留的空闲连接数
+        :param timeout: 连接及收发的超时时间（秒）
+        :param backoff_initial: 初始退避时间（秒）
+        :param backoff_max: 最大退避时间（秒）
+        """
+        self.__max_idle = max_idle
+        self.__timeout = timeout
+        self.__backoff_initial = backoff_initial
+        self.__backoff_max = backoff_max
+        self.__idle_clients = {}
+        self.__failures = {}
+        self.__lock = threading.Lock()
+
+    def request(self, address: Tuple[str, int], message_package: MessagePackage) -> MessagePackage:
+        """
+        通过连接池发送请求并等待响应
+        :param address: 服务端地址
+        :param message_package: 请求消息
+        :return: 响应消息
+        """
+        client, reused = self.__acquire(address)
+        try:
+            response = client.request(message_package)
+        except (OSError, ConnectionError) as e:
+            client.close()
+            if not reused:
+                self.__record_failure(address)
+                raise
+            # 复用的空闲连接可能已被服务端关闭，使用新连接重试一次
+            logging.info(f"复用到{address}的连接失败，重新连接：{e}")
+            client, _ = self.__acquire(address, reuse=False)
+            try:
+                response = client.request(message_package)
+            except (OSError, ConnectionError):
+                client.close()
+                self.__record_failure(address)
+                raise
+        self.__release(address, client)
+        return response
+
+    def close(self):
+        """
+        关闭所有空闲连接
+        :return:
+        """
+        with self.__lock:
+            idle_clients = [client for clients in self.__idle_clients.values() for client in clients]
+            self.__idle_clients.clear()
+        for client in idle_clients:
+            client.close()
+
+    def __acquire(self, address: Tuple[str, int], reuse: bool = True) -> Tuple[TcpClient, bool]:
+        """
+        获取连接，优先复用空闲连接
+        :param address: 服务端地址
+        :param reuse: 是否复用空闲连接
+        :return: 连接，是否为复用的连接
+        """
+        with self.__lock:
+            clients = self.__idle_clients.get(address)
+            if reuse and clients:
+                return clients.pop(), True
+            failure_count, retry_ts = self.__failures.get(address, (0, 0))
+        if time.monotonic() < retry_ts:
+            raise ConnectionError(f"到{address}的连接处于退避中，{retry_ts - time.monotonic():.1f}秒后重试")
+        client = TcpClient(address[0], address[1])
+        try:
+            client.connect(self.__timeout)
+        except OSError:
+            client.close()
+            self.__record_failure(address)
+            raise
+        with self.__lock:
+            self.__failures.pop(address, None)
+        return client, False
+
+    def __release(self, address: Tuple[str, int], client: TcpClient):
+        """
+        归还连接，空闲连接已满时关闭
+        :param address: 服务端地址
+        :param client: 连接
+        :return:
+        """
+        with self.__lock:
+            clients = self.__idle_clients.setdefault(address, [])
+            if len(clients) < self.__max_idle:
+                clients.append(client)
+                return
+        client.close()
+
+    def __record_failure(self, address: Tuple[str, int]):
+        """
+        记录连接失败，计算下次允许重连的时间
+        :param address: 服务端地址
+        :return:
+        """
+        with self.__lock:
+            failure_count = self.__failures.get(address, (0, 0))[0] + 1
+            backoff = min(self.__backoff_max, self.__backoff_initial * 2 ** (failure_count - 1))
+            self.__failures[address] = (failure_count, time.monotonic() + backoff)
+        logging.warning(f"连接{address}失败{failure_count}次，{backoff:.1f}秒后允许重连")
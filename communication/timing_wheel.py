@@ -0,0 +1,113 @@
+"""
+时间轮
+
+按截止时间把键放入环形的槽中，每个刻度只处理到期的槽，调度、取消与每个刻度的开销都是O(1)（均摊），
+用于连接的心跳超时：每次心跳把连接重新调度到新的截止时间，刻度推进时移除到期未心跳的连接。
+截止时间超出一圈的键记录剩余圈数，轮转到时圈数未减到0的键保留在槽中。
+"""
+import math
+import threading
+import time
+from typing import Dict, Hashable, List, Set, Tuple
+
+
+class TimingWheel:
+    """
+    时间轮
+    """
+
+    # 刻度（秒）
+    __tick: float = 1.0
+
+    # 槽
+    __slots: List[Set[Hashable]] = None
+
+    # 键 -> （槽序号, 到期刻度）
+    __entries: Dict[Hashable, Tuple[int, int]] = None
+
+    # 已处理到的刻度
+    __current_tick: int = 0
+
+    # 时间轮锁
+    __lock: threading.Lock = None
+
+    def __init__(self, tick: float = 1.0, slots: int = 512):
+        """
+        初始化
+        :param tick: 刻度（秒），即超时检查的精度
+        :param slots: 槽数量
+        """
+        self.__tick = tick
+        self.__slots = [set() for _ in range(slots)]
+        self.__entries = {}
+        self.__current_tick = self.__tick_of(time.monotonic())
+        self.__lock = threading.Lock()
+
+    @property
+    def tick(self) -> float:
+        """
+        获取刻度（秒）
+        :return:
+        """
+        return self.__tick
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __tick_of(self, ts: float) -> int:
+        """
+        获取时间所在的刻度
+        :param ts: 单调时间
+        :return:
+        """
+        return math.floor(ts / self.__tick)
+
+    def schedule(self, key: Hashable, deadline: float):
+        """
+        调度键在截止时间到期，已调度的键重新调度
+        :param key: 键
+        :param deadline: 截止时间（单调时间）
+        :return:
+        """
+        with self.__lock:
+            # 到期刻度至少为下一个刻度，已处理过的刻度不会再处理
+            expire_tick = max(self.__current_tick + 1, math.ceil(deadline / self.__tick))
+            slot = expire_tick % len(self.__slots)
+            entry = self.__entries.get(key)
+            if entry is not None:
+                if entry == (slot, expire_tick):
+                    return
+                self.__slots[entry[0]].discard(key)
+            self.__slots[slot].add(key)
+            self.__entries[key] = (slot, expire_tick)
+
+    def cancel(self, key: Hashable):
+        """
+        取消键
+        :param key: 键
+        :return:
+        """
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is not None:
+                self.__slots[entry[0]].discard(key)
+
+    def advance(self, now: float = None) -> List[Hashable]:
+        """
+        推进到当前时间，取出到期的键
+        :param now: 当前时间（单调时间）
+        :return: 到期的键
+        """
+        now_tick = self.__tick_of(time.monotonic() if now is None else now)
+        expired = []
+        with self.__lock:
+            # 停顿超过一圈时每个槽只需处理一次
+            first_tick = max(self.__current_tick + 1, now_tick - len(self.__slots) + 1)
+            for tick in range(first_tick, now_tick + 1):
+                slot = self.__slots[tick % len(self.__slots)]
+                for key in [key for key in slot if self.__entries[key][1] <= now_tick]:
+                    slot.discard(key)
+                    del self.__entries[key]
+                    expired.append(key)
+            self.__current_tick = max(self.__current_tick, now_tick)
+        return expired
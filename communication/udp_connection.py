@@ -2,26 +2,48 @@ import os
 import abc
 import socket
 import logging
-from typing import Union, Tuple
+from typing import Dict, Optional, Set, Union, Tuple
 
+from communication.connection_info import PeerCredentials, PEER_CREDENTIALS_STRUCT
 from communication.message import MessagePackage
 from communication.multicast_connection import Connection
 
+# 凭据控制消息：进程ID、用户ID、用户组ID
+CREDENTIALS_SIZE = socket.CMSG_SPACE(PEER_CREDENTIALS_STRUCT.size) if hasattr(socket, "SCM_CREDENTIALS") else 0
+
 
 class UdpConnection(Connection, metaclass=abc.ABCMeta):
     """
     TCP连接
+
+    端口号为0（或None）时地址为本机套接字路径，使用AF_UNIX数据报套接字，不经过IP协议栈
     """
 
     def __init__(self, address: str, port: int, **kwargs):
         """
         初始化
-        :param address: 连接地址
+        :param address: 连接地址（本机套接字时为路径）
         :param port: 连接端口号
         :param kwargs: 其他参数
         """
         super().__init__(address, port, **kwargs)
 
+    @property
+    def is_unix(self) -> bool:
+        """
+        是否为本机套接字
+        :return:
+        """
+        return not self.port
+
+    @property
+    def server_address(self) -> Union[Tuple[str, int], str]:
+        """
+        获取服务端地址
+        :return:
+        """
+        return self.address if self.is_unix else (self.address, self.port)
+
     def _generate_connection(self, family=socket.AF_UNIX, type=socket.SOCK_STREAM) -> socket:
         """
         初始化
@@ -29,6 +51,19 @@ class UdpConnection(Connection, metaclass=abc.ABCMeta):
         connection = socket.socket(family, type)
         return connection
 
+    def _generate_datagram_connection(self) -> socket:
+        """
+        创建数据报套接字，本机套接字开启凭据传递
+        :return:
+        """
+        if self.is_unix:
+            connection = UdpConnection._generate_connection(self, socket.AF_UNIX, socket.SOCK_DGRAM)
+            if CREDENTIALS_SIZE:
+                connection.setsockopt(socket.SOL_SOCKET, socket.SO_PASSCRED, 1)
+        else:
+            connection = UdpConnection._generate_connection(self, socket.AF_INET, socket.SOCK_DGRAM)
+        return connection
+
 
 class UdpServer(UdpConnection):
     """
@@ -41,6 +76,12 @@ class UdpServer(UdpConnection):
     # 连接
     __connection: socket = None
 
+    # 允许的对端用户ID（仅本机套接字，为空时不限制）
+    __allowed_uids: Optional[Set[int]] = None
+
+    # 对端进程凭据
+    __peer_credentials: Dict[Union[Tuple[str, int], str], PeerCredentials] = None
+
     @property
     def running(self) -> bool:
         """
@@ -52,8 +93,12 @@ class UdpServer(UdpConnection):
     def __init__(self, address: str, port: int, **kwargs):
         """
         初始化
+        :param kwargs: allowed_uids 允许的对端用户ID（仅本机套接字）
         """
         self.__running = False
+        self.__peer_credentials = {}
+        allowed_uids = kwargs.get("allowed_uids")
+        self.__allowed_uids = set(allowed_uids) if allowed_uids is not None else None
         super().__init__(address, port, **kwargs)
 
     def _generate_connection(self, family=socket.AF_UNIX, type=socket.SOCK_DGRAM) -> socket:
@@ -61,10 +106,72 @@ class UdpServer(UdpConnection):
         监听
         :return:
         """
-        self.__connection = super()._generate_connection(socket.AF_INET, socket.SOCK_DGRAM)
-        self.__connection.bind((self.address, self.port))
+        self.__connection = self._generate_datagram_connection()
+        if self.is_unix:
+            # 移除上次运行残留的套接字文件
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self.__connection.bind(self.address)
+        else:
+            self.__connection.bind((self.address, self.port))
+        self.__running = True
         return self.__connection
 
+    def _receive(self, size: int) -> Tuple[bytes, Union[str, Tuple[str, int]]]:
+        """
+        接收一个数据报，本机套接字同时接收对端凭据
+        :param size:
+        :return:
+        """
+        if not self.is_unix or not CREDENTIALS_SIZE:
+            return super()._receive(size)
+        buffer = bytearray(size)
+        length, address = self._receive_into(buffer, size)
+        return bytes(buffer[:length]), address
+
+    def _receive_into(self, buffer: bytearray, size: int) -> Tuple[int, Union[str, Tuple[str, int]]]:
+        """
+        接收一个数据报到缓冲区，本机套接字同时接收对端凭据，不允许的用户发送的数据报被丢弃
+        :param buffer:
+        :param size:
+        :return:
+        """
+        if not self.is_unix or not CREDENTIALS_SIZE:
+            return super()._receive_into(buffer, size)
+        with memoryview(buffer)[:size] as view:
+            length, ancdata, _, address = self.__connection.recvmsg_into([view], CREDENTIALS_SIZE)
+        for level, cmsg_type, data in ancdata:
+            if level == socket.SOL_SOCKET and cmsg_type == socket.SCM_CREDENTIALS:
+                credentials = PeerCredentials(*PEER_CREDENTIALS_STRUCT.unpack_from(data))
+                if self.__allowed_uids is not None and credentials.uid not in self.__allowed_uids:
+                    logging.warning((self.name or "UDP服务端") + f"丢弃用户{credentials.uid}（进程{credentials.pid}）发送的数据")
+                    return 0, address
+                self.__peer_credentials[address] = credentials
+        return length, address
+
+    def _sendto(self, datagram: bytes, destination: Union[Tuple[str, int], str]):
+        """
+        发送一个数据报，本机套接字在对端接收缓冲区已满时不等待（与UDP一样丢弃，不阻塞从节点）
+        :param datagram: 数据报
+        :param destination: 目标地址
+        :return:
+        """
+        if not self.is_unix:
+            super()._sendto(datagram, destination)
+            return
+        try:
+            self.__connection.sendto(datagram, socket.MSG_DONTWAIT, destination)
+        except BlockingIOError:
+            logging.warning((self.name or "UDP服务端") + f"发送到{destination}的数据被丢弃：对端接收缓冲区已满")
+
+    def get_peer_credentials(self, address: Union[Tuple[str, int], str]) -> Optional[PeerCredentials]:
+        """
+        获取对端进程的凭据（本机套接字收到对端数据后可用）
+        :param address: 对端地址
+        :return:
+        """
+        return self.__peer_credentials.get(address)
+
     def close(self):
         """
         关闭
@@ -73,7 +180,7 @@ class UdpServer(UdpConnection):
         if self.__running:
             self.__running = False
             super().close()
-            if os.path.exists(self.address):
+            if self.is_unix and os.path.exists(self.address):
                 os.remove(self.address)
             logging.info((self.name or "UDP服务端") + "关闭")
 
@@ -89,7 +196,7 @@ class UdpClient(UdpConnection):
     def __init__(self, address: str, port: int, **kwargs):
         """
         初始化
-        :param address: 服务端地址
+        :param address: 服务端地址（本机套接字时为路径）
         :param port: 服务端端口
         :param kwargs:
         """
@@ -100,14 +207,18 @@ class UdpClient(UdpConnection):
         监听
         :return:
         """
-        self.__connection = super()._generate_connection(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__connection = self._generate_datagram_connection()
+        if self.is_unix:
+            # 自动绑定到抽象地址，服务端才能回复
+            self.__connection.bind("")
         return self.__connection
 
-    def send(self, message_package: MessagePackage, destination: Union[Tuple[str, int], str] =None):
+    def send(self, message_package: MessagePackage, destination: Union[Tuple[str, int], str] =None, reliable: bool = False):
         """
         发送消息
         :param message_package: 消息包
         :param destination: 目标地址
+        :param reliable: 是否可靠发送
         :return:
         """
-        super().send(message_package, destination or (self.address, self.port))
\ No newline at end of file
+        super().send(message_package, destination or self.server_address, reliable)
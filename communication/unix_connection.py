@@ -0,0 +1,422 @@
+"""
+本机套接字流传输
+
+从节点与本机服务节点之间的AF_UNIX流连接，消息按长度前缀分帧，不经过IP协议栈，也不受数据报大小限制。
+服务端通过SO_PEERCRED获取对端进程的凭据识别服务节点。
+
+流连接的接收接口与数据报连接一致（receive / receive_datagram），可直接用于线程方式与单线程反应器；
+asyncio方式只支持数据报套接字。
+"""
+import collections
+import itertools
+import logging
+import os
+import selectors
+import socket
+import threading
+from typing import Deque, Dict, Optional, Set, Tuple, Union
+
+from communication.codec import PreparedMessage, decode_message
+from communication.connection_info import PeerCredentials, PEER_CREDENTIALS_STRUCT
+from communication.message import MessagePackage, MessageType
+from communication.multicast_connection import Connection
+from communication.tcp_connection import FramedSocket
+from communication.udp_connection import UdpServer, UdpClient
+
+# 本机连接的传输方式
+TRANSPORT_UDP = "udp"
+TRANSPORT_UNIX_DGRAM = "unix_dgram"
+TRANSPORT_UNIX_STREAM = "unix_stream"
+
+
+def read_peer_credentials(connection: socket.socket) -> Optional[PeerCredentials]:
+    """
+    读取本机流连接对端进程的凭据
+    :param connection: 已连接的套接字
+    :return:
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    data = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEER_CREDENTIALS_STRUCT.size)
+    return PeerCredentials(*PEER_CREDENTIALS_STRUCT.unpack(data))
+
+
+class _StreamPeer:
+    """
+    服务节点连接
+    """
+
+    __slots__ = ("socket", "send_lock", "buffer")
+
+    def __init__(self, connection: socket.socket):
+        self.socket = connection
+        self.send_lock = threading.Lock()
+        self.buffer = bytearray()
+
+
+class UnixStreamServer(Connection):
+    """
+    本机流服务端
+
+    每个服务节点一个流连接，对端地址为服务端为连接分配的标识（路径#序号）；
+    对端关闭连接时上报一条CONNECTION_CLOSE消息。
+    多个线程向同一连接发送时按连接加锁，帧不会交错；接收时只读取已到达的数据，
+    不完整的帧缓存在连接中，写入缓慢的服务节点不会阻塞其他服务节点的接收
+    """
+
+    # 是否正在运行
+    __running: bool = False
+
+    # 监听套接字
+    __connection: socket.socket = None
+
+    # 选择器（监听套接字与所有服务节点连接）
+    __selector: selectors.BaseSelector = None
+
+    # 服务节点连接
+    __peers: Dict[str, _StreamPeer] = None
+
+    # 已接收完整、等待返回的（连接标识, 消息），消息为空表示连接已断开
+    __ready: Deque[Tuple[str, Optional[MessagePackage]]] = None
+
+    # 单帧最大字节数
+    __max_frame_size: int = 64 * 1024 * 1024
+
+    # 对端进程凭据
+    __peer_credentials: Dict[str, PeerCredentials] = None
+
+    # 连接标识生成器
+    __peer_ids: itertools.count = None
+
+    # 已发送关闭消息的连接（连接断开时不再上报关闭消息）
+    __closing_peers: Set[str] = None
+
+    # 允许的对端用户ID（为空时不限制）
+    __allowed_uids: Optional[Set[int]] = None
+
+    # 单帧收发的超时时间（秒）
+    __frame_timeout: float = 5
+
+    def __init__(self, address: str, port: int = 0, **kwargs):
+        """
+        初始化
+        :param address: 套接字路径
+        :param port: 未使用
+        :param kwargs: allowed_uids 允许的对端用户ID，frame_timeout 单帧发送的超时时间（秒），max_frame_size 单帧最大字节数
+        """
+        self.__peers = {}
+        self.__ready = collections.deque()
+        self.__max_frame_size = kwargs.get("max_frame_size", 64 * 1024 * 1024)
+        self.__peer_credentials = {}
+        self.__peer_ids = itertools.count(1)
+        self.__closing_peers = set()
+        allowed_uids = kwargs.get("allowed_uids")
+        self.__allowed_uids = set(allowed_uids) if allowed_uids is not None else None
+        self.__frame_timeout = kwargs.get("frame_timeout", 5)
+        super().__init__(address, 0, **kwargs)
+
+    @property
+    def running(self) -> bool:
+        """
+        是否正在运行
+        :return:
+        """
+        return self.__running
+
+    @property
+    def pending(self) -> bool:
+        """
+        是否有已接收完整、等待返回的消息（一次读取可能包含多帧）
+        :return:
+        """
+        return bool(self.__ready)
+
+    @property
+    def selectable(self):
+        """
+        选择器本身可被外层选择器等待，任一连接可读时外层选择器即可读
+        :return:
+        """
+        return self.__selector
+
+    def _generate_connection(self, family=socket.AF_UNIX, type=socket.SOCK_STREAM) -> socket:
+        """
+        监听
+        :return:
+        """
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.__connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__connection.bind(self.address)
+        self.__connection.listen(100)
+        self.__connection.setblocking(False)
+        self.__selector = selectors.DefaultSelector()
+        self.__selector.register(self.__connection, selectors.EVENT_READ, None)
+        self.__running = True
+        return self.__connection
+
+    def send(self, message_package: Union[MessagePackage, PreparedMessage], destination: str = None, reliable: bool = False):
+        """
+        发送一帧消息到服务节点
+        :param message_package: 消息包或预编码消息
+        :param destination: 连接标识
+        :param reliable: 未使用（流连接本身可靠）
+        :return:
+        """
+        peer = self.__peers.get(destination)
+        if peer is None:
+            raise ConnectionError(f"服务节点{destination}未连接")
+        if isinstance(message_package, PreparedMessage):
+            message_package = message_package.message_package
+        with peer.send_lock:
+            FramedSocket(peer.socket, self.get_peer_codec(destination), self.name).send(message_package)
+
+    def receive_datagram(self, size: int = 2000) -> Tuple[bool, MessagePackage, Union[str, Tuple[str, int]]]:
+        """
+        返回一条已接收完整的消息，没有时处理一个就绪的连接：接受新连接，或读取已到达的数据
+        :param size: 未使用
+        :return: 消息是否完整，消息，连接标识
+        """
+        if self.__ready:
+            return self.__next_ready()
+        try:
+            events = self.__selector.select(1)
+        except (OSError, ValueError):
+            # 其他线程关闭了服务端
+            if self.__running:
+                raise
+            return False, None, None
+        for key, _ in events:
+            if key.data is None:
+                self.__accept()
+                return False, None, None
+            self.__read(key.data)
+            if self.__ready:
+                return self.__next_ready()
+        return False, None, None
+
+    def __read(self, peer_id: str):
+        """
+        读取连接已到达的数据（不阻塞），取出其中完整的帧；连接断开或数据无效时移除连接
+        :param peer_id: 连接标识
+        :return:
+        """
+        peer = self.__peers[peer_id]
+        try:
+            data = peer.socket.recv(65536, socket.MSG_DONTWAIT)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logging.warning((self.name or "本机流服务端") + f"接收{peer_id}的数据异常：{e}")
+            data = b""
+        if not data:
+            if peer.buffer:
+                logging.warning((self.name or "本机流服务端") + f"{peer_id}在发送帧时关闭连接")
+            self.__disconnect(peer_id)
+            return
+        peer.buffer += data
+        header_size = FramedSocket.HEADER.size
+        while len(peer.buffer) >= header_size:
+            length, = FramedSocket.HEADER.unpack_from(peer.buffer)
+            if length > self.__max_frame_size:
+                logging.warning((self.name or "本机流服务端") + f"{peer_id}的帧长度{length}超出上限{self.__max_frame_size}")
+                self.__disconnect(peer_id)
+                return
+            if len(peer.buffer) < header_size + length:
+                return
+            frame = bytes(peer.buffer[header_size:header_size + length])
+            del peer.buffer[:header_size + length]
+            try:
+                self.__ready.append((peer_id, decode_message(frame)))
+            except Exception as e:
+                logging.warning((self.name or "本机流服务端") + f"解码{peer_id}的数据异常：{e}")
+
+    def __disconnect(self, peer_id: str):
+        """
+        移除断开的连接，之前接收完整的消息返回后再上报关闭
+        :param peer_id: 连接标识
+        :return:
+        """
+        self.__remove(peer_id)
+        self.__ready.append((peer_id, None))
+
+    def __next_ready(self) -> Tuple[bool, MessagePackage, Union[str, Tuple[str, int]]]:
+        """
+        返回下一条已接收完整的消息，连接断开时上报关闭消息（服务节点已发送关闭消息时不再上报）
+        :return: 消息是否完整，消息，连接标识
+        """
+        peer_id, msg = self.__ready.popleft()
+        if msg is None:
+            if peer_id in self.__closing_peers:
+                self.__closing_peers.discard(peer_id)
+                return False, None, None
+            return True, MessagePackage(MessageType.CONNECTION_CLOSE, None), peer_id
+        if msg.message_type == MessageType.CONNECTION_CLOSE:
+            self.__closing_peers.add(peer_id)
+        return True, msg, peer_id
+
+    def get_peer_credentials(self, address: str) -> Optional[PeerCredentials]:
+        """
+        获取对端进程的凭据
+        :param address: 连接标识
+        :return:
+        """
+        return self.__peer_credentials.get(address)
+
+    def __accept(self):
+        """
+        接受所有等待中的连接，不允许的用户的连接直接关闭
+        :return:
+        """
+        while True:
+            try:
+                peer, _ = self.__connection.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            credentials = read_peer_credentials(peer)
+            if self.__allowed_uids is not None and (credentials is None or credentials.uid not in self.__allowed_uids):
+                logging.warning((self.name or "本机流服务端") + f"拒绝进程{credentials}的连接")
+                peer.close()
+                continue
+            # 超时只限制发送，接收时只读取已到达的数据
+            peer.settimeout(self.__frame_timeout)
+            peer_id = f"{self.address}#{next(self.__peer_ids)}"
+            self.__peers[peer_id] = _StreamPeer(peer)
+            if credentials:
+                self.__peer_credentials[peer_id] = credentials
+            self.__selector.register(peer, selectors.EVENT_READ, peer_id)
+
+    def __remove(self, peer_id: str):
+        """
+        移除连接
+        :param peer_id: 连接标识
+        :return:
+        """
+        peer = self.__peers.pop(peer_id)
+        self.__peer_credentials.pop(peer_id, None)
+        self.__selector.unregister(peer.socket)
+        peer.socket.close()
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        if self.__running:
+            self.__running = False
+            for peer_id in list(self.__peers):
+                self.__remove(peer_id)
+            self.__selector.close()
+            super().close()
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            logging.info((self.name or "本机流服务端") + "关闭")
+
+
+class UnixStreamClient(Connection):
+    """
+    本机流客户端
+    """
+
+    # 连接
+    __connection: socket.socket = None
+
+    # 发送锁（心跳线程与接收线程都会发送，帧不能交错）
+    __send_lock: threading.Lock = None
+
+    def __init__(self, address: str, port: int = 0, **kwargs):
+        """
+        初始化
+        :param address: 服务端套接字路径
+        :param port: 未使用
+        :param kwargs:
+        """
+        self.__send_lock = threading.Lock()
+        super().__init__(address, 0, **kwargs)
+
+    @property
+    def server_address(self) -> str:
+        """
+        获取服务端地址
+        :return:
+        """
+        return self.address
+
+    def _generate_connection(self, family=socket.AF_UNIX, type=socket.SOCK_STREAM) -> socket:
+        """
+        连接服务端
+        :return:
+        """
+        self.__connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__connection.connect(self.address)
+        return self.__connection
+
+    def send(self, message_package: Union[MessagePackage, PreparedMessage], destination: str = None, reliable: bool = False):
+        """
+        发送一帧消息
+        :param message_package: 消息包或预编码消息
+        :param destination: 未使用
+        :param reliable: 未使用（流连接本身可靠）
+        :return:
+        """
+        if isinstance(message_package, PreparedMessage):
+            message_package = message_package.message_package
+        with self.__send_lock:
+            FramedSocket(self.__connection, self.get_peer_codec(self.address), self.name).send(message_package)
+
+    def receive_datagram(self, size: int = 2000) -> Tuple[bool, MessagePackage, Union[str, Tuple[str, int]]]:
+        """
+        接收一帧消息
+        :param size: 未使用
+        :return: 消息是否完整，消息，服务端地址
+        """
+        msg = FramedSocket(self.__connection).receive()
+        if msg is None:
+            raise ConnectionError("从节点已关闭连接")
+        return True, msg, self.address
+
+    def get_peer_credentials(self, address: str = None) -> Optional[PeerCredentials]:
+        """
+        获取从节点进程的凭据
+        :param address: 未使用
+        :return:
+        """
+        return read_peer_credentials(self.__connection)
+
+
+def create_local_server(address: str, port: int, transport: str = None, **kwargs) -> Connection:
+    """
+    创建从节点面向本机服务节点的服务端
+    :param address: 地址（本机套接字时为路径）
+    :param port: 端口号（本机套接字时为0）
+    :param transport: 传输方式（udp、unix_dgram、unix_stream），未指定时端口号为0使用unix_dgram，否则使用udp
+    :param kwargs:
+    :return:
+    """
+    transport = transport or (TRANSPORT_UDP if port else TRANSPORT_UNIX_DGRAM)
+    if transport == TRANSPORT_UNIX_STREAM:
+        return UnixStreamServer(address, 0, **kwargs)
+    if transport == TRANSPORT_UNIX_DGRAM:
+        return UdpServer(address, 0, **kwargs)
+    if transport == TRANSPORT_UDP:
+        return UdpServer(address, port, **kwargs)
+    raise ValueError(f"unsupported transport: {transport}")
+
+
+def create_local_client(address: str, port: int, transport: str = None, **kwargs) -> Connection:
+    """
+    创建服务节点连接从节点的客户端
+    :param address: 从节点地址（本机套接字时为路径）
+    :param port: 端口号（本机套接字时为0）
+    :param transport: 传输方式（udp、unix_dgram、unix_stream），未指定时端口号为0使用unix_dgram，否则使用udp
+    :param kwargs:
+    :return:
+    """
+    transport = transport or (TRANSPORT_UDP if port else TRANSPORT_UNIX_DGRAM)
+    if transport == TRANSPORT_UNIX_STREAM:
+        return UnixStreamClient(address, 0, **kwargs)
+    if transport == TRANSPORT_UNIX_DGRAM:
+        return UdpClient(address, 0, **kwargs)
+    if transport == TRANSPORT_UDP:
+        return UdpClient(address, port, **kwargs)
+    raise ValueError(f"unsupported transport: {transport}")
@@ -0,0 +1,234 @@
+"""
+消息工作队列
+
+接收线程（或事件循环）只解码消息并放入有界队列，由工作线程池处理，处理中的仓储读取与发送不会阻塞套接字的接收，
+接收缓冲区不会因处理缓慢而溢出丢包。队列按来源地址分片，同一个对端的消息由同一个工作线程按顺序处理。
+
+队列已满时按消息类型的策略处理：
+drop：丢弃新到的消息（对端会重试的消息，如心跳、配置请求）
+shed：丢弃分片中最早排队的drop类消息为新消息腾出空间，没有可丢弃的消息时丢弃新消息（如握手、主节点心跳）
+shed类消息优先于drop类消息处理。
+"""
+import collections
+import logging
+import threading
+import time
+import zlib
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Tuple, Union
+
+from communication.message import MessagePackage, MessageType
+
+# 队列已满时丢弃新消息
+POLICY_DROP = "drop"
+
+# 队列已满时丢弃最早排队的drop类消息
+POLICY_SHED = "shed"
+
+# 默认的消息类型策略（未列出的类型为drop）
+DEFAULT_POLICIES: Dict[MessageType, str] = {
+    MessageType.HANDSHAKE_REQUEST: POLICY_SHED,
+    MessageType.MASTER_HEARTBEAT: POLICY_SHED,
+    MessageType.HEARTBEAT_REQUEST: POLICY_DROP,
+    MessageType.CONFIGURATION_REQUEST: POLICY_DROP,
+    MessageType.DIGEST_REQUEST: POLICY_DROP,
+}
+
+# 对端地址
+Address = Union[Tuple[str, int], str]
+
+# 排队的（消息, 来源地址, 入队时间）
+Item = Tuple[MessagePackage, Address, float]
+
+
+class WorkQueue:
+    """
+    有界消息工作队列
+    """
+
+    # 消息处理函数
+    __handler: Callable[[MessagePackage, Address], None] = None
+
+    # 由来源地址生成分片键的函数
+    __key: Callable[[Address], Hashable] = None
+
+    # 每个分片的（shed类队列, drop类队列）
+    __shards: List[Tuple[Deque[Item], Deque[Item]]] = None
+
+    # 每个分片的条件变量
+    __conditions: List[threading.Condition] = None
+
+    # 每个分片最多排队的消息数量
+    __shard_size: int = 256
+
+    # 消息类型 -> 策略
+    __policies: Dict[MessageType, str] = None
+
+    # 工作线程
+    __workers: List[threading.Thread] = None
+
+    # 工作线程名称前缀
+    __name: str = "worker"
+
+    # 是否运行
+    __running: bool = False
+
+    # 统计锁
+    __lock: threading.Lock = None
+
+    # 已入队的消息数量
+    __enqueued: int = 0
+
+    # 已处理的消息数量
+    __handled: int = 0
+
+    # 队列已满丢弃的消息数量（按消息类型）
+    __dropped: Dict[str, int] = None
+
+    # 排队的最大消息数量
+    __max_depth: int = 0
+
+    # 排队等待时间的指数移动平均（秒）
+    __wait_avg: float = 0.0
+
+    # 排队等待时间的最大值（秒）
+    __wait_max: float = 0.0
+
+    # 处理时间的指数移动平均（秒）
+    __handle_avg: float = 0.0
+
+    # 上次记录丢弃日志的时间（过载时每秒最多记录一次）
+    __last_warning_ts: float = 0
+
+    def __init__(self, handler: Callable[[MessagePackage, Address], None], **kwargs):
+        """
+        初始化
+        :param handler: 消息处理函数
+        :param kwargs: workers 工作线程数量（默认4），max_size 最多排队的消息数量（默认1024，平均分到各工作线程），
+                       policies 消息类型 -> 策略（覆盖默认策略），key 由来源地址生成分片键的函数（默认为IP地址），
+                       name 工作线程名称前缀
+        """
+        self.__handler = handler
+        self.__key = kwargs.get("key") or (lambda address: address[0] if isinstance(address, tuple) else address)
+        workers = max(1, kwargs.get("workers", 4))
+        self.__shard_size = max(1, kwargs.get("max_size", 1024) // workers)
+        self.__shards = [(collections.deque(), collections.deque()) for _ in range(workers)]
+        self.__conditions = [threading.Condition() for _ in range(workers)]
+        self.__policies = dict(DEFAULT_POLICIES)
+        self.__policies.update(kwargs.get("policies") or {})
+        self.__workers = []
+        self.__name = kwargs.get("name", "worker")
+        self.__lock = threading.Lock()
+        self.__dropped = {}
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        获取当前排队的消息数量
+        :return:
+        """
+        return sum(len(shed) + len(drop) for shed, drop in self.__shards)
+
+    @property
+    def statistics(self) -> Dict[str, Union[int, float, Dict[str, int]]]:
+        """
+        获取队列统计
+        :return: 已入队、已处理、当前与最大排队数量、按消息类型的丢弃数量、排队等待时间的平均值与最大值（毫秒）、处理时间的平均值（毫秒）
+        """
+        with self.__lock:
+            return {"enqueued": self.__enqueued, "handled": self.__handled, "queue_depth": self.queue_depth,
+                    "max_queue_depth": self.__max_depth, "dropped": dict(self.__dropped),
+                    "wait_avg_ms": self.__wait_avg * 1000, "wait_max_ms": self.__wait_max * 1000,
+                    "handle_avg_ms": self.__handle_avg * 1000}
+
+    def start(self):
+        """
+        启动工作线程
+        :return:
+        """
+        if not self.__running:
+            self.__running = True
+            for index in range(len(self.__shards)):
+                worker = threading.Thread(target=self.__work, args=(index,), name=f"{self.__name}-{index}", daemon=True)
+                worker.start()
+                self.__workers.append(worker)
+
+    def close(self):
+        """
+        停止工作线程，排队的消息不再处理
+        :return:
+        """
+        self.__running = False
+        for condition in self.__conditions:
+            with condition:
+                condition.notify_all()
+
+    def submit(self, msg: MessagePackage, address: Address) -> bool:
+        """
+        消息入队（不阻塞），队列已满时按消息类型的策略丢弃
+        :param msg: 消息
+        :param address: 来源地址
+        :return: 是否入队
+        """
+        index = zlib.crc32(str(self.__key(address)).encode("utf-8")) % len(self.__shards)
+        shed, drop = self.__shards[index]
+        policy = self.__policies.get(msg.message_type, POLICY_DROP)
+        dropped: Optional[MessagePackage] = None
+        with self.__conditions[index]:
+            if len(shed) + len(drop) >= self.__shard_size:
+                if policy == POLICY_SHED and drop:
+                    dropped = drop.popleft()[0]
+                else:
+                    dropped = msg
+            if dropped is not msg:
+                (shed if policy == POLICY_SHED else drop).append((msg, address, time.monotonic()))
+                self.__conditions[index].notify()
+        warning = None
+        with self.__lock:
+            if dropped is not None:
+                name = dropped.message_type.name
+                self.__dropped[name] = self.__dropped.get(name, 0) + 1
+                now = time.monotonic()
+                if now - self.__last_warning_ts >= 1:
+                    self.__last_warning_ts = now
+                    warning = dict(self.__dropped)
+            if dropped is not msg:
+                self.__enqueued += 1
+                self.__max_depth = max(self.__max_depth, self.queue_depth)
+        if warning:
+            logging.warning(f"工作队列已满，累计丢弃的消息：{warning}")
+        return dropped is not msg
+
+    def __work(self, index: int):
+        """
+        处理一个分片的消息，shed类消息优先
+        :param index: 分片序号
+        :return:
+        """
+        shed, drop = self.__shards[index]
+        condition = self.__conditions[index]
+        while self.__running:
+            with condition:
+                while self.__running and not shed and not drop:
+                    condition.wait()
+                if not self.__running:
+                    return
+                msg, address, enqueued_ts = (shed or drop).popleft()
+            started_ts = time.monotonic()
+            try:
+                self.__handler(msg, address)
+            except Exception as e:
+                logging.warning(f"处理来自{address}的消息异常：{e}")
+            self.__record(started_ts - enqueued_ts, time.monotonic() - started_ts)
+
+    def __record(self, wait: float, elapsed: float):
+        """
+        记录排队等待时间与处理时间
+        :param wait: 排队等待时间（秒）
+        :param elapsed: 处理时间（秒）
+        :return:
+        """
+        with self.__lock:
+            self.__handled += 1
+            self.__wait_avg += (wait - self.__wait_avg) * 0.05
+            self.__wait_max = max(self.__wait_max, wait)
+            self.__handle_avg += (elapsed - self.__handle_avg) * 0.05
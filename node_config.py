@@ -19,18 +19,23 @@ class Address:
     # 描述
     __description: str
 
-    def __init__(self, ip: Optional[str], port:int, name:str, description:str):
+    # 传输方式（udp、unix_dgram、unix_stream），为空时端口为0使用unix_dgram，否则使用udp
+    __transport: Optional[str]
+
+    def __init__(self, ip: Optional[str], port:int, name:str, description:str, transport: Optional[str]=None):
         """
         地址
-        :param ip: 地址
-        :param port: 端口
+        :param ip: 地址（本机套接字时为路径）
+        :param port: 端口（本机套接字时为0）
         :param name: 名称
         :param description: 描述
+        :param transport: 传输方式
         """
         self.__ip = ip
         self.__port = port
         self.__name = name
         self.__description = description
+        self.__transport = transport
 
     def __str__(self):
         return f"{self.__ip}:{self.__port}  {self.__name}【{self.__description}】"
@@ -67,6 +72,14 @@ class Address:
         """
         return self.__description
 
+    @property
+    def transport(self) -> Optional[str]:
+        """
+        传输方式
+        :return:
+        """
+        return self.__transport
+
     @staticmethod
     def from_json_object(json_obj: Dict):
         """
@@ -74,19 +87,22 @@ class Address:
         :param json_obj:
         :return:
         """
-        return Address(json_obj["address"], json_obj["port"], json_obj["name"], json_obj["description"])
+        return Address(json_obj["address"], json_obj["port"], json_obj["name"], json_obj["description"], json_obj.get("transport"))
 
     def to_json_object(self) -> Dict:
         """
         转换为json对象
         :return:
         """
-        return {
+        json_obj = {
             "address": self.__ip,
             "port": self.__port,
             "name": self.__name,
             "description": self.__description
         }
+        if self.__transport:
+            json_obj["transport"] = self.__transport
+        return json_obj
 
 
 class MasterNodeConfig:
@@ -97,14 +113,19 @@ class MasterNodeConfig:
     # 配置服务端（为从节点提供配置服务）
     __config: Address = None
 
-    def __init__(self, discovery: Address, config: Address):
+    # 配置拉取服务端（从节点通过TCP持久连接拉取完整配置）
+    __pull: Address = None
+
+    def __init__(self, discovery: Address, config: Address, pull: Address = None):
         """
         主节点配置
         :param discovery: 发现服务端
         :param config: 配置服务端
+        :param pull: 配置拉取服务端
         """
         self.__discovery = discovery or Address("224.0.0.1", 20000, "组播发现服务端", "用于接收客户端的注册、心跳，及定期广播配置信息")
         self.__config = config or Address("0.0.0.0", 20001, "配置服务端", "用于接收配置相关服务的配置变更通知")
+        self.__pull = pull or Address("0.0.0.0", 20003, "配置拉取服务端", "用于从节点通过TCP持久连接拉取完整配置")
 
     @property
     def discovery(self) -> Address:
@@ -122,8 +143,16 @@ class MasterNodeConfig:
         """
         return self.__config
 
+    @property
+    def pull(self) -> Address:
+        """
+        配置拉取服务端
+        :return:
+        """
+        return self.__pull
+
     def __str__(self):
-        return f"发现服务端: {self.__discovery}\n配置服务端: {self.__config}"
+        return f"发现服务端: {self.__discovery}\n配置服务端: {self.__config}\n配置拉取服务端: {self.__pull}"
 
 class SlaveNodeConfig:
 
@@ -198,15 +227,18 @@ def get_master_node_config(config_path: str=None) -> MasterNodeConfig:
     """
     discovery = None
     config = None
+    pull = None
     if config_path and os.path.exists(config_path):
         try:
             with open(config_path, "r") as fs:
                 config_data = json.load(fs).get("master", {})
                 discovery = Address.from_json_object(config_data.get("discovery", {}))
                 config = Address.from_json_object(config_data.get("config", {}))
+                if "pull" in config_data:
+                    pull = Address.from_json_object(config_data["pull"])
         except Exception as e:
             logging.error(f"解析主节点配置文件失败: {e}", exc_info=True)
-    return MasterNodeConfig(discovery, config)
+    return MasterNodeConfig(discovery, config, pull)
 
 def get_slave_node_config(config_path: str=None) -> SlaveNodeConfig:
     """
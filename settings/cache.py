@@ -0,0 +1,136 @@
+"""
+从节点配置缓存
+
+从节点把已应用的主节点纪元、修订号与各模块的配置版本持久化到本地文件，重启时直接从缓存恢复摘要树与修订号，
+不需要逐个读取配置仓储中的文件，本机服务节点在握手前即可通过保留的配置快照读取配置；
+握手时携带缓存的纪元与修订号，主节点只下发之后变化的配置版本，纪元变化时下发全部配置版本，只拉取与缓存版本不同的模块。
+缓存在后台与配置仓储比较，不一致时以配置仓储为准，之后由根摘要比较发现与主节点的差异。
+
+缓存只在配置拉取线程中写入，每次变化后写入临时文件并替换，进程在写入中途退出时保留上一次完整的缓存。
+"""
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from settings.setting import SettingVersion, SettingVersionType
+
+
+class ConfigurationCache:
+    """
+    从节点配置缓存
+    """
+
+    # 缓存文件路径
+    __path: str = None
+
+    # 主节点的纪元
+    __epoch: Optional[str] = None
+
+    # 已应用的修订号
+    __revision: int = 0
+
+    # 模块名称 -> 配置版本
+    __versions: Dict[str, str] = None
+
+    def __init__(self, path: str):
+        """
+        初始化
+        :param path: 缓存文件路径
+        """
+        self.__path = path
+        self.__versions = {}
+
+    @property
+    def path(self) -> str:
+        """
+        获取缓存文件路径
+        :return:
+        """
+        return self.__path
+
+    @property
+    def epoch(self) -> Optional[str]:
+        """
+        获取主节点的纪元
+        :return: 尚未应用过主节点的配置版本时为空
+        """
+        return self.__epoch
+
+    @property
+    def revision(self) -> int:
+        """
+        获取已应用的修订号
+        :return:
+        """
+        return self.__revision
+
+    @property
+    def setting_versions(self) -> List[SettingVersion]:
+        """
+        获取缓存的配置版本
+        :return:
+        """
+        return [SettingVersion(name, version, SettingVersionType.SECTION) for name, version in self.__versions.items()]
+
+    def load(self) -> bool:
+        """
+        读取缓存文件
+        :return: 是否读取成功（文件不存在或格式不符时为否）
+        """
+        try:
+            with open(self.__path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            epoch, revision, versions = data.get("epoch"), int(data.get("revision", 0)), dict(data.get("versions", {}))
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logging.warning(f"读取配置缓存{self.__path}失败：{e}")
+            return False
+        self.__epoch = epoch
+        self.__revision = revision
+        self.__versions = versions
+        return True
+
+    def update(self, setting_versions: Iterable[SettingVersion] = (), removed_names: Iterable[str] = (), complete: bool = False):
+        """
+        更新模块的配置版本并写入缓存文件
+        :param setting_versions: 配置版本
+        :param removed_names: 移除的模块
+        :param complete: 是否为全部模块的配置版本（为True时移除不在其中的模块）
+        :return:
+        """
+        versions = {} if complete else dict(self.__versions)
+        for module_name in removed_names:
+            versions.pop(module_name, None)
+        versions.update((setting_version.name, setting_version.version) for setting_version in setting_versions)
+        self.__versions = versions
+        self.__flush()
+
+    def advance(self, epoch: Optional[str], revision: int):
+        """
+        记录已应用的纪元与修订号并写入缓存文件
+        :param epoch: 主节点的纪元
+        :param revision: 已应用的修订号
+        :return:
+        """
+        self.__epoch = epoch
+        self.__revision = revision
+        self.__flush()
+
+    def __flush(self):
+        """
+        写入临时文件后替换缓存文件
+        :return:
+        """
+        tmp_path = f"{self.__path}~"
+        try:
+            os.makedirs(os.path.dirname(self.__path) or ".", exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"epoch": self.__epoch, "revision": self.__revision, "versions": self.__versions},
+                          f, separators=(",", ":"), ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.__path)
+        except OSError as e:
+            logging.warning(f"写入配置缓存{self.__path}失败：{e}")
@@ -0,0 +1,175 @@
+"""
+配置版本摘要树
+
+按模块名称把配置版本分到固定数量的桶中，桶的摘要由桶内的（模块名称, 版本）计算，上层节点的摘要由子节点的摘要计算，
+主节点定期只广播根摘要，子节点与自己的摘要树比较，不一致时逐层向下找到不一致的桶，再比较桶内的配置版本。
+广播大小与模块数量无关，检查间隔可以从小时缩短到秒级。
+
+节点以（层, 序号）标识：第0层只有根节点，节点(层, 序号)的子节点为(层+1, 序号*分支数+i)，最底层为桶。
+"""
+import hashlib
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from settings.setting import SettingVersion
+
+# 每个节点的子节点数量
+FANOUT = 16
+
+# 层数（不含根节点），桶的数量为 FANOUT ** DEPTH
+DEPTH = 2
+
+# 摘要字节数
+DIGEST_SIZE = 8
+
+
+def bucket_of(module_name: str) -> int:
+    """
+    获取模块所在的桶（各进程一致，不使用带随机盐的内置hash）
+    :param module_name: 模块名称
+    :return:
+    """
+    return zlib.crc32(module_name.encode("utf-8")) % (FANOUT ** DEPTH)
+
+
+class VersionDigest:
+    """
+    配置版本摘要树
+    """
+
+    # 桶：模块名称 -> 版本
+    __buckets: List[Dict[str, str]] = None
+
+    # 各层节点的摘要（第0层为根节点），为空表示需要重新计算
+    __levels: List[List[Optional[str]]] = None
+
+    # 摘要锁
+    __lock: threading.Lock = None
+
+    def __init__(self, setting_versions: Iterable[SettingVersion] = ()):
+        """
+        初始化
+        :param setting_versions: 初始的配置版本
+        """
+        self.__buckets = [{} for _ in range(FANOUT ** DEPTH)]
+        self.__levels = [[None] * (FANOUT ** level) for level in range(DEPTH + 1)]
+        self.__lock = threading.Lock()
+        self.update(setting_versions)
+
+    @property
+    def root(self) -> str:
+        """
+        获取根摘要
+        :return:
+        """
+        with self.__lock:
+            return self.__digest(0, 0)
+
+    def update(self, setting_versions: Iterable[SettingVersion], complete: bool = False):
+        """
+        更新模块的配置版本
+        :param setting_versions: 配置版本
+        :param complete: 是否为全部模块的配置版本（为True时移除不在其中的模块）
+        :return:
+        """
+        with self.__lock:
+            names = set()
+            for setting_version in setting_versions:
+                names.add(setting_version.name)
+                bucket = bucket_of(setting_version.name)
+                versions = self.__buckets[bucket]
+                if setting_version.name not in versions or versions[setting_version.name] != setting_version.version:
+                    versions[setting_version.name] = setting_version.version
+                    self.__invalidate(bucket)
+            if complete:
+                for bucket, versions in enumerate(self.__buckets):
+                    for name in [name for name in versions if name not in names]:
+                        del versions[name]
+                        self.__invalidate(bucket)
+
+    def remove(self, names: Iterable[str]):
+        """
+        移除模块
+        :param names: 模块名称
+        :return:
+        """
+        with self.__lock:
+            for name in names:
+                bucket = bucket_of(name)
+                if name in self.__buckets[bucket]:
+                    del self.__buckets[bucket][name]
+                    self.__invalidate(bucket)
+
+    def children(self, nodes: Iterable[Tuple[int, int]]) -> List[Tuple[int, int, str]]:
+        """
+        获取节点的子节点摘要
+        :param nodes: （层, 序号）
+        :return: （层, 序号, 摘要）
+        """
+        children = []
+        with self.__lock:
+            for level, index in nodes:
+                if 0 <= level < DEPTH and 0 <= index < FANOUT ** level:
+                    for child in range(index * FANOUT, (index + 1) * FANOUT):
+                        children.append((level + 1, child, self.__digest(level + 1, child)))
+        return children
+
+    def differing(self, children: Iterable[Tuple[int, int, str]]) -> List[Tuple[int, int]]:
+        """
+        比较对端的子节点摘要
+        :param children: 对端的（层, 序号, 摘要）
+        :return: 摘要不一致的（层, 序号）
+        """
+        with self.__lock:
+            return [(level, index) for level, index, digest in children
+                    if 0 < level <= DEPTH and 0 <= index < FANOUT ** level and self.__digest(level, index) != digest]
+
+    def bucket_versions(self, buckets: Iterable[int]) -> Dict[int, Dict[str, str]]:
+        """
+        获取桶内的配置版本
+        :param buckets: 桶序号
+        :return: 桶序号 -> 模块名称 -> 版本
+        """
+        with self.__lock:
+            return {bucket: dict(self.__buckets[bucket]) for bucket in buckets if 0 <= bucket < len(self.__buckets)}
+
+    def changed(self, setting_versions: Iterable[SettingVersion]) -> List[SettingVersion]:
+        """
+        获取与摘要中的版本不同或摘要中不存在的配置版本
+        :param setting_versions: 配置版本
+        :return:
+        """
+        with self.__lock:
+            return [setting_version for setting_version in setting_versions
+                    if self.__buckets[bucket_of(setting_version.name)].get(setting_version.name) != setting_version.version]
+
+    def __invalidate(self, bucket: int):
+        """
+        桶内版本变化后清除桶到根节点路径上的摘要
+        :param bucket: 桶序号
+        :return:
+        """
+        index = bucket
+        for level in range(DEPTH, -1, -1):
+            self.__levels[level][index] = None
+            index //= FANOUT
+
+    def __digest(self, level: int, index: int) -> str:
+        """
+        获取节点的摘要，需要时从下层重新计算
+        :param level: 层
+        :param index: 序号
+        :return:
+        """
+        digest = self.__levels[level][index]
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+            if level == DEPTH:
+                for name, version in sorted(self.__buckets[index].items()):
+                    hasher.update(name.encode("utf-8") + b"\0" + (version or "").encode("utf-8") + b"\0")
+            else:
+                for child in range(index * FANOUT, (index + 1) * FANOUT):
+                    hasher.update(bytes.fromhex(self.__digest(level + 1, child)))
+            digest = self.__levels[level][index] = hasher.hexdigest()
+        return digest
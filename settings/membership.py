@@ -0,0 +1,176 @@
+"""
+子节点成员索引
+
+把节点代理端仓储中允许的子节点地址与网段编译为内存中的前缀表，主节点的接收路径上只做内存查找，不再读取文件；
+一条网段记录即可允许整个子网。仓储在本进程中变化时立即重新编译，其他进程修改仓储目录时按检查间隔发现并重新编译。
+
+仓储记录为{"ip": 地址或网段}，如{"ip": "10.10.0.231"}或{"ip": "10.10.0.0/16"}，IPv4与IPv6均支持；
+没有"ip"的非空记录以记录标识（即文件名）为地址，与按地址读取记录的方式保持一致。
+"""
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+from settings.repository import LocalNodeClientRepository
+
+
+class PrefixTable:
+    """
+    前缀表：按前缀长度分组的网络号集合，查找时按表中出现的前缀长度从长到短各做一次集合查找
+    """
+
+    # 地址位数（IPv4为32，IPv6为128）
+    __bits: int = 32
+
+    # 前缀长度 -> 网络号集合
+    __networks: Dict[int, Set[int]] = None
+
+    # 出现的前缀长度（从长到短）
+    __prefix_lengths: List[int] = None
+
+    def __init__(self, bits: int):
+        """
+        初始化
+        :param bits: 地址位数
+        """
+        self.__bits = bits
+        self.__networks = {}
+        self.__prefix_lengths = []
+
+    def add(self, network: int, prefix_length: int):
+        """
+        添加网段
+        :param network: 网络地址（整数）
+        :param prefix_length: 前缀长度
+        :return:
+        """
+        shift = self.__bits - prefix_length
+        if prefix_length not in self.__networks:
+            self.__networks[prefix_length] = set()
+            self.__prefix_lengths = sorted(self.__networks, reverse=True)
+        self.__networks[prefix_length].add(network >> shift)
+
+    def contains(self, address: int) -> bool:
+        """
+        地址是否在任一网段中
+        :param address: 地址（整数）
+        :return:
+        """
+        for prefix_length in self.__prefix_lengths:
+            if address >> (self.__bits - prefix_length) in self.__networks[prefix_length]:
+                return True
+        return False
+
+
+class MembershipIndex:
+    """
+    子节点成员索引
+    """
+
+    # 节点代理端仓储
+    __repository: LocalNodeClientRepository = None
+
+    # 允许的单个地址（字符串，命中时不需要解析地址）
+    __addresses: Set[str] = None
+
+    # IPv4与IPv6的前缀表
+    __tables: Tuple[PrefixTable, PrefixTable] = None
+
+    # 编译时仓储的修改计数
+    __generation: int = -1
+
+    # 编译时仓储目录的修改时间
+    __mtime_ns: int = -1
+
+    # 检查仓储目录修改时间的间隔（秒）
+    __check_interval: float = 5
+
+    # 下次检查仓储目录修改时间的时间
+    __next_check_ts: float = 0
+
+    # 编译锁
+    __lock: threading.Lock = None
+
+    def __init__(self, repository: LocalNodeClientRepository, check_interval: float = 5):
+        """
+        初始化
+        :param repository: 节点代理端仓储
+        :param check_interval: 检查仓储目录是否被其他进程修改的间隔（秒）
+        """
+        self.__repository = repository
+        self.__check_interval = check_interval
+        self.__lock = threading.Lock()
+        self.reload()
+
+    def contains(self, ip_address: str) -> bool:
+        """
+        地址是否为允许的子节点
+        :param ip_address: 地址
+        :return:
+        """
+        if self.__generation != self.__repository.generation or time.monotonic() >= self.__next_check_ts:
+            self.__reload_if_changed()
+        if ip_address in self.__addresses:
+            return True
+        try:
+            if ":" in ip_address:
+                return self.__tables[1].contains(int.from_bytes(socket.inet_pton(socket.AF_INET6, ip_address), "big"))
+            return self.__tables[0].contains(int.from_bytes(socket.inet_aton(ip_address), "big"))
+        except (OSError, TypeError):
+            return False
+
+    def reload(self):
+        """
+        从仓储重新编译
+        :return:
+        """
+        with self.__lock:
+            generation = self.__repository.generation
+            mtime_ns = self.__get_mtime_ns()
+            addresses = set()
+            tables = (PrefixTable(32), PrefixTable(128))
+            for _id, node in self.__repository.get_all_items():
+                entry = node.get("ip") if isinstance(node, dict) else None
+                if not entry:
+                    if not node:
+                        logging.warning(f"忽略空的子节点记录：{_id}")
+                        continue
+                    # 没有"ip"的记录与按记录标识查找时一致，以记录标识为地址
+                    entry = _id
+                try:
+                    network = ipaddress.ip_network(entry, strict=False)
+                except ValueError:
+                    logging.warning(f"忽略无效的子节点地址：{entry}")
+                    continue
+                if network.prefixlen == network.max_prefixlen:
+                    addresses.add(str(network.network_address))
+                tables[0 if network.version == 4 else 1].add(int(network.network_address), network.prefixlen)
+            self.__addresses = addresses
+            self.__tables = tables
+            self.__generation = generation
+            self.__mtime_ns = mtime_ns
+            self.__next_check_ts = time.monotonic() + self.__check_interval
+
+    def __reload_if_changed(self):
+        """
+        仓储在本进程中变化或仓储目录被修改时重新编译
+        :return:
+        """
+        if self.__generation != self.__repository.generation or self.__get_mtime_ns() != self.__mtime_ns:
+            self.reload()
+        else:
+            self.__next_check_ts = time.monotonic() + self.__check_interval
+
+    def __get_mtime_ns(self) -> int:
+        """
+        获取仓储目录的修改时间
+        :return:
+        """
+        try:
+            return os.stat(self.__repository.get_store_dir_path).st_mtime_ns
+        except OSError:
+            return -1
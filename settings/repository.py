@@ -2,7 +2,7 @@ import abc
 import os
 import pickle
 import uuid
-from typing import List, Any
+from typing import List, Any, Tuple
 from settings.setting import SettingVersionType, SettingVersion
 
 
@@ -93,13 +93,21 @@ class BaseFileRepository(metaclass=abc.ABCMeta):
         获取所有对象
         :return:
         """
-        objs = []
+        return [obj for _, obj in self.get_all_items()]
+
+    def get_all_items(self) -> List[Tuple[str, Any]]:
+        """
+        获取所有对象及其标识
+        :return: （标识, 对象）列表
+        """
+        items = []
         for file_path in os.listdir(self.__store_dir_path):
             if self.__file_extension and not file_path.lower().endswith(self.__file_extension.lower()):
                 continue
+            _id = file_path[:-len(self.__file_extension)] if self.__file_extension else file_path
             with open(os.path.join(self.__store_dir_path, file_path), "rb") as f:
-                objs.append(pickle.load(f))
-        return objs
+                items.append((_id, pickle.load(f)))
+        return items
 
 
 class SettingRepository(metaclass=abc.ABCMeta):
@@ -169,7 +177,47 @@ class MasterSettingRepository(LocalSettingRepository):
 class LocalNodeClientRepository(BaseFileRepository):
     """
     客户节点端仓库
+
+    记录为{"ip": 地址或网段}，网段（如10.10.0.0/16）允许其中的所有子节点；没有"ip"的记录以记录标识为地址
     """
 
-    def __init__(self):
-        super().__init__("node_client")
\ No newline at end of file
+    # 修改计数（成员索引据此发现本进程中的修改）
+    __generation: int = 0
+
+    def __init__(self, **kwargs):
+        super().__init__("node_client", **kwargs)
+
+    @property
+    def generation(self) -> int:
+        """
+        获取修改计数
+        :return:
+        """
+        return self.__generation
+
+    def save(self, obj, _id):
+        """
+        保存对象
+        :param obj:
+        :param _id:
+        :return:
+        """
+        super().save(obj, _id)
+        self.__generation += 1
+
+    def delete(self, _id):
+        """
+        删除对象
+        :param _id:
+        :return:
+        """
+        super().delete(_id)
+        self.__generation += 1
+
+    def save_node(self, address: str):
+        """
+        保存允许的子节点地址或网段
+        :param address: 地址或网段
+        :return:
+        """
+        self.save({"ip": address}, address.replace("/", "_"))
@@ -0,0 +1,112 @@
+"""
+配置修订号
+
+主节点维护全局单调递增的修订号，每个模块的配置版本变化时记录变化时的修订号，
+广播时只需发送某个修订号之后变化的模块，消息大小随变化的数量而不是模块的总数增长。
+修订号只在同一纪元（主节点进程）内有意义，主节点重启后纪元变化，子节点需要重新获取全部配置版本。
+"""
+import collections
+import threading
+import uuid
+from typing import Iterable, List, OrderedDict, Tuple
+
+from settings.setting import SettingVersion
+
+
+class RevisionIndex:
+    """
+    模块配置版本的修订号索引（按修订号排序，查询变化的模块只遍历变化的部分）
+    """
+
+    # 纪元
+    __epoch: str = None
+
+    # 当前修订号
+    __revision: int = 0
+
+    # 模块名称 -> (配置版本, 修订号)，按修订号从小到大排序
+    __entries: OrderedDict[str, Tuple[SettingVersion, int]] = None
+
+    # 索引锁
+    __lock: threading.Lock = None
+
+    def __init__(self):
+        """
+        初始化
+        """
+        self.__epoch = uuid.uuid4().hex
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def epoch(self) -> str:
+        """
+        获取纪元
+        :return:
+        """
+        return self.__epoch
+
+    @property
+    def revision(self) -> int:
+        """
+        获取当前修订号
+        :return:
+        """
+        return self.__revision
+
+    def update(self, setting_versions: Iterable[SettingVersion], complete: bool = False) -> List[SettingVersion]:
+        """
+        更新模块的配置版本，版本变化的模块记录新的修订号
+        :param setting_versions: 模块的配置版本
+        :param complete: 是否为全部模块的配置版本（为True时移除不在其中的模块）
+        :return: 版本变化的模块
+        """
+        changed = []
+        with self.__lock:
+            names = set()
+            for setting_version in setting_versions:
+                names.add(setting_version.name)
+                entry = self.__entries.get(setting_version.name)
+                if entry is not None and entry[0] == setting_version:
+                    continue
+                self.__revision += 1
+                self.__entries[setting_version.name] = (setting_version, self.__revision)
+                self.__entries.move_to_end(setting_version.name)
+                changed.append(setting_version)
+            if complete:
+                for name in [name for name in self.__entries if name not in names]:
+                    del self.__entries[name]
+        return changed
+
+    def remove(self, names: Iterable[str]):
+        """
+        移除模块
+        :param names: 模块名称
+        :return:
+        """
+        with self.__lock:
+            for name in names:
+                self.__entries.pop(name, None)
+
+    def changes_since(self, revision: int) -> List[SettingVersion]:
+        """
+        获取某个修订号之后变化的模块
+        :param revision: 修订号
+        :return: 按修订号从小到大排序的配置版本
+        """
+        changes = []
+        with self.__lock:
+            for setting_version, entry_revision in reversed(self.__entries.values()):
+                if entry_revision <= revision:
+                    break
+                changes.append(setting_version)
+        changes.reverse()
+        return changes
+
+    def get_all(self) -> List[SettingVersion]:
+        """
+        获取所有模块的配置版本
+        :return:
+        """
+        with self.__lock:
+            return [setting_version for setting_version, _ in self.__entries.values()]
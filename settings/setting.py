@@ -86,6 +86,15 @@ class SettingVersion:
         """
         return json.dumps(self.to_dict()).encode()
 
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "SettingVersion":
+        """
+        从字典转换
+        @param data:
+        @return:
+        """
+        return SettingVersion(data["name"], data["version"], SettingVersionType(data["type"]))
+
 
 class SettingSection:
     """
@@ -162,6 +171,32 @@ class SettingSection:
         """
         return self.__items.get(item_name)
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典
+        @return:
+        """
+        return {
+            "name": self.__name,
+            "module_name": self.__module_name,
+            "version": self.__version,
+            "description": self.__description,
+            "items": [setting_item.to_dict() for setting_item in (self.__items or {}).values()]
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "SettingSection":
+        """
+        从字典转换
+        @param data:
+        @return:
+        """
+        items = {}
+        setting_section = SettingSection(data["name"], items, data.get("module_name"), data.get("version"), data.get("description"))
+        for item in data.get("items") or []:
+            items[item["name"]] = SettingItem(item["name"], item.get("value"), setting_section, item.get("version"), item.get("description"))
+        return setting_section
+
 
 class SettingItem:
     """
@@ -233,6 +268,18 @@ class SettingItem:
         """
         return self.__version
 
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转换为字典（不包含所属配置项组）
+        @return:
+        """
+        return {
+            "name": self.__name,
+            "value": self.__value,
+            "version": self.__version,
+            "description": self.__description
+        }
+
     def full_name(self) -> str:
         """
         获取配置项全名
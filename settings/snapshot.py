@@ -0,0 +1,253 @@
+"""
+共享内存配置快照
+
+从节点把当前配置写入内存映射的快照文件，本机服务节点映射同一文件直接读取，
+配置变更时从节点只发送携带代数（generation）的小通知，不再为每个服务节点发送一份配置。
+
+文件头（小端）：魔数(4) + 版本(2) + 保留(2) + 序列号(8) + 代数(8) + 数据长度(8)，之后为配置数据（紧凑JSON）。
+序列号为顺序锁：写入前加1（奇数表示正在写入），写入完成后再加1；读取前后序列号相同且为偶数时数据一致。
+写入方只有从节点一个进程，读取方从不加锁、从不等待写入方；
+快照文件在从节点重启期间保留，服务节点仍可读取最后一次发布的配置。
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+from settings.setting import SettingSection
+
+# 文件头
+HEADER = struct.Struct("<4sHHQQQ")
+
+# 魔数
+MAGIC = b"JCSS"
+
+# 快照格式版本
+VERSION = 1
+
+# 序列号在文件头中的偏移
+_SEQUENCE_OFFSET = 8
+
+# 序列号、代数与数据长度
+_STATE = struct.Struct("<QQQ")
+
+# 最小数据容量
+_MIN_CAPACITY = 64 * 1024
+
+
+class SnapshotWriter:
+    """
+    快照写入方（从节点）
+    """
+
+    # 快照文件路径
+    __path: str = None
+
+    # 文件描述符
+    __fd: int = None
+
+    # 内存映射
+    __mmap: mmap.mmap = None
+
+    # 序列号
+    __sequence: int = 0
+
+    # 代数
+    __generation: int = 0
+
+    def __init__(self, path: str):
+        """
+        初始化，已存在的快照文件继续沿用其中的代数，读取方映射的旧数据在首次发布前保持可读
+        :param path: 快照文件路径
+        """
+        self.__path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.__fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self.__fd).st_size
+        if size < HEADER.size + _MIN_CAPACITY:
+            os.ftruncate(self.__fd, HEADER.size + _MIN_CAPACITY)
+        self.__mmap = mmap.mmap(self.__fd, 0)
+        magic, version, _, sequence, generation, _ = HEADER.unpack_from(self.__mmap)
+        if magic == MAGIC and version == VERSION:
+            # 上次写入中途退出时序列号为奇数，下次发布时恢复为偶数
+            self.__sequence = sequence + (sequence & 1)
+            self.__generation = generation
+        else:
+            HEADER.pack_into(self.__mmap, 0, MAGIC, VERSION, 0, 0, 0, 0)
+
+    @property
+    def path(self) -> str:
+        """
+        获取快照文件路径
+        :return:
+        """
+        return self.__path
+
+    @property
+    def generation(self) -> int:
+        """
+        获取当前代数
+        :return:
+        """
+        return self.__generation
+
+    def publish(self, setting_sections: Dict[str, SettingSection]) -> int:
+        """
+        发布配置快照
+        :param setting_sections: 模块名称 -> 配置项组
+        :return: 新的代数
+        """
+        data = json.dumps({module_name: setting_section.to_dict() for module_name, setting_section in setting_sections.items()},
+                          separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.__ensure_capacity(len(data))
+        generation = self.__generation + 1
+        # 序列号置为奇数，读取方在此期间读取的数据会被丢弃
+        self.__sequence += 1
+        struct.pack_into("<Q", self.__mmap, _SEQUENCE_OFFSET, self.__sequence)
+        self.__mmap[HEADER.size:HEADER.size + len(data)] = data
+        self.__sequence += 1
+        _STATE.pack_into(self.__mmap, _SEQUENCE_OFFSET, self.__sequence - 1, generation, len(data))
+        struct.pack_into("<Q", self.__mmap, _SEQUENCE_OFFSET, self.__sequence)
+        self.__generation = generation
+        return generation
+
+    def __ensure_capacity(self, length: int):
+        """
+        容量不足时扩大快照文件（只扩大不缩小，读取方发现数据超出映射范围时重新映射）
+        :param length: 数据长度
+        :return:
+        """
+        capacity = len(self.__mmap) - HEADER.size
+        if length <= capacity:
+            return
+        while capacity < length:
+            capacity *= 2
+        os.ftruncate(self.__fd, HEADER.size + capacity)
+        self.__mmap.close()
+        self.__mmap = mmap.mmap(self.__fd, 0)
+
+    def close(self):
+        """
+        关闭（保留快照文件）
+        :return:
+        """
+        if self.__mmap is not None:
+            self.__mmap.close()
+            os.close(self.__fd)
+            self.__mmap = None
+
+
+class SnapshotReader:
+    """
+    快照读取方（服务节点）
+    """
+
+    # 快照文件路径
+    __path: str = None
+
+    # 内存映射
+    __mmap: Optional[mmap.mmap] = None
+
+    # 一次读取的最大重试次数
+    __max_retries: int = 100
+
+    # 最后一次读取成功的代数
+    __generation: int = 0
+
+    # 最后一次读取成功的配置
+    __setting_sections: Dict[str, SettingSection] = None
+
+    def __init__(self, path: str, max_retries: int = 100):
+        """
+        初始化
+        :param path: 快照文件路径
+        :param max_retries: 一次读取的最大重试次数，超过后返回上一次读取成功的配置
+        """
+        self.__path = path
+        self.__max_retries = max_retries
+        self.__setting_sections = {}
+
+    @property
+    def path(self) -> str:
+        """
+        获取快照文件路径
+        :return:
+        """
+        return self.__path
+
+    @property
+    def generation(self) -> int:
+        """
+        读取快照当前的代数（只读文件头，不复制数据）
+        :return: 快照文件不存在或格式不符时返回0
+        """
+        if not self.__map():
+            return 0
+        return _STATE.unpack_from(self.__mmap, _SEQUENCE_OFFSET)[1]
+
+    def read(self) -> Tuple[int, Dict[str, SettingSection]]:
+        """
+        读取配置，代数未变化时直接返回上次的结果；
+        从节点正在写入或异常退出于写入中途时，重试有限次数后返回上一次读取成功的配置
+        :return: 代数，模块名称 -> 配置项组
+        """
+        for _ in range(self.__max_retries):
+            if not self.__map():
+                break
+            sequence, generation, length = _STATE.unpack_from(self.__mmap, _SEQUENCE_OFFSET)
+            if sequence & 1:
+                continue
+            if generation == self.__generation:
+                return self.__generation, self.__setting_sections
+            if HEADER.size + length > len(self.__mmap):
+                # 写入方扩大了快照文件，重新映射
+                self.__unmap()
+                continue
+            data = self.__mmap[HEADER.size:HEADER.size + length]
+            if _STATE.unpack_from(self.__mmap, _SEQUENCE_OFFSET)[0] != sequence:
+                continue
+            try:
+                setting_sections = {module_name: SettingSection.from_dict(section) for module_name, section in json.loads(data).items()}
+            except ValueError as e:
+                logging.warning(f"解析配置快照{self.__path}失败：{e}")
+                break
+            self.__generation = generation
+            self.__setting_sections = setting_sections
+            return generation, setting_sections
+        return self.__generation, self.__setting_sections
+
+    def __map(self) -> bool:
+        """
+        映射快照文件
+        :return: 是否已映射
+        """
+        if self.__mmap is not None:
+            return True
+        try:
+            with open(self.__path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(mapped) < HEADER.size or HEADER.unpack_from(mapped)[:2] != (MAGIC, VERSION):
+            mapped.close()
+            return False
+        self.__mmap = mapped
+        return True
+
+    def __unmap(self):
+        """
+        取消映射
+        :return:
+        """
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap = None
+
+    def close(self):
+        """
+        关闭
+        :return:
+        """
+        self.__unmap()
@@ -0,0 +1,200 @@
+"""
+子节点模块订阅索引
+
+子节点握手时声明本机服务使用的模块，主节点维护模块到订阅者的倒排索引，配置变更只发送到订阅了变化模块的子节点，
+不声明订阅的子节点（包括旧版本子节点）订阅所有模块。
+订阅相同模块集合的子节点归为一组，每组的消息只编码一次，并共享一棵只包含订阅模块的配置版本摘要树，
+子节点与自己的摘要树比较时不会因未订阅的模块而不一致。
+"""
+import threading
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple, Union
+
+from settings.digest import VersionDigest
+from settings.setting import SettingVersion
+
+# 订阅者地址
+Address = Union[Tuple[str, int], str]
+
+# 订阅的模块集合，为空表示订阅所有模块
+Subscription = Optional[FrozenSet[str]]
+
+
+class SubscriptionIndex:
+    """
+    模块订阅索引
+    """
+
+    # 订阅者 -> (地址, 订阅的模块集合)
+    __subscriptions: Dict[Hashable, Tuple[Address, Subscription]] = None
+
+    # 模块名称 -> 订阅者（倒排索引）
+    __subscribers: Dict[str, Set[Hashable]] = None
+
+    # 订阅所有模块的订阅者
+    __wildcard: Set[Hashable] = None
+
+    # 通过模块组播组接收配置变更的订阅者
+    __multicast: Set[Hashable] = None
+
+    # 订阅的模块集合 -> (摘要树, 订阅者数量)
+    __digests: Dict[FrozenSet[str], Tuple[VersionDigest, int]] = None
+
+    # 索引锁
+    __lock: threading.Lock = None
+
+    def __init__(self):
+        """
+        初始化
+        """
+        self.__subscriptions = {}
+        self.__subscribers = {}
+        self.__wildcard = set()
+        self.__multicast = set()
+        self.__digests = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__subscriptions)
+
+    def subscribe(self, key: Hashable, address: Address, modules: Optional[Iterable[str]],
+                  setting_versions: Callable[[], Iterable[SettingVersion]], multicast: bool = False):
+        """
+        记录订阅者订阅的模块，已订阅时替换
+        :param key: 订阅者
+        :param address: 订阅者地址
+        :param modules: 订阅的模块，为空时订阅所有模块
+        :param setting_versions: 获取当前所有模块配置版本的函数（首次出现的模块集合需要生成摘要树）
+        :param multicast: 是否通过模块组播组接收配置变更
+        :return:
+        """
+        subscription = frozenset(modules) if modules is not None else None
+        with self.__lock:
+            self.__remove(key)
+            self.__subscriptions[key] = (address, subscription)
+            if multicast:
+                self.__multicast.add(key)
+            if subscription is None:
+                self.__wildcard.add(key)
+                return
+            for module_name in subscription:
+                self.__subscribers.setdefault(module_name, set()).add(key)
+            digest, count = self.__digests.get(subscription, (None, 0))
+            if digest is None:
+                digest = VersionDigest(setting_version for setting_version in setting_versions() if setting_version.name in subscription)
+            self.__digests[subscription] = (digest, count + 1)
+
+    def unsubscribe(self, key: Hashable):
+        """
+        移除订阅者
+        :param key: 订阅者
+        :return:
+        """
+        with self.__lock:
+            self.__remove(key)
+
+    def is_subscribed(self, key: Hashable, address: Address) -> bool:
+        """
+        订阅者是否以此地址订阅
+        :param key: 订阅者
+        :param address: 地址
+        :return:
+        """
+        entry = self.__subscriptions.get(key)
+        return entry is not None and entry[0] == address
+
+    def subscription(self, key: Hashable) -> Subscription:
+        """
+        获取订阅者订阅的模块集合
+        :param key: 订阅者
+        :return: 为空表示订阅所有模块
+        """
+        entry = self.__subscriptions.get(key)
+        return entry[1] if entry is not None else None
+
+    def digest(self, subscription: Subscription) -> Optional[VersionDigest]:
+        """
+        获取模块集合的摘要树
+        :param subscription: 模块集合
+        :return: 订阅所有模块或没有订阅者时为空
+        """
+        if subscription is None:
+            return None
+        entry = self.__digests.get(subscription)
+        return entry[0] if entry is not None else None
+
+    def fan_out(self, module_names: Iterable[str], unicast_only: bool = False) -> Dict[Subscription, List[Address]]:
+        """
+        按倒排索引查找订阅了任一模块的订阅者，按订阅的模块集合分组
+        :param module_names: 变化的模块
+        :param unicast_only: 是否排除通过模块组播组接收配置变更的订阅者
+        :return: 模块集合 -> 订阅者地址
+        """
+        with self.__lock:
+            keys = set(self.__wildcard)
+            for module_name in module_names:
+                keys.update(self.__subscribers.get(module_name, ()))
+            if unicast_only:
+                keys -= self.__multicast
+            return self.__group(keys)
+
+    def groups(self) -> Dict[Subscription, List[Address]]:
+        """
+        所有订阅者按订阅的模块集合分组
+        :return: 模块集合 -> 订阅者地址
+        """
+        with self.__lock:
+            return self.__group(self.__subscriptions)
+
+    def update(self, setting_versions: List[SettingVersion], removed_names: Iterable[str] = (), complete: bool = False):
+        """
+        更新各模块集合的摘要树
+        :param setting_versions: 配置版本
+        :param removed_names: 移除的模块
+        :param complete: 是否为全部模块的配置版本（为True时移除不在其中的模块）
+        :return:
+        """
+        removed_names = list(removed_names)
+        with self.__lock:
+            digests = [(subscription, digest) for subscription, (digest, _) in self.__digests.items()]
+        for subscription, digest in digests:
+            if removed_names:
+                digest.remove(module_name for module_name in removed_names if module_name in subscription)
+            digest.update((setting_version for setting_version in setting_versions if setting_version.name in subscription), complete)
+
+    def __group(self, keys: Iterable[Hashable]) -> Dict[Subscription, List[Address]]:
+        """
+        按订阅的模块集合分组
+        :param keys: 订阅者
+        :return:
+        """
+        groups: Dict[Subscription, List[Address]] = {}
+        for key in keys:
+            address, subscription = self.__subscriptions[key]
+            groups.setdefault(subscription, []).append(address)
+        return groups
+
+    def __remove(self, key: Hashable):
+        """
+        移除订阅者（持有锁时调用），没有订阅者的模块集合不再维护摘要树
+        :param key: 订阅者
+        :return:
+        """
+        entry = self.__subscriptions.pop(key, None)
+        if entry is None:
+            return
+        self.__multicast.discard(key)
+        subscription = entry[1]
+        if subscription is None:
+            self.__wildcard.discard(key)
+            return
+        for module_name in subscription:
+            subscribers = self.__subscribers.get(module_name)
+            if subscribers is not None:
+                subscribers.discard(key)
+                if not subscribers:
+                    del self.__subscribers[module_name]
+        digest, count = self.__digests[subscription]
+        if count > 1:
+            self.__digests[subscription] = (digest, count - 1)
+        else:
+            del self.__digests[subscription]
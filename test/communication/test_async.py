@@ -0,0 +1,130 @@
+"""
+asyncio传输与节点测试
+"""
+import asyncio
+import socket
+import tempfile
+import threading
+import unittest
+
+from communication.async_connection import AsyncMulticastServer, AsyncUdpClient, AsyncUdpServer
+from communication.async_nodes import AsyncMasterNode
+from communication.message import MessagePackage, MessageType
+from communication.udp_connection import UdpClient, UdpServer
+from settings.repository import LocalNodeClientRepository, LocalSettingRepository
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class AsyncConnectionTest(unittest.TestCase):
+
+    def test_datagram_delivery(self):
+        async def run():
+            port = free_port()
+            server = AsyncUdpServer("127.0.0.1", port)
+            received = asyncio.Queue()
+            transport = await server.open(lambda msg, address: received.put_nowait(msg))
+            client = UdpClient("127.0.0.1", port)
+            try:
+                client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"name": "service"}))
+                msg = await asyncio.wait_for(received.get(), 5)
+            finally:
+                transport.close()
+                client.close()
+            self.assertEqual(msg.message_type, MessageType.HEARTBEAT_REQUEST)
+            self.assertEqual(msg.message_content, {"name": "service"})
+
+        asyncio.run(run())
+
+    def test_fragments_are_reassembled(self):
+        content = {"modules": [f"module{index}" for index in range(200)]}
+
+        async def run():
+            port = free_port()
+            server = AsyncUdpServer("127.0.0.1", port)
+            received = asyncio.Queue()
+            transport = await server.open(lambda msg, address: received.put_nowait(msg))
+            client = UdpClient("127.0.0.1", port, max_datagram_size=200)
+            try:
+                client.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, content))
+                msg = await asyncio.wait_for(received.get(), 5)
+                await asyncio.sleep(0.05)
+                self.assertTrue(received.empty())
+            finally:
+                transport.close()
+                client.close()
+            self.assertEqual(msg.message_content, content)
+
+        asyncio.run(run())
+
+    def test_send_through_transport(self):
+        async def run():
+            port = free_port()
+            server = UdpServer("127.0.0.1", port)
+            server.raw_socket.settimeout(5)
+            client = AsyncUdpClient("127.0.0.1", port)
+            transport = await client.open(lambda msg, address: None)
+            try:
+                client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"name": "async"}))
+                msg, _ = await asyncio.get_running_loop().run_in_executor(None, server.receive)
+            finally:
+                transport.close()
+                server.close()
+            self.assertEqual(msg.message_content, {"name": "async"})
+
+        asyncio.run(run())
+
+
+class AsyncMasterNodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.node_client_repository = LocalNodeClientRepository(store_dir_path=self.__store_dir.name)
+        self.setting_repository = LocalSettingRepository(store_dir_path=self.__store_dir.name)
+
+    def tearDown(self):
+        self.__store_dir.cleanup()
+
+    def test_close(self):
+        async def run():
+            multicast_server = AsyncMulticastServer("224.0.0.1", free_port())
+            udp_server = AsyncUdpServer("0.0.0.0", free_port())
+            node = AsyncMasterNode(multicast_server, udp_server, self.node_client_repository, self.setting_repository,
+                                   tcp_server=None, broadcast_interval=60)
+            node.start()
+            await asyncio.sleep(0.1)
+            # 默认不启动工作队列线程
+            self.assertFalse([thread for thread in threading.enumerate() if thread.name.startswith("master-worker")])
+            transports = [transport for _, transport in node._AsyncNode__transports]
+            close_socket = udp_server.close
+            closing = []
+
+            def close_udp_server():
+                # 关闭套接字时传输已经关闭
+                closing.append(all(transport.is_closing() for transport in transports))
+                close_socket()
+
+            udp_server.close = close_udp_server
+            node.close()
+            self.assertEqual(closing, [True])
+            await asyncio.wait_for(node.wait_closed(), 5)
+            await asyncio.sleep(0.05)
+            self.assertFalse(node.running)
+            self.assertEqual(multicast_server.raw_socket.fileno(), -1)
+            self.assertEqual(udp_server.raw_socket.fileno(), -1)
+            # 任务已取消，事件循环中只剩当前任务
+            self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
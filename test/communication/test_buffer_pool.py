@@ -0,0 +1,103 @@
+"""
+接收缓冲区池测试
+"""
+import os
+import socket
+import tempfile
+import unittest
+
+from communication.buffer_pool import BufferPool
+from communication.message import MessagePackage, MessageType
+from communication.udp_connection import UdpClient, UdpServer
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_buffer_is_reused(self):
+        pool = BufferPool(64, 2)
+        buffer = pool.acquire()
+        self.assertEqual(len(buffer), 64)
+        pool.release(buffer)
+        self.assertEqual(pool.idle_count, 1)
+        self.assertIs(pool.acquire(), buffer)
+        self.assertEqual(pool.idle_count, 0)
+
+    def test_exhausted_pool_allocates_and_keeps_capacity(self):
+        pool = BufferPool(64, 2)
+        buffers = [pool.acquire() for _ in range(4)]
+        self.assertEqual(len({id(buffer) for buffer in buffers}), 4)
+        for buffer in buffers:
+            pool.release(buffer)
+        # 超出容量的缓冲区直接丢弃
+        self.assertEqual(pool.idle_count, 2)
+
+    def test_buffer_of_other_size_is_not_kept(self):
+        pool = BufferPool(64, 2)
+        pool.release(bytearray(32))
+        self.assertEqual(pool.idle_count, 0)
+
+
+class PooledReceiveTest(unittest.TestCase):
+    """
+    经过回环地址接收到池中的缓冲区
+    """
+
+    def setUp(self):
+        self.pool = BufferPool(2000, 1)
+        port = free_port()
+        self.server = UdpServer("127.0.0.1", port, buffer_pool=self.pool, max_datagram_size=200)
+        self.server.raw_socket.settimeout(5)
+        self.client = UdpClient("127.0.0.1", port, max_datagram_size=200)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_decoded_message_does_not_alias_buffer(self):
+        self.client.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, {"modules": ["first"] * 5}))
+        first, _ = self.server.receive()
+        buffer = self.pool.acquire()
+        # 解码后的消息不再引用缓冲区，缓冲区没有导出的视图，可以改变大小
+        buffer.extend(b"x")
+        del buffer[-1:]
+        self.pool.release(buffer)
+        self.client.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, {"modules": ["second"] * 5}))
+        second, _ = self.server.receive()
+        self.assertIs(self.pool.acquire(), buffer)
+        self.assertEqual(first.message_content, {"modules": ["first"] * 5})
+        self.assertEqual(second.message_content, {"modules": ["second"] * 5})
+
+    def test_fragments_are_copied_out_of_buffer(self):
+        content = {"modules": [f"module{index}" for index in range(100)]}
+        self.client.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, content))
+        msg, _ = self.server.receive()
+        self.assertEqual(msg.message_content, content)
+        self.assertEqual(self.pool.idle_count, 1)
+
+    def test_unix_datagram_receive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "server.sock")
+            server = UdpServer(path, 0, buffer_pool=self.pool)
+            client = UdpClient(path, 0)
+            try:
+                client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"name": "service"}))
+                msg, _ = server.receive()
+                self.assertEqual(msg.message_content, {"name": "service"})
+                self.assertEqual(self.pool.idle_count, 1)
+            finally:
+                client.close()
+                server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
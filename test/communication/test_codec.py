@@ -0,0 +1,48 @@
+"""
+消息编解码器测试
+"""
+import unittest
+
+from communication.codec import BINARY_CODEC, JSON_CODEC, BinaryCodec, decode_message
+from communication.message import MessagePackage, MessageType
+
+
+class BinaryCodecTest(unittest.TestCase):
+
+    def round_trip(self, content):
+        msg = MessagePackage(MessageType.CONFIGURATION_CHANGE, content, "slave")
+        decoded = BINARY_CODEC.decode(BINARY_CODEC.encode(msg, "master"))
+        self.assertEqual(decoded.message_type, MessageType.CONFIGURATION_CHANGE)
+        self.assertEqual(decoded.receiver, "slave")
+        self.assertEqual(decoded.sender, "master")
+        return decoded.message_content
+
+    def test_versions_are_encoded_by_column(self):
+        content = {"versions": [{"name": f"模块{index}", "version": f"v{index}", "type": index % 2} for index in range(20)],
+                   "epoch": "e", "revision": 7, "since": None}
+        data = BINARY_CODEC.encode(MessagePackage(MessageType.CONFIGURATION_CHANGE, content), "master")
+        self.assertEqual(data[BinaryCodec.HEADER.size + len("master")], BinaryCodec.BODY_VERSIONS)
+        self.assertLess(len(data), len(JSON_CODEC.encode(MessagePackage(MessageType.CONFIGURATION_CHANGE, content), "master")))
+        self.assertEqual(self.round_trip(content), content)
+
+    def test_irregular_versions_fall_back_to_json(self):
+        for versions in ([{"name": "a", "version": "1", "type": 0, "extra": 1}],
+                         [{"name": "a\0b", "version": "1", "type": 0}],
+                         [{"name": "a", "version": None, "type": 0}],
+                         [{"name": "a", "version": "1", "type": 300}]):
+            content = {"versions": versions, "revision": 1}
+            self.assertEqual(self.round_trip(content), content)
+
+    def test_other_contents(self):
+        for content in (None, {}, {"versions": []}, {"modules": ["a", "b"]}, ["list"], "text"):
+            self.assertEqual(self.round_trip(content), content)
+
+    def test_unknown_version_is_rejected(self):
+        data = bytearray(BINARY_CODEC.encode(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"revision": 3}), "master"))
+        data[1] = BinaryCodec.VERSION + 1
+        with self.assertRaises(ValueError):
+            decode_message(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+连接表测试
+"""
+import threading
+import time
+import unittest
+
+from communication.connection_info import ConnectionRegistry
+
+
+class ConnectionRegistryTest(unittest.TestCase):
+
+    def test_expired_connection_is_removed(self):
+        registry = ConnectionRegistry(expire=0.05, tick=0.01)
+        registry.touch(("127.0.0.1", 1000))
+        self.assertEqual(registry.remove_expired(), [])
+        time.sleep(0.1)
+        expired = registry.remove_expired()
+        self.assertEqual([connection_info.socket_address for connection_info in expired], [("127.0.0.1", 1000)])
+        self.assertIsNone(registry.get(("127.0.0.1", 1000)))
+        self.assertEqual(registry.destinations(), [])
+
+    def test_touch_keeps_connection(self):
+        registry = ConnectionRegistry(expire=0.1, tick=0.01)
+        registry.touch(("127.0.0.1", 1000))
+        time.sleep(0.06)
+        registry.touch(("127.0.0.1", 1000))
+        time.sleep(0.06)
+        self.assertEqual(registry.remove_expired(), [])
+        self.assertIsNotNone(registry.get(("127.0.0.1", 1000)))
+
+    def test_touch_during_advance_is_not_evicted(self):
+        registry = ConnectionRegistry(expire=0.01, tick=0.01)
+        address = ("127.0.0.1", 1000)
+        registry.touch(address)
+        time.sleep(0.05)
+        timing_wheel = registry._ConnectionRegistry__timing_wheel
+        advance = timing_wheel.advance
+        heartbeat = threading.Thread(target=registry.touch, args=(address,))
+
+        def advance_with_heartbeat(now: float = None):
+            # 时间轮取出到期的键后，另一个线程收到同一连接的心跳
+            keys = advance(now)
+            heartbeat.start()
+            heartbeat.join(0.1)
+            return keys
+
+        timing_wheel.advance = advance_with_heartbeat
+        self.assertEqual(len(registry.remove_expired()), 1)
+        heartbeat.join()
+        # 心跳在移除之后生效，连接重新加入连接表
+        self.assertIsNotNone(registry.get(address))
+        self.assertEqual(registry.destinations(), [address])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+数据报分片与重组测试
+"""
+import os
+import random
+import time
+import unittest
+
+from communication.fragment import Fragmenter, FragmentReassembler
+
+ADDRESS = ("127.0.0.1", 1000)
+
+
+class FragmentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fragmenter = Fragmenter(64)
+        self.data = os.urandom(500)
+
+    def test_small_message_is_not_split(self):
+        self.assertEqual(self.fragmenter.split(b"data"), [b"data"])
+        self.assertFalse(Fragmenter.is_fragment(b"data"))
+
+    def test_in_order(self):
+        fragments = self.fragmenter.split(self.data)
+        self.assertGreater(len(fragments), 1)
+        self.assertTrue(all(len(fragment) <= 64 and Fragmenter.is_fragment(fragment) for fragment in fragments))
+        reassembler = FragmentReassembler()
+        results = [reassembler.add(fragment, ADDRESS) for fragment in fragments]
+        self.assertEqual(results[:-1], [None] * (len(fragments) - 1))
+        self.assertEqual(results[-1], self.data)
+        self.assertEqual(reassembler.pending_count, 0)
+        self.assertEqual(reassembler.pending_bytes, 0)
+
+    def test_out_of_order_and_duplicates(self):
+        fragments = self.fragmenter.split(self.data)
+        shuffled = fragments[1:] + fragments[:1]
+        random.Random(1).shuffle(shuffled)
+        reassembler = FragmentReassembler()
+        # 重复的分片不计入已收到的数量
+        self.assertIsNone(reassembler.add(shuffled[0], ADDRESS))
+        self.assertIsNone(reassembler.add(shuffled[0], ADDRESS))
+        results = [reassembler.add(fragment, ADDRESS) for fragment in shuffled[1:]]
+        self.assertEqual([result for result in results if result is not None], [self.data])
+        self.assertIsNotNone(results[-1])
+
+    def test_missing_fragment_never_completes(self):
+        fragments = self.fragmenter.split(self.data)
+        reassembler = FragmentReassembler()
+        for fragment in fragments[:-2] + fragments[-1:]:
+            self.assertIsNone(reassembler.add(fragment, ADDRESS))
+        self.assertEqual(reassembler.pending_count, 1)
+        self.assertGreater(reassembler.pending_bytes, 0)
+        # 缺失的分片补齐后完成重组
+        self.assertEqual(reassembler.add(fragments[-2], ADDRESS), self.data)
+
+    def test_same_message_id_from_different_addresses(self):
+        fragments = self.fragmenter.split(self.data)
+        reassembler = FragmentReassembler()
+        for fragment in fragments[:-1]:
+            self.assertIsNone(reassembler.add(fragment, ADDRESS))
+        self.assertIsNone(reassembler.add(fragments[-1], ("127.0.0.1", 1001)))
+        self.assertEqual(reassembler.pending_count, 2)
+        self.assertEqual(reassembler.add(fragments[-1], ADDRESS), self.data)
+
+    def test_incomplete_message_expires(self):
+        fragments = self.fragmenter.split(self.data)
+        reassembler = FragmentReassembler(timeout=0.01)
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(reassembler.add(fragments[0], ADDRESS))
+            time.sleep(0.05)
+            # 超时的消息被淘汰，之后到达的分片直接忽略
+            for fragment in fragments[1:]:
+                self.assertIsNone(reassembler.add(fragment, ADDRESS))
+        self.assertEqual(reassembler.pending_count, 0)
+        self.assertEqual(reassembler.pending_bytes, 0)
+
+    def test_oldest_message_is_evicted(self):
+        messages = [self.fragmenter.split(os.urandom(200)) for _ in range(3)]
+        reassembler = FragmentReassembler(max_pending=2)
+        with self.assertLogs(level="WARNING"):
+            for fragments in messages:
+                reassembler.add(fragments[0], ADDRESS)
+        self.assertEqual(reassembler.pending_count, 2)
+        for fragment in messages[0][1:]:
+            self.assertIsNone(reassembler.add(fragment, ADDRESS))
+        results = [reassembler.add(fragment, ADDRESS) for fragment in messages[2][1:]]
+        self.assertIsNotNone(results[-1])
+
+    def test_memory_limit(self):
+        fragments = self.fragmenter.split(self.data)
+        reassembler = FragmentReassembler(max_bytes=100)
+        with self.assertLogs(level="WARNING"):
+            results = [reassembler.add(fragment, ADDRESS) for fragment in fragments]
+        self.assertEqual(results, [None] * len(fragments))
+        self.assertLessEqual(reassembler.pending_bytes, 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+握手重试退避与合并回复测试
+"""
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from communication.message import MessagePackage, MessageType
+from communication.multicast_connection import MulticastClient, MulticastServer
+from communication.nodes import MasterNode, SlaveNode
+from communication.udp_connection import UdpServer
+from settings.repository import LocalNodeClientRepository, LocalSettingRepository
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class HandshakeBackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.multicast_client = MulticastClient("224.0.0.1", free_port())
+        self.udp_server = UdpServer("127.0.0.1", free_port())
+        self.node = SlaveNode(self.multicast_client, self.udp_server, None, handshake_interval=1, handshake_max_interval=8,
+                              master_timeout=60, setting_repository=LocalSettingRepository(store_dir_path=self.__store_dir.name),
+                              snapshot_path=f"{self.__store_dir.name}/config.snapshot", cache_path=f"{self.__store_dir.name}/cache.json")
+
+    def tearDown(self):
+        self.multicast_client.close()
+        self.udp_server.close()
+        self.__store_dir.cleanup()
+
+    def handshake_response(self, content: dict):
+        with mock.patch("communication.nodes.save_slave_node_config_master_address"):
+            self.node._handle_multicast_message(MessagePackage(MessageType.HANDSHAKE_RESPONSE, content, sender="master"), ("127.0.0.2", 20001))
+
+    def test_backoff_grows_within_interval_and_max(self):
+        with mock.patch("communication.nodes.random.uniform", side_effect=lambda low, high: (low, high)):
+            bounds = [self.node._handshake_or_heartbeat() for _ in range(6)]
+        self.assertEqual(bounds, [(1, 1), (1, 2), (2, 4), (4, 8), (4, 8), (4, 8)])
+        for _ in range(50):
+            self.assertTrue(1 <= self.node._handshake_or_heartbeat() <= 8)
+
+    def test_backoff_resets_on_accept(self):
+        for _ in range(5):
+            self.node._handshake_or_heartbeat()
+        self.handshake_response({"accepted": [[self.multicast_client.name, "json"]]})
+        self.assertEqual(self.node._SlaveNode__master_node_address, ("127.0.0.2", 20001))
+        self.assertEqual(self.node._SlaveNode__handshake_attempts, 0)
+        # 主节点超时后重新握手，从初始间隔开始
+        self.node._SlaveNode__master_seen_ts = time.monotonic() - 120
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(self.node._handshake_or_heartbeat(), 1)
+
+    def test_aggregated_response_without_self_is_ignored(self):
+        self.node._handshake_or_heartbeat()
+        self.node._handshake_or_heartbeat()
+        self.handshake_response({"accepted": [["other-slave", "json"]]})
+        self.assertIsNone(self.node._SlaveNode__master_node_address)
+        self.assertEqual(self.node._SlaveNode__handshake_attempts, 2)
+        self.handshake_response({"accepted": [["other-slave", "json"], [self.multicast_client.name, "binary"]]})
+        self.assertEqual(self.node._SlaveNode__master_node_address, ("127.0.0.2", 20001))
+        self.assertEqual(self.multicast_client.get_peer_codec(("127.0.0.2", 20001)).name, "binary")
+
+
+class HandshakeCoalescingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.node_client_repository = LocalNodeClientRepository(store_dir_path=self.__store_dir.name)
+        self.node_client_repository.save_node("127.0.0.0/8")
+        self.multicast_server = MulticastServer("224.0.0.1", free_port())
+        self.udp_server = UdpServer("0.0.0.0", free_port())
+        self.responses = []
+        patcher = mock.patch.object(self.multicast_server, "send_all", side_effect=self.record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.multicast_server.close()
+        self.udp_server.close()
+        self.__store_dir.cleanup()
+
+    def record(self, msg, destinations, **kwargs):
+        if msg.message_type == MessageType.HANDSHAKE_RESPONSE:
+            self.responses.append((msg.message_content["accepted"], list(destinations)))
+
+    def create_node(self, **kwargs) -> MasterNode:
+        return MasterNode(self.multicast_server, self.udp_server, self.node_client_repository,
+                          LocalSettingRepository(store_dir_path=self.__store_dir.name), tcp_server=None, **kwargs)
+
+    def handshake(self, node: MasterNode, index: int):
+        node._handle_multicast_message(MessagePackage(MessageType.HANDSHAKE_REQUEST, {"codecs": ["json"]}, sender=f"slave{index}"),
+                                       (f"127.0.0.{index}", 20001))
+
+    def test_flush_at_batch_size(self):
+        node = self.create_node(handshake_window=60, handshake_batch_size=3)
+        for index in range(2, 7):
+            self.handshake(node, index)
+        self.assertEqual(self.responses, [([["slave2", "json"], ["slave3", "json"], ["slave4", "json"]],
+                                           [("127.0.0.2", 20001), ("127.0.0.3", 20001), ("127.0.0.4", 20001)])])
+        self.assertEqual(len(node._MasterNode__pending_handshakes), 2)
+
+    def test_flush_when_window_expires(self):
+        node = self.create_node(handshake_window=0.2, handshake_batch_size=32)
+        self.handshake(node, 2)
+        self.handshake(node, 3)
+        self.assertEqual(self.responses, [])
+        deadline = time.monotonic() + 5
+        while not self.responses and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.responses, [([["slave2", "json"], ["slave3", "json"]], [("127.0.0.2", 20001), ("127.0.0.3", 20001)])])
+        # 下一个窗口重新计时
+        self.handshake(node, 4)
+        time.sleep(0.5)
+        self.assertEqual(self.responses[1:], [([["slave4", "json"]], [("127.0.0.4", 20001)])])
+
+    def test_zero_window_replies_immediately(self):
+        node = self.create_node(handshake_window=0)
+        self.handshake(node, 2)
+        self.assertEqual(self.responses, [([["slave2", "json"]], [("127.0.0.2", 20001)])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+一致性哈希环测试
+"""
+import collections
+import unittest
+
+from communication.hash_ring import HashRing
+
+KEYS = [f"10.10.{i // 256}.{i % 256}" for i in range(2000)]
+
+
+class HashRingTest(unittest.TestCase):
+
+    def test_empty_ring(self):
+        self.assertIsNone(HashRing().owner("10.10.0.1"))
+
+    def test_owner_is_stable(self):
+        ring = HashRing(["m1", "m2", "m3"])
+        other = HashRing(["m3", "m1", "m2"])
+        self.assertEqual([ring.owner(key) for key in KEYS], [other.owner(key) for key in KEYS])
+
+    def test_balanced(self):
+        counts = collections.Counter(HashRing(["m1", "m2", "m3"]).owner(key) for key in KEYS)
+        self.assertEqual(set(counts), {"m1", "m2", "m3"})
+        self.assertGreater(min(counts.values()), len(KEYS) / 3 * 0.6)
+
+    def test_only_removed_member_keys_move(self):
+        ring = HashRing(["m1", "m2", "m3"])
+        before = {key: ring.owner(key) for key in KEYS}
+        self.assertTrue(ring.remove("m2"))
+        self.assertFalse(ring.remove("m2"))
+        for key, owner in before.items():
+            if owner != "m2":
+                self.assertEqual(ring.owner(key), owner)
+            else:
+                self.assertIn(ring.owner(key), ("m1", "m3"))
+
+    def test_added_member_takes_keys_only(self):
+        ring = HashRing(["m1", "m2"])
+        before = {key: ring.owner(key) for key in KEYS}
+        self.assertTrue(ring.add("m3"))
+        self.assertFalse(ring.add("m3"))
+        self.assertEqual(ring.members, frozenset(["m1", "m2", "m3"]))
+        moved = [key for key in KEYS if ring.owner(key) != before[key]]
+        self.assertTrue(moved)
+        self.assertTrue(all(ring.owner(key) == "m3" for key in moved))
+
+
+if __name__ == "__main__":
+    unittest.main()
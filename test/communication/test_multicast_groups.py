@@ -0,0 +1,125 @@
+"""
+模块组播组测试
+"""
+import socket
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from communication.message import MessagePackage, MessageType
+from communication.multicast_connection import MulticastClient, MulticastServer
+from communication.multicast_groups import GroupPlan
+from communication.nodes import SlaveNode
+from communication.udp_connection import UdpServer
+from settings.repository import LocalSettingRepository
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class GroupPlanTest(unittest.TestCase):
+
+    def test_group_of_uses_crc32(self):
+        plan = GroupPlan("239.1.0.0", 20004, 8)
+        for module_name in ["order", "user", "payment", "模块"]:
+            self.assertEqual(plan.group_of(module_name), zlib.crc32(module_name.encode("utf-8")) % 8)
+        # 各进程一致
+        self.assertEqual([plan.group_of(module_name) for module_name in ["order", "user", "payment"]], [0, 1, 5])
+        self.assertEqual(plan.groups_of(["order", "stock", "user"]), {0, 1})
+        self.assertEqual(plan.groups_of(None), set(range(8)))
+        self.assertEqual(plan.groups_of([]), set())
+
+    def test_address_layout(self):
+        plan = GroupPlan("239.1.0.254", 20004, 4)
+        self.assertEqual([plan.address_of(group) for group in range(4)], ["239.1.0.254", "239.1.0.255", "239.1.1.0", "239.1.1.1"])
+        self.assertEqual(GroupPlan.from_dict(plan.to_dict()), plan)
+        self.assertEqual(GroupPlan.from_dict({"address": "239.1.0.254", "port": 20004}).count, 16)
+        self.assertNotEqual(GroupPlan("239.1.0.254", 20005, 4), plan)
+
+    def test_invalid_plan(self):
+        with self.assertRaises(ValueError):
+            GroupPlan("10.0.0.1", 20004, 4)
+        with self.assertRaises(ValueError):
+            GroupPlan("239.255.255.254", 20004, 4)
+        with self.assertRaises(ValueError):
+            GroupPlan("239.1.0.0", 20004, 0)
+
+
+class SlaveGroupPartsTest(unittest.TestCase):
+    """
+    从节点收齐已加入的组的部分后推进修订号
+    """
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.plan = GroupPlan("239.1.0.0", free_port(), 8)
+        self.multicast_client = MulticastClient("224.0.0.1", free_port())
+        self.udp_server = UdpServer("127.0.0.1", free_port())
+        self.group_listener = MulticastServer(port=self.plan.port)
+        self.master_address = ("127.0.0.2", 20001)
+        self.node = SlaveNode(self.multicast_client, self.udp_server, None, modules=["order", "stock", "user"],
+                              group_listener=self.group_listener,
+                              setting_repository=LocalSettingRepository(store_dir_path=self.__store_dir.name),
+                              snapshot_path=f"{self.__store_dir.name}/config.snapshot", cache_path=f"{self.__store_dir.name}/cache.json")
+        with mock.patch("communication.nodes.save_slave_node_config_master_address"):
+            self.receive(MessageType.HANDSHAKE_RESPONSE, {"codec": "json", "groups": self.plan.to_dict()})
+            self.receive(MessageType.CONFIGURATION_BROADCAST, {"versions": [], "epoch": "epoch", "revision": 1})
+            self.wait_applied()
+
+    def tearDown(self):
+        self.multicast_client.close()
+        self.group_listener.close()
+        self.udp_server.close()
+        self.__store_dir.cleanup()
+
+    def receive(self, message_type: MessageType, content: dict):
+        self.node._handle_multicast_message(MessagePackage(message_type, content, sender="master"), self.master_address)
+
+    def receive_part(self, group: int, part: int, groups):
+        self.receive(MessageType.CONFIGURATION_CHANGE, {"versions": [], "epoch": "epoch", "revision": 2, "since": 1,
+                                                        "group": group, "part": part, "parts": dict(groups)[group], "groups": groups})
+
+    def wait_applied(self) -> int:
+        # 修订号在拉取线程中推进
+        self.node._SlaveNode__pull_executor.submit(lambda: None).result(5)
+        return self.node.applied_revision
+
+    def test_joins_groups_of_subscribed_modules(self):
+        self.assertEqual(self.group_listener.groups, {"239.1.0.0", "239.1.0.1"})
+        self.assertEqual(self.wait_applied(), 1)
+
+    def test_revision_advances_after_all_joined_groups(self):
+        groups = [[0, 2], [1, 1], [5, 3]]
+        self.receive_part(0, 0, groups)
+        self.receive_part(0, 0, groups)
+        self.assertEqual(self.wait_applied(), 1)
+        self.receive_part(1, 0, groups)
+        self.assertEqual(self.wait_applied(), 1)
+        # 未加入的组的部分不需要，也不处理
+        self.receive_part(5, 0, groups)
+        self.assertEqual(self.wait_applied(), 1)
+        self.receive_part(0, 1, groups)
+        self.assertEqual(self.wait_applied(), 2)
+
+    def test_single_joined_group_part(self):
+        self.receive_part(5, 0, [[1, 1], [5, 1]])
+        self.assertEqual(self.wait_applied(), 1)
+        self.receive_part(1, 0, [[1, 1], [5, 1]])
+        self.assertEqual(self.wait_applied(), 2)
+
+    def test_other_sender_is_ignored(self):
+        content = {"versions": [], "epoch": "epoch", "revision": 2, "since": 1, "group": 1, "part": 0, "parts": 1, "groups": [[1, 1]]}
+        self.node._handle_multicast_message(MessagePackage(MessageType.CONFIGURATION_CHANGE, content, sender="other"), ("127.0.0.3", 20001))
+        self.assertEqual(self.wait_applied(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+发送限速测试
+"""
+import time
+import unittest
+
+from communication.pacer import PRIORITY_CONTROL, Pacer, TokenBucket
+
+ADDRESS = ("127.0.0.1", 1000)
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_unlimited(self):
+        bucket = TokenBucket(None)
+        bucket.consume(1000, 0)
+        self.assertEqual(bucket.delay(1000, 0), 0)
+
+    def test_delay_until_refilled(self):
+        bucket = TokenBucket(10, 1)
+        now = time.monotonic()
+        self.assertEqual(bucket.delay(1, now), 0)
+        bucket.consume(1, now)
+        self.assertAlmostEqual(bucket.delay(1, now), 0.1)
+        self.assertAlmostEqual(bucket.delay(1, now + 0.05), 0.05)
+        self.assertEqual(bucket.delay(1, now + 0.1), 0)
+
+    def test_amount_above_capacity(self):
+        bucket = TokenBucket(100, 10)
+        now = time.monotonic()
+        # 超过桶容量的数量在桶满时即可发送，之后的发送相应推迟
+        self.assertEqual(bucket.delay(50, now), 0)
+        bucket.consume(50, now)
+        self.assertAlmostEqual(bucket.delay(1, now), 0.41)
+
+
+class PacerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.pacer = Pacer(lambda datagram, destination: self.sent.append(datagram), packets_per_second=20, burst_packets=1)
+
+    def test_control_before_bulk(self):
+        self.pacer.send(b"a", ADDRESS)
+        self.pacer.send(b"b", ADDRESS)
+        self.pacer.send(b"c", ADDRESS, PRIORITY_CONTROL)
+        self.assertEqual(self.sent, [b"a"])
+        self.assertEqual(self.pacer.queue_depth, 2)
+        self.assertGreater(self.pacer.flush(), 0)
+        time.sleep(0.06)
+        self.pacer.flush()
+        self.assertEqual(self.sent, [b"a", b"c"])
+        time.sleep(0.06)
+        self.pacer.flush()
+        self.assertEqual(self.sent, [b"a", b"c", b"b"])
+        self.assertEqual(self.pacer.statistics, {"sent": 3, "queued": 2, "dropped": 0, "queue_depth": 0})
+
+    def test_bulk_waits_behind_queue(self):
+        self.pacer.send(b"a", ADDRESS)
+        self.pacer.send(b"b", ADDRESS)
+        time.sleep(0.06)
+        # 有数据排队时新的数据排在其后
+        self.pacer.send(b"c", ADDRESS)
+        self.assertEqual(self.sent, [b"a"])
+        self.pacer.flush()
+        self.assertEqual(self.sent, [b"a", b"b"])
+
+    def test_full_queue_drops_oldest_bulk(self):
+        pacer = Pacer(lambda datagram, destination: self.sent.append(datagram), packets_per_second=1, burst_packets=1, max_queue=2)
+        with self.assertLogs(level="WARNING"):
+            for datagram in (b"a", b"b", b"c", b"d"):
+                pacer.send(datagram, ADDRESS)
+            pacer.send(b"e", ADDRESS, PRIORITY_CONTROL)
+        self.assertEqual(pacer.dropped, 2)
+        self.assertEqual(pacer.queue_depth, 2)
+        self.assertEqual(self.sent, [b"a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
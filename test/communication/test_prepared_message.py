@@ -0,0 +1,71 @@
+"""
+预编码消息与批量发送测试
+"""
+import unittest
+from unittest import mock
+
+from communication.codec import BINARY_CODEC, JSON_CODEC, PreparedMessage, decode_message
+from communication.fragment import Fragmenter
+from communication.message import MessagePackage, MessageType
+from communication.udp_connection import UdpClient
+
+
+class RecordingClient(UdpClient):
+    """
+    记录发出的数据报，发送到指定地址时失败
+    """
+
+    def __init__(self, failing, **kwargs):
+        self.sent = []
+        self.failing = failing
+        super().__init__("127.0.0.1", 1, **kwargs)
+
+    def _sendto(self, datagram, destination):
+        if destination == self.failing:
+            raise OSError("unreachable")
+        self.sent.append((datagram, destination))
+
+
+class PreparedMessageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.msg = MessagePackage(MessageType.CONFIGURATION_CHANGE, {"modules": [f"module{index}" for index in range(50)]})
+
+    def test_encoded_once_per_key(self):
+        prepared = PreparedMessage(self.msg)
+        fragmenter = Fragmenter(1400)
+        with mock.patch.object(BINARY_CODEC, "encode", side_effect=BINARY_CODEC.encode) as encode:
+            first = prepared.get_datagrams(BINARY_CODEC, "master", fragmenter)
+            self.assertIs(prepared.get_datagrams(BINARY_CODEC, "master", fragmenter), first)
+            self.assertEqual(encode.call_count, 1)
+            prepared.get_datagrams(BINARY_CODEC, "other", fragmenter)
+            prepared.get_datagrams(BINARY_CODEC, "master", Fragmenter(200))
+            self.assertEqual(encode.call_count, 3)
+        self.assertIsNot(prepared.get_datagrams(JSON_CODEC, "master", fragmenter), first)
+        self.assertEqual(decode_message(first[0]).message_content, self.msg.message_content)
+
+    def test_send_all_encodes_once(self):
+        client = RecordingClient(None, codec="binary", name="master")
+        destinations = [("127.0.0.1", 10000 + index) for index in range(20)]
+        try:
+            with mock.patch.object(BINARY_CODEC, "encode", side_effect=BINARY_CODEC.encode) as encode:
+                client.send_all(self.msg, destinations)
+            self.assertEqual(encode.call_count, 1)
+            self.assertEqual([destination for _, destination in client.sent], destinations)
+            self.assertEqual(len({datagram for datagram, _ in client.sent}), 1)
+        finally:
+            client.close()
+
+    def test_failing_destination_does_not_stop_others(self):
+        destinations = [("127.0.0.1", 10000 + index) for index in range(5)]
+        client = RecordingClient(destinations[2], codec="binary")
+        try:
+            with self.assertLogs(level="WARNING"):
+                client.send_all(self.msg, destinations)
+            self.assertEqual([destination for _, destination in client.sent], destinations[:2] + destinations[3:])
+        finally:
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
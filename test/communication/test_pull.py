@@ -0,0 +1,159 @@
+"""
+从节点分批并行拉取配置与按模块通知服务节点测试
+"""
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from communication.message import MessagePackage, MessageType
+from communication.multicast_connection import MulticastClient
+from communication.nodes import SlaveNode
+from communication.udp_connection import UdpServer
+from settings.repository import LocalSettingRepository
+from settings.setting import SettingSection, SettingVersion, SettingVersionType
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class MasterPool:
+    """
+    按主节点的配置回复拉取请求的连接池，请求包含指定模块时失败
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.requests = []
+        self.failing = set()
+        self.lock = threading.Lock()
+
+    def publish(self, **versions):
+        for module_name, version in versions.items():
+            self.sections[module_name] = SettingSection(f"{module_name}-section", {}, module_name, version)
+
+    def request(self, address, message_package):
+        module_names = message_package.message_content["modules"]
+        with self.lock:
+            self.requests.append((address, module_names))
+        if self.failing.intersection(module_names):
+            raise OSError("connection refused")
+        return MessagePackage(MessageType.CONFIGURATION_RESPONSE,
+                              {"sections": [self.sections[module_name].to_dict() for module_name in module_names]})
+
+    def requested(self):
+        return sorted(module_name for _, module_names in self.requests for module_name in module_names)
+
+    def close(self):
+        pass
+
+
+class PullTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.pool = MasterPool()
+        self.multicast_client = MulticastClient("224.0.0.1", free_port())
+        self.udp_server = UdpServer("127.0.0.1", free_port())
+        self.setting_repository = LocalSettingRepository(store_dir_path=self.__store_dir.name)
+        self.master_address = ("127.0.0.2", 20001)
+        self.node = SlaveNode(self.multicast_client, self.udp_server, None, tcp_pool=self.pool, pull_batch_size=2, pull_concurrency=2,
+                              setting_repository=self.setting_repository,
+                              snapshot_path=f"{self.__store_dir.name}/config.snapshot", cache_path=f"{self.__store_dir.name}/cache.json")
+        self.notified = []
+        patcher = mock.patch.object(self.udp_server, "send_all", side_effect=self.record)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with mock.patch("communication.nodes.save_slave_node_config_master_address"):
+            self.node._handle_multicast_message(MessagePackage(MessageType.HANDSHAKE_RESPONSE, {"codec": "json", "config_port": 20003},
+                                                               sender="master"), self.master_address)
+
+    def tearDown(self):
+        self.multicast_client.close()
+        self.udp_server.close()
+        self.__store_dir.cleanup()
+
+    def record(self, msg, destinations, **kwargs):
+        self.notified.append((sorted(msg.message_content["modules"]), sorted(destinations)))
+
+    def broadcast(self, revision: int):
+        versions = [SettingVersion(module_name, setting_section.version, SettingVersionType.SECTION).to_dict()
+                    for module_name, setting_section in self.pool.sections.items()]
+        self.node._handle_multicast_message(MessagePackage(MessageType.CONFIGURATION_BROADCAST,
+                                                           {"versions": versions, "epoch": "epoch", "revision": revision},
+                                                           sender="master"), self.master_address)
+        # 拉取与修订号推进在拉取线程中执行
+        self.node._SlaveNode__pull_executor.submit(lambda: None).result(5)
+
+    def stored(self):
+        return {setting_section.module_name: setting_section.version for setting_section in self.setting_repository.get_all()}
+
+    def test_only_changed_modules_are_pulled_in_batches(self):
+        self.pool.publish(m0="1", m1="1", m2="1", m3="1", m4="1")
+        self.broadcast(1)
+        self.assertEqual(self.pool.requested(), ["m0", "m1", "m2", "m3", "m4"])
+        self.assertEqual(sorted(len(module_names) for _, module_names in self.pool.requests), [1, 2, 2])
+        self.assertTrue(all(address == ("127.0.0.2", 20003) for address, _ in self.pool.requests))
+        self.assertEqual(self.node.applied_revision, 1)
+        self.pool.requests.clear()
+        self.pool.publish(m1="2", m3="2")
+        self.broadcast(2)
+        self.assertEqual(self.pool.requested(), ["m1", "m3"])
+        self.assertEqual(self.stored(), {"m0": "1", "m1": "2", "m2": "1", "m3": "2", "m4": "1"})
+        self.assertEqual(self.node.applied_revision, 2)
+        self.pool.requests.clear()
+        # 版本一致时不拉取，只推进修订号
+        self.broadcast(3)
+        self.assertEqual(self.pool.requests, [])
+        self.assertEqual(self.node.applied_revision, 3)
+
+    def test_failed_batch_keeps_revision(self):
+        self.pool.publish(m0="1", m1="1", m2="1", m3="1", m4="1")
+        self.pool.failing = {"m2"}
+        with self.assertLogs(level="WARNING"):
+            self.broadcast(1)
+        # 拉取成功的批次照常保存，修订号不推进
+        self.assertEqual(self.stored(), {"m0": "1", "m1": "1", "m4": "1"})
+        self.assertEqual(self.node.applied_revision, 0)
+        self.pool.failing = set()
+        self.pool.requests.clear()
+        self.broadcast(1)
+        self.assertEqual(self.pool.requested(), ["m2", "m3"])
+        self.assertEqual(self.stored(), {"m0": "1", "m1": "1", "m2": "1", "m3": "1", "m4": "1"})
+        self.assertEqual(self.node.applied_revision, 1)
+
+    def test_services_are_notified_for_declared_modules(self):
+        services = {"order": ("127.0.0.1", 30001), "user": ("127.0.0.1", 30002), "all": ("127.0.0.1", 30003)}
+        for name, modules in {"order": ["m0"], "user": ["m1", "m3"], "all": None}.items():
+            self.node._handle_local_message(MessagePackage(MessageType.HANDSHAKE_REQUEST, {"name": name, "modules": modules}), services[name])
+        self.pool.publish(m0="1", m1="1", m3="1", m4="1")
+        self.broadcast(1)
+        self.assertEqual(self.notified, [(["m0", "m1", "m3", "m4"], sorted(services.values()))])
+        self.notified.clear()
+        self.pool.publish(m1="2")
+        self.broadcast(2)
+        self.pool.publish(m0="2")
+        self.broadcast(3)
+        self.pool.publish(m4="2")
+        self.broadcast(4)
+        self.assertEqual(self.notified, [(["m1"], sorted([services["user"], services["all"]])),
+                                         (["m0"], sorted([services["order"], services["all"]])),
+                                         (["m4"], [services["all"]])])
+        # 服务节点关闭后不再通知
+        self.node._handle_local_message(MessagePackage(MessageType.CONNECTION_CLOSE, {"name": "all"}), services["all"])
+        self.notified.clear()
+        self.pool.publish(m3="2")
+        self.broadcast(5)
+        self.assertEqual(self.notified, [(["m3"], [services["user"]])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+单线程反应器测试
+"""
+import socket
+import threading
+import time
+import unittest
+
+from communication.message import MessagePackage, MessageType
+from communication.reactor import Reactor
+from communication.udp_connection import UdpClient, UdpServer
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class ReactorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = Reactor()
+        self.thread = None
+
+    def tearDown(self):
+        self.reactor.stop()
+        if self.thread:
+            self.thread.join(5)
+
+    def run_reactor(self):
+        self.thread = threading.Thread(target=self.reactor.run)
+        self.thread.start()
+
+    def test_timer_order(self):
+        calls = []
+        self.reactor.call_later(0.03, lambda: calls.append("late"))
+        self.reactor.call_later(0.01, lambda: calls.append("first"))
+        self.reactor.call_later(0.01, lambda: calls.append("second"))
+        self.reactor.call_later(0, lambda: calls.append("now"))
+        self.reactor.call_later(0.05, self.reactor.stop)
+        self.reactor.run()
+        self.assertEqual(calls, ["now", "first", "second", "late"])
+
+    def test_repeat_uses_returned_delay(self):
+        ticks = []
+
+        def tick():
+            ticks.append(time.monotonic())
+            if len(ticks) == 3:
+                # 任务异常被记录，不会传出反应器
+                self.reactor.stop()
+                raise ValueError("tick")
+            return 0.02
+
+        with self.assertLogs(level="WARNING"):
+            self.reactor.repeat(tick)
+            self.reactor.run()
+        self.assertEqual(len(ticks), 3)
+        self.assertGreaterEqual(ticks[1] - ticks[0], 0.015)
+
+    def test_timers_are_cancelled_on_stop(self):
+        calls = []
+        self.reactor.call_later(0.05, lambda: calls.append("cancelled"))
+        self.reactor.repeat(lambda: calls.append("tick") or 0.01)
+        self.reactor.call_later(0.02, self.reactor.stop)
+        self.reactor.run()
+        ticks = len(calls)
+        time.sleep(0.1)
+        self.assertNotIn("cancelled", calls)
+        self.assertEqual(len(calls), ticks)
+        self.assertEqual(self.reactor._Reactor__timers, [])
+        self.assertFalse(self.reactor.running)
+
+    def test_handler_dispatch(self):
+        port = free_port()
+        server = UdpServer("127.0.0.1", port)
+        other = UdpServer("127.0.0.1", free_port())
+        client = UdpClient("127.0.0.1", port, max_datagram_size=200)
+        received = []
+        done = threading.Event()
+
+        def handle(msg, address):
+            received.append(msg.message_content)
+            if len(received) == 1:
+                raise ValueError("handler")
+            if len(received) == 3:
+                done.set()
+
+        self.reactor.register(server, handle)
+        self.reactor.register(other, lambda msg, address: self.fail("wrong handler"))
+        self.run_reactor()
+        try:
+            with self.assertLogs(level="WARNING"):
+                client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"index": 0}))
+                # 处理函数异常不影响后续消息，分片消息重组后交给处理函数一次
+                client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"index": 1}))
+                client.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, {"modules": [f"module{index}" for index in range(100)]}))
+                self.assertTrue(done.wait(5))
+            self.assertEqual(received[:2], [{"index": 0}, {"index": 1}])
+            self.assertEqual(len(received[2]["modules"]), 100)
+        finally:
+            self.reactor.stop()
+            self.thread.join(5)
+            client.close()
+            server.close()
+            other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
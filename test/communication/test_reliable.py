@@ -0,0 +1,93 @@
+"""
+可靠UDP测试
+"""
+import unittest
+
+from communication.reliable import ReliableChannel
+
+
+class ReliableChannelTest(unittest.TestCase):
+    """
+    两端的可靠通道直接交换数据报（不经过套接字），按需丢弃数据报
+    """
+
+    def setUp(self):
+        self.sender_outbox = []
+        self.receiver_outbox = []
+        self.sender = ReliableChannel(lambda data, address: self.sender_outbox.append(data))
+        self.receiver = ReliableChannel(lambda data, address: self.receiver_outbox.append(data))
+        self.delivered = []
+
+    def deliver(self, drop_data: bool = False):
+        """
+        把发送端的数据交给接收端，再把接收端的确认交给发送端
+        :param drop_data: 是否丢弃发送端的数据
+        :return:
+        """
+        outbox, self.sender_outbox = self.sender_outbox, []
+        if not drop_data:
+            for data in outbox:
+                datagram = self.receiver.receive(data, "sender")
+                if datagram is not None:
+                    self.delivered.append(bytes(datagram))
+        acks, self.receiver_outbox = self.receiver_outbox, []
+        for ack in acks:
+            self.assertIsNone(self.sender.receive(ack, "receiver"))
+
+    def test_sequential_sends_after_ack(self):
+        for index in range(5):
+            self.sender.send(f"msg{index}".encode(), "receiver")
+            self.deliver()
+            self.assertEqual(self.sender.unacked_count("receiver"), 0)
+        self.assertEqual(self.delivered, [f"msg{index}".encode() for index in range(5)])
+
+    def test_sends_after_idle_retransmit_cleanup(self):
+        self.sender.send(b"first", "receiver")
+        self.deliver()
+        # 空闲时的重传检查同样清理发送方状态
+        self.sender.retransmit()
+        self.sender.send(b"second", "receiver")
+        self.deliver()
+        self.assertEqual(self.delivered, [b"first", b"second"])
+
+    def test_duplicate_is_acked_not_delivered(self):
+        self.sender.send(b"once", "receiver")
+        packet = self.sender_outbox[0]
+        self.deliver()
+        self.assertIsNone(self.receiver.receive(packet, "sender"))
+        self.assertEqual(len(self.receiver_outbox), 1)
+        self.assertEqual(self.delivered, [b"once"])
+
+    def test_lost_data_is_retransmitted(self):
+        channel = ReliableChannel(lambda data, address: self.sender_outbox.append(data), min_rto=0)
+        self.sender = channel
+        self.sender.send(b"lost", "receiver")
+        self.deliver(drop_data=True)
+        self.sender.retransmit()
+        self.deliver()
+        self.assertEqual(self.delivered, [b"lost"])
+        self.assertEqual(self.sender.retransmitted, 1)
+
+    def test_abandoned_data_does_not_stall_receiver(self):
+        self.sender = ReliableChannel(lambda data, address: self.sender_outbox.append(data), min_rto=0, max_retries=2)
+        self.sender.send(b"lost", "receiver")
+        for _ in range(3):
+            self.deliver(drop_data=True)
+            self.sender.retransmit()
+        self.assertEqual(self.sender.dropped, 1)
+        self.assertEqual(self.sender.retransmitted, 2)
+        # 放弃之后的数据携带新的最小未确认序号，接收方越过缺口，超出选择确认位图的数据同样被确认，不再重传
+        for batch in range(7):
+            for index in range(batch * 30, (batch + 1) * 30):
+                self.sender.send(f"msg{index}".encode(), "receiver")
+            self.deliver()
+            self.assertEqual(self.sender.unacked_count("receiver"), 0)
+            self.sender.retransmit()
+            self.assertEqual(self.sender_outbox, [])
+        self.assertEqual(self.delivered, [f"msg{index}".encode() for index in range(210)])
+        self.assertEqual(self.sender.dropped, 1)
+        self.assertEqual(self.sender.retransmitted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
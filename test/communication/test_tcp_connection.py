@@ -0,0 +1,144 @@
+"""
+TCP连接测试
+"""
+import socket
+import threading
+import time
+import unittest
+
+from communication.message import MessagePackage, MessageType
+from communication.tcp_connection import FramedSocket, TcpClient, TcpServer
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的TCP端口
+    :return:
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class TcpClientTest(unittest.TestCase):
+
+    def test_failed_connect_closes_socket(self):
+        # 取得一个没有监听的端口
+        client = TcpClient("127.0.0.1", free_port())
+        with self.assertRaises(OSError):
+            client.connect(1)
+        self.assertEqual(client.raw_socket.fileno(), -1)
+        self.assertFalse(client.is_connected)
+        client.close()
+
+
+
+class TcpServerTest(unittest.TestCase):
+    """
+    持久连接由选择器等待，请求交给有界工作线程池处理
+    """
+
+    def setUp(self):
+        self.port = free_port()
+        self.server = None
+        self.clients = []
+        # 同时处理请求的工作线程数量
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        if self.server:
+            self.server.close()
+            self.thread.join(5)
+
+    def serve(self, **kwargs):
+        self.server = TcpServer("127.0.0.1", self.port, **kwargs)
+        self.thread = threading.Thread(target=self.server.serve, args=(self.handle,))
+        self.thread.start()
+        time.sleep(0.05)
+
+    def handle(self, connection_info) -> bool:
+        framed_socket = FramedSocket(connection_info.socket)
+        msg = framed_socket.receive()
+        if msg is None:
+            return False
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        framed_socket.send(MessagePackage(MessageType.CONFIGURATION_RESPONSE, msg.message_content))
+        return True
+
+    def connect(self) -> TcpClient:
+        client = TcpClient("127.0.0.1", self.port)
+        client.connect(5)
+        self.clients.append(client)
+        return client
+
+    def request(self, client: TcpClient, content):
+        return client.request(MessagePackage(MessageType.CONFIGURATION_REQUEST, content)).message_content
+
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_persistent_clients_share_small_pool(self):
+        self.serve(max_workers=2)
+        clients = [self.connect() for _ in range(40)]
+        results = {}
+        errors = []
+
+        def run(index, client):
+            try:
+                results[index] = [self.request(client, {"client": index, "request": request}) for request in range(3)]
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(index, client)) for index, client in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, {index: [{"client": index, "request": request} for request in range(3)] for index in range(40)})
+        self.assertLessEqual(self.max_active, 2)
+        self.assertEqual(self.server.connection_count, 40)
+
+    def test_max_connections(self):
+        with self.assertLogs(level="WARNING"):
+            self.serve(max_connections=2)
+            first, second = self.connect(), self.connect()
+            self.assertEqual(self.request(first, {"index": 1}), {"index": 1})
+            self.assertEqual(self.request(second, {"index": 2}), {"index": 2})
+            # 超出最大连接数的连接被直接关闭
+            rejected = self.connect()
+            with self.assertRaises((ConnectionError, OSError)):
+                self.request(rejected, {"index": 3})
+        self.assertEqual(self.server.connection_count, 2)
+        # 连接关闭后可以接受新的连接
+        first.close()
+        self.assertTrue(self.wait_for(lambda: self.server.connection_count == 1))
+        self.assertEqual(self.request(self.connect(), {"index": 4}), {"index": 4})
+
+    def test_idle_timeout(self):
+        self.serve(idle_timeout=0.2)
+        idle, active = self.connect(), self.connect()
+        self.assertEqual(self.request(idle, {"index": 1}), {"index": 1})
+        for index in range(6):
+            self.assertEqual(self.request(active, {"index": index}), {"index": index})
+            time.sleep(0.1)
+        # 空闲超时的连接被服务端关闭，活动的连接保留
+        self.assertEqual(idle.raw_socket.recv(1), b"")
+        self.assertEqual(self.server.connection_count, 1)
+        self.assertEqual(self.request(active, {"index": 7}), {"index": 7})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+时间轮测试
+"""
+import time
+import unittest
+
+from communication.timing_wheel import TimingWheel
+
+
+class TimingWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timing_wheel = TimingWheel(1.0, slots=8)
+        self.now = time.monotonic()
+
+    def test_expire_at_deadline(self):
+        self.timing_wheel.schedule("a", self.now + 3)
+        self.assertEqual(self.timing_wheel.advance(self.now + 1), [])
+        self.assertEqual(self.timing_wheel.advance(self.now + 4), ["a"])
+        self.assertEqual(len(self.timing_wheel), 0)
+
+    def test_reschedule_and_cancel(self):
+        self.timing_wheel.schedule("a", self.now + 2)
+        self.timing_wheel.schedule("b", self.now + 2)
+        self.timing_wheel.schedule("a", self.now + 6)
+        self.timing_wheel.cancel("b")
+        self.assertEqual(self.timing_wheel.advance(self.now + 4), [])
+        self.assertEqual(self.timing_wheel.advance(self.now + 7), ["a"])
+
+    def test_deadline_beyond_one_round(self):
+        # 截止时间超出一圈的键在第一次轮转到时保留
+        self.timing_wheel.schedule("a", self.now + 20)
+        self.assertEqual(self.timing_wheel.advance(self.now + 13), [])
+        self.assertEqual(self.timing_wheel.advance(self.now + 21), ["a"])
+
+    def test_long_pause(self):
+        self.timing_wheel.schedule("a", self.now + 2)
+        self.timing_wheel.schedule("b", self.now + 5)
+        self.assertEqual(sorted(self.timing_wheel.advance(self.now + 100)), ["a", "b"])
+
+    def test_past_deadline_expires_on_next_tick(self):
+        self.timing_wheel.advance(self.now + 5)
+        self.timing_wheel.schedule("a", self.now)
+        self.assertEqual(self.timing_wheel.advance(self.now + 5), [])
+        self.assertEqual(self.timing_wheel.advance(self.now + 6), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
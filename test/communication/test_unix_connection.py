@@ -0,0 +1,85 @@
+"""
+本机流传输测试
+"""
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from communication.codec import BINARY_CODEC
+from communication.message import MessagePackage, MessageType
+from communication.tcp_connection import FramedSocket
+from communication.unix_connection import UnixStreamServer, UnixStreamClient
+
+
+class UnixStreamServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "slave.sock")
+        self.server = UnixStreamServer(self.path)
+
+    def tearDown(self):
+        self.server.close()
+
+    def receive(self, attempts: int = 20):
+        """
+        接收一条完整的消息
+        :param attempts: 最多处理的就绪事件数量
+        :return: 消息，连接标识
+        """
+        for _ in range(attempts):
+            completed, msg, address = self.server.receive_datagram()
+            if completed:
+                return msg, address
+        self.fail("没有接收到完整的消息")
+
+    def test_partial_frame_does_not_block_other_peers(self):
+        slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        slow.connect(self.path)
+        fast = UnixStreamClient(self.path)
+        data = BINARY_CODEC.encode(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"name": "slow"}), "slow")
+        frame = FramedSocket.HEADER.pack(len(data)) + data
+        # 慢的服务节点只写入半帧
+        slow.sendall(frame[:len(frame) // 2])
+        fast.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"name": "fast"}))
+        msg, _ = self.receive()
+        self.assertEqual(msg.message_content, {"name": "fast"})
+        slow.sendall(frame[len(frame) // 2:])
+        msg, _ = self.receive()
+        self.assertEqual(msg.message_content, {"name": "slow"})
+        slow.close()
+        fast.close()
+
+    def test_several_frames_in_one_read(self):
+        client = UnixStreamClient(self.path)
+        for index in range(3):
+            client.send(MessagePackage(MessageType.HEARTBEAT_REQUEST, {"index": index}))
+        received = [self.receive()[0].message_content["index"] for _ in range(3)]
+        self.assertEqual(received, [0, 1, 2])
+        client.close()
+
+    def test_concurrent_sends_do_not_interleave(self):
+        client = UnixStreamClient(self.path)
+        client.send(MessagePackage(MessageType.HANDSHAKE_REQUEST, None))
+        _, peer_id = self.receive()
+        payload = "x" * 200000
+
+        def send(count: int):
+            for _ in range(count):
+                self.server.send(MessagePackage(MessageType.CONFIGURATION_CHANGE, {"payload": payload}), peer_id)
+
+        threads = [threading.Thread(target=send, args=(5,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(20):
+            completed, msg, _ = client.receive_datagram()
+            self.assertTrue(completed)
+            self.assertEqual(msg.message_content["payload"], payload)
+        for thread in threads:
+            thread.join()
+        client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
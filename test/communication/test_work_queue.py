@@ -0,0 +1,171 @@
+"""
+消息工作队列测试
+"""
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from communication.message import MessagePackage, MessageType
+from communication.multicast_connection import MulticastServer
+from communication.nodes import MasterNode
+from communication.udp_connection import UdpServer
+from communication.work_queue import POLICY_SHED, WorkQueue
+from settings.repository import LocalNodeClientRepository, LocalSettingRepository
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def message(message_type: MessageType, index: int) -> MessagePackage:
+    return MessagePackage(message_type, {"index": index})
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.lock = threading.Lock()
+        self.queue = None
+
+    def tearDown(self):
+        if self.queue:
+            self.queue.close()
+
+    def handle(self, msg, address):
+        with self.lock:
+            self.handled.append((msg.message_type, msg.message_content["index"], address, threading.current_thread().name))
+
+    def wait_handled(self, count: int):
+        deadline = time.monotonic() + 5
+        while len(self.handled) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.handled), count)
+
+    def test_messages_from_same_ip_are_handled_in_order(self):
+        self.queue = WorkQueue(self.handle, workers=4, name="test-worker")
+        self.queue.start()
+        ips = [f"10.0.0.{index}" for index in range(8)]
+        for index in range(50):
+            for ip in ips:
+                # 同一个IP的不同端口属于同一个分片
+                self.assertTrue(self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, index), (ip, 20000 + index % 3)))
+        self.wait_handled(50 * len(ips))
+        for ip in ips:
+            handled = [(index, thread) for _, index, address, thread in self.handled if address[0] == ip]
+            self.assertEqual([index for index, _ in handled], list(range(50)))
+            self.assertEqual(len({thread for _, thread in handled}), 1)
+        self.assertTrue(all(thread.startswith("test-worker-") for *_, thread in self.handled))
+
+    def test_drop_policy_rejects_new_message(self):
+        self.queue = WorkQueue(self.handle, workers=1, max_size=2)
+        address = ("10.0.0.1", 20000)
+        self.assertTrue(self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, 0), address))
+        self.assertTrue(self.queue.submit(message(MessageType.CONFIGURATION_REQUEST, 1), address))
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, 2), address))
+        # 丢弃日志每秒最多记录一次，丢弃数量仍然累计
+        self.assertFalse(self.queue.submit(message(MessageType.DIGEST_REQUEST, 3), address))
+        self.assertEqual(self.queue.queue_depth, 2)
+        self.queue.start()
+        self.wait_handled(2)
+        self.assertEqual([index for _, index, *_ in self.handled], [0, 1])
+        self.assertEqual(self.queue.statistics["dropped"], {"HEARTBEAT_REQUEST": 1, "DIGEST_REQUEST": 1})
+
+    def test_shed_policy_evicts_oldest_drop_message(self):
+        self.queue = WorkQueue(self.handle, workers=1, max_size=3)
+        address = ("10.0.0.1", 20000)
+        for index in range(3):
+            self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, index), address)
+        with self.assertLogs(level="WARNING"):
+            self.assertTrue(self.queue.submit(message(MessageType.HANDSHAKE_REQUEST, 3), address))
+        self.assertTrue(self.queue.submit(message(MessageType.MASTER_HEARTBEAT, 4), address))
+        self.assertTrue(self.queue.submit(message(MessageType.HANDSHAKE_REQUEST, 5), address))
+        # 没有可丢弃的drop类消息时丢弃新消息
+        self.assertFalse(self.queue.submit(message(MessageType.HANDSHAKE_REQUEST, 6), address))
+        self.assertEqual(self.queue.queue_depth, 3)
+        self.queue.start()
+        self.wait_handled(3)
+        self.assertEqual([index for _, index, *_ in self.handled], [3, 4, 5])
+        self.assertEqual(self.queue.statistics["dropped"], {"HEARTBEAT_REQUEST": 3, "HANDSHAKE_REQUEST": 1})
+
+    def test_shed_messages_are_handled_first(self):
+        self.queue = WorkQueue(self.handle, workers=1, policies={MessageType.CONFIGURATION_REQUEST: POLICY_SHED})
+        address = ("10.0.0.1", 20000)
+        self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, 0), address)
+        self.queue.submit(message(MessageType.CONFIGURATION_REQUEST, 1), address)
+        self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, 2), address)
+        self.queue.submit(message(MessageType.HANDSHAKE_REQUEST, 3), address)
+        self.queue.start()
+        self.wait_handled(4)
+        self.assertEqual([index for _, index, *_ in self.handled], [1, 3, 0, 2])
+
+    def test_statistics(self):
+        self.queue = WorkQueue(self.handle, workers=2, max_size=100)
+        self.assertEqual(self.queue.statistics["enqueued"], 0)
+        for index in range(10):
+            self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, index), (f"10.0.0.{index}", 20000))
+        self.assertEqual(self.queue.queue_depth, 10)
+        time.sleep(0.05)
+        self.queue.start()
+        self.wait_handled(10)
+        deadline = time.monotonic() + 5
+        while self.queue.statistics["handled"] < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        statistics = self.queue.statistics
+        self.assertEqual(statistics["enqueued"], 10)
+        self.assertEqual(statistics["handled"], 10)
+        self.assertEqual(statistics["queue_depth"], 0)
+        self.assertEqual(statistics["max_queue_depth"], 10)
+        self.assertEqual(statistics["dropped"], {})
+        self.assertGreaterEqual(statistics["wait_max_ms"], 50)
+        self.assertGreater(statistics["wait_avg_ms"], 0)
+
+    def test_handler_exception_does_not_stop_worker(self):
+        def handle(msg, address):
+            if msg.message_content["index"] == 0:
+                raise ValueError("handler")
+            self.handle(msg, address)
+
+        self.queue = WorkQueue(handle, workers=1)
+        self.queue.start()
+        with self.assertLogs(level="WARNING"):
+            self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, 0), ("10.0.0.1", 20000))
+            self.queue.submit(message(MessageType.HEARTBEAT_REQUEST, 1), ("10.0.0.1", 20000))
+            self.wait_handled(1)
+        self.assertEqual(self.handled[0][1], 1)
+
+
+class MasterNodeWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.multicast_server = MulticastServer("224.0.0.1", free_port())
+        self.udp_server = UdpServer("0.0.0.0", free_port())
+
+    def tearDown(self):
+        self.multicast_server.close()
+        self.udp_server.close()
+        self.__store_dir.cleanup()
+
+    def create_node(self, **kwargs) -> MasterNode:
+        return MasterNode(self.multicast_server, self.udp_server,
+                          LocalNodeClientRepository(store_dir_path=self.__store_dir.name),
+                          LocalSettingRepository(store_dir_path=self.__store_dir.name), tcp_server=None, **kwargs)
+
+    def test_inline_handling_by_default(self):
+        # 默认在接收线程中直接处理，各连接的对端状态只在一个线程中修改
+        self.assertIsNone(self.create_node().receive_statistics)
+        self.assertEqual(self.create_node(workers=2).receive_statistics["enqueued"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
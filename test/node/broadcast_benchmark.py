@@ -0,0 +1,79 @@
+import time
+import timeit
+import uuid
+from communication.codec import get_codec
+from communication.message import MessagePackage, MessageType, batch_contents
+from communication.udp_connection import UdpServer, UdpClient
+from settings.setting import SettingVersion, SettingVersionType
+
+module_count = 500
+slave_count = 50
+sink_address = "127.0.0.1"
+sink_port = 10003
+
+def send_per_module(connection: UdpClient, versions, destinations) -> int:
+    """
+    每个模块发送一个数据报（批量发送前的方式）
+    :return: 发送的数据报数量
+    """
+    packets = 0
+    for destination in destinations:
+        for version in versions:
+            connection.send(MessagePackage(MessageType.CONFIGURATION_BROADCAST, version), destination)
+            packets += 1
+    return packets
+
+def send_batched(connection: UdpClient, versions, destinations) -> int:
+    """
+    多个模块打包到一个数据报发送
+    :return: 发送的数据报数量
+    """
+    packets = 0
+    for destination in destinations:
+        for batch in batch_contents(versions, connection.max_datagram_size):
+            connection.send(MessagePackage(MessageType.CONFIGURATION_BROADCAST, {"versions": batch}), destination)
+            packets += 1
+    return packets
+
+def benchmark(codec: str):
+    """
+    比较逐个发送与批量发送的数据报数量与主节点CPU耗时
+    :param codec: 编解码器
+    :return:
+    """
+    # 接收端不读取数据，只用于承接发送的数据报
+    sink = UdpServer(sink_address, sink_port)
+    destinations = [(sink_address, sink_port)] * slave_count
+    connection = UdpClient(sink_address, sink_port, codec=codec)
+    versions = [SettingVersion(f"module_{i}", uuid.uuid4().hex, SettingVersionType.SECTION).to_dict() for i in range(module_count)]
+    for name, send in (("逐个发送", send_per_module), ("批量发送", send_batched)):
+        start = time.process_time()
+        packets = send(connection, versions, destinations)
+        elapsed = time.process_time() - start
+        print(f"[{codec}] {name}: {module_count}个模块 x {slave_count}个从节点，数据报{packets}个，CPU耗时{elapsed * 1000:.1f}ms")
+    connection.close()
+    sink.close()
+
+def benchmark_codec(codec: str, count: int = 20000):
+    """
+    比较一个数据报的配置版本批量消息的编码与解码耗时及大小
+    :param codec: 编解码器
+    :param count: 重复次数
+    :return:
+    """
+    message_codec = get_codec(codec)
+    versions = [SettingVersion(f"module_{i}", uuid.uuid4().hex, SettingVersionType.SECTION).to_dict() for i in range(module_count)]
+    batch = batch_contents(versions, 1400, 320)[0]
+    content = {"versions": batch, "epoch": uuid.uuid4().hex, "revision": 1234, "since": 1200, "part": 0, "parts": len(versions) // len(batch),
+               "digest": uuid.uuid4().hex, "config_port": sink_port}
+    msg = MessagePackage(MessageType.CONFIGURATION_BROADCAST, content)
+    data = message_codec.encode(msg, "master")
+    encode = min(timeit.repeat(lambda: message_codec.encode(msg, "master"), number=count, repeat=5)) / count
+    decode = min(timeit.repeat(lambda: message_codec.decode(data), number=count, repeat=5)) / count
+    print(f"[{codec}] {len(batch)}个配置版本：{len(data)}字节，编码{encode * 1e6:.1f}us，解码{decode * 1e6:.1f}us")
+
+if __name__ == "__main__":
+    benchmark("json")
+    benchmark("binary")
+    benchmark_codec("json")
+    benchmark_codec("binary")
@@ -3,7 +3,8 @@ import uuid
 from threading import Thread
 from communication.multicast_connection import MulticastServer, MulticastClient
 from communication.nodes import MasterNode, SlaveNode, ServiceNode
-from communication.udp_connection import UdpServer, UdpClient
+from communication.udp_connection import UdpServer
+from communication.unix_connection import create_local_server, create_local_client
 from node_config import get_service_node_config, get_slave_node_config, get_master_node_config
 from settings.repository import LocalNodeClientRepository, LocalSettingRepository
 from settings.setting import SettingSection
@@ -23,7 +24,8 @@ def __start_master_node(local_node_client_repository, local_setting_repository):
     master_node_config = get_master_node_config("config.json")
     master_node = MasterNode(MulticastServer(master_node_config.discovery.ip, master_node_config.discovery.port),
                              UdpServer(master_node_config.config.ip, master_node_config.config.port),
-                             local_node_client_repository, local_setting_repository)
+                             local_node_client_repository, local_setting_repository,
+                             pull_address=master_node_config.pull.ip, pull_port=master_node_config.pull.port)
     master_node.start()
 
 def __start_slave_node():
@@ -33,7 +35,7 @@ def __start_slave_node():
     """
     slave_node_config = get_slave_node_config("config.json")
     master_address = (slave_node_config.master.ip, slave_node_config.master.port) if slave_node_config.master.ip else None
-    udp_server = UdpServer(slave_node_config.config.ip, slave_node_config.config.port)
+    udp_server = create_local_server(slave_node_config.config.ip, slave_node_config.config.port, slave_node_config.config.transport)
     slave_node = SlaveNode(MulticastClient(slave_node_config.register.ip, slave_node_config.register.port), udp_server, master_address)
     slave_node.start()
 
@@ -43,7 +45,7 @@ def __start_service_node():
     :return:
     """
     service_node_config = get_service_node_config("config.json")
-    udp_client = UdpClient(service_node_config.slave.ip, service_node_config.slave.port)
+    udp_client = create_local_client(service_node_config.slave.ip, service_node_config.slave.port, service_node_config.slave.transport)
     service_node = ServiceNode(udp_client, name="Magic")
     service_node.start()
 
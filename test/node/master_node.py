@@ -25,7 +25,8 @@ def start_master_node():
 
     master_node = MasterNode(MulticastServer(master_node_config.discovery.ip, master_node_config.discovery.port),
                              UdpServer(master_node_config.config.ip, master_node_config.config.port),
-                             local_node_client_repository, local_setting_repository)
+                             local_node_client_repository, local_setting_repository,
+                             pull_address=master_node_config.pull.ip, pull_port=master_node_config.pull.port)
     master_node.start()
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 from communication.nodes import ServiceNode
-from communication.udp_connection import UdpClient
+from communication.unix_connection import create_local_client
 from node_config import get_service_node_config
 
 def start_local_node():
@@ -8,7 +8,7 @@ def start_local_node():
     :return:
     """
     service_node_config = get_service_node_config("../../config.json")
-    udp_client = UdpClient(service_node_config.slave.ip, service_node_config.slave.port)
+    udp_client = create_local_client(service_node_config.slave.ip, service_node_config.slave.port, service_node_config.slave.transport)
     service_node = ServiceNode(udp_client)
     service_node.start()
 
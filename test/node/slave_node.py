@@ -1,6 +1,6 @@
 from communication.multicast_connection import MulticastClient
 from communication.nodes import SlaveNode
-from communication.udp_connection import UdpServer
+from communication.unix_connection import create_local_server
 from node_config import get_slave_node_config
 
 udp_client_address = "127.0.0.1"
@@ -13,7 +13,7 @@ def start_slave_node():
     """
     slave_node_config = get_slave_node_config("../../config.json")
     master_address = (slave_node_config.master.ip, slave_node_config.master.port) if slave_node_config.master.ip else None
-    udp_server = UdpServer(slave_node_config.config.ip, slave_node_config.config.port)
+    udp_server = create_local_server(slave_node_config.config.ip, slave_node_config.config.port, slave_node_config.config.transport)
     slave_node = SlaveNode(MulticastClient(slave_node_config.register.ip, slave_node_config.register.port), udp_server, master_address)
     slave_node.start()
 
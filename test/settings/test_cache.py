@@ -0,0 +1,150 @@
+"""
+从节点配置缓存测试
+"""
+import json
+import os
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from communication.message import MessageType
+from communication.multicast_connection import MulticastClient
+from communication.nodes import SlaveNode
+from communication.udp_connection import UdpServer
+from settings.cache import ConfigurationCache
+from settings.repository import LocalSettingRepository
+from settings.setting import SettingVersion, SettingVersionType
+
+
+def versions(**kwargs):
+    return [SettingVersion(name, version, SettingVersionType.SECTION) for name, version in kwargs.items()]
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class ConfigurationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.__store_dir.name, "slave", "cache.json")
+
+    def tearDown(self):
+        self.__store_dir.cleanup()
+
+    def loaded(self, expected: bool = True) -> ConfigurationCache:
+        cache = ConfigurationCache(self.path)
+        self.assertEqual(cache.load(), expected)
+        return cache
+
+    @staticmethod
+    def version_map(cache: ConfigurationCache):
+        return {setting_version.name: setting_version.version for setting_version in cache.setting_versions}
+
+    def test_round_trip(self):
+        cache = ConfigurationCache(self.path)
+        cache.update(versions(a="1", b="1", c="1"))
+        cache.advance("epoch", 3)
+        cache.update(versions(b="2"), removed_names=["c"])
+        restored = self.loaded()
+        self.assertEqual(restored.epoch, "epoch")
+        self.assertEqual(restored.revision, 3)
+        self.assertEqual(self.version_map(restored), {"a": "1", "b": "2"})
+        restored.update(versions(d="1"), complete=True)
+        self.assertEqual(self.version_map(self.loaded()), {"d": "1"})
+        # 临时文件已替换为缓存文件
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["cache.json"])
+
+    def test_failed_write_keeps_previous_cache(self):
+        cache = ConfigurationCache(self.path)
+        cache.update(versions(a="1"))
+        cache.advance("epoch", 1)
+        with mock.patch("settings.cache.os.replace", side_effect=OSError("disk full")), self.assertLogs(level="WARNING"):
+            cache.advance("epoch", 2)
+        self.assertEqual(cache.revision, 2)
+        restored = self.loaded()
+        self.assertEqual(restored.revision, 1)
+        self.assertEqual(self.version_map(restored), {"a": "1"})
+
+    def test_missing_cache_is_cold_start(self):
+        cache = self.loaded(False)
+        self.assertIsNone(cache.epoch)
+        self.assertEqual(cache.revision, 0)
+        self.assertEqual(cache.setting_versions, [])
+
+    def test_corrupt_cache_is_cold_start(self):
+        os.makedirs(os.path.dirname(self.path))
+        for content in ['{"epoch": "epoch", "revision": 3, "vers', '["epoch"]', '{"epoch": "epoch", "revision": "x"}', "\xff\xfe"]:
+            with open(self.path, "w", encoding="latin-1") as f:
+                f.write(content)
+            with self.assertLogs(level="WARNING"):
+                cache = self.loaded(False)
+            self.assertIsNone(cache.epoch)
+            self.assertEqual(cache.revision, 0)
+            self.assertEqual(cache.setting_versions, [])
+
+
+class SlaveCacheTest(unittest.TestCase):
+    """
+    从节点重启时从缓存恢复修订号并在握手时携带
+    """
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.__store_dir.name, "cache.json")
+        self.multicast_client = MulticastClient("224.0.0.1", free_port())
+        self.node = SlaveNode(self.multicast_client, UdpServer("127.0.0.1", free_port()), None,
+                              setting_repository=LocalSettingRepository(store_dir_path=self.__store_dir.name),
+                              snapshot_path=os.path.join(self.__store_dir.name, "config.snapshot"), cache_path=self.cache_path)
+        self.handshakes = []
+        patcher = mock.patch.object(self.multicast_client, "broadcast", side_effect=self.handshakes.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.node.close()
+        self.__store_dir.cleanup()
+
+    def start(self):
+        # 只恢复缓存，不启动接收与发送线程
+        with mock.patch.object(SlaveNode, "_run"):
+            self.node.start()
+        # 等待后台与本地配置的比较完成
+        self.node._SlaveNode__pull_executor.submit(lambda: None).result(5)
+        self.node._handshake_or_heartbeat()
+        self.assertEqual(self.handshakes[-1].message_type, MessageType.HANDSHAKE_REQUEST)
+        return self.handshakes[-1].message_content
+
+    def test_restored_revision_is_sent_in_handshake(self):
+        cache = ConfigurationCache(self.cache_path)
+        cache.update(versions(a="1"))
+        cache.advance("epoch", 7)
+        content = self.start()
+        self.assertEqual((content["epoch"], content["revision"]), ("epoch", 7))
+        self.assertEqual(self.node.applied_revision, 7)
+
+    def test_corrupt_cache_handshakes_without_revision(self):
+        with open(self.cache_path, "w") as f:
+            json.dump(["epoch", 7], f)
+        with self.assertLogs(level="WARNING"):
+            content = self.start()
+        self.assertNotIn("epoch", content)
+        self.assertNotIn("revision", content)
+        self.assertEqual(self.node.applied_revision, 0)
+
+    def test_missing_cache_handshakes_without_revision(self):
+        content = self.start()
+        self.assertNotIn("revision", content)
+        self.assertEqual(self.node.applied_revision, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
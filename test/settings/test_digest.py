@@ -0,0 +1,54 @@
+"""
+配置版本摘要树测试
+"""
+import unittest
+
+from settings.digest import DEPTH, VersionDigest, bucket_of
+from settings.setting import SettingVersion, SettingVersionType
+
+
+def versions(**kwargs):
+    return [SettingVersion(name, version, SettingVersionType.SECTION) for name, version in kwargs.items()]
+
+
+class VersionDigestTest(unittest.TestCase):
+
+    def test_changed(self):
+        digest = VersionDigest(versions(a="1", b="1", c="1"))
+        changed = digest.changed(versions(a="1", b="2", d="1"))
+        self.assertEqual([setting_version.name for setting_version in changed], ["b", "d"])
+        self.assertEqual(digest.changed(versions(a="1", c="1")), [])
+
+    def test_changed_after_update_and_remove(self):
+        digest = VersionDigest(versions(a="1", b="1"))
+        digest.update(versions(b="2"))
+        digest.remove(["a"])
+        self.assertEqual([setting_version.name for setting_version in digest.changed(versions(a="1", b="2"))], ["a"])
+        digest.update(versions(c="1"), complete=True)
+        self.assertEqual([setting_version.name for setting_version in digest.changed(versions(b="2", c="1"))], ["b"])
+
+    def test_root_depends_only_on_versions(self):
+        digest = VersionDigest(versions(a="1", b="1"))
+        other = VersionDigest(versions(b="1"))
+        self.assertNotEqual(digest.root, other.root)
+        other.update(versions(a="1"))
+        self.assertEqual(digest.root, other.root)
+        other.update(versions(a="2"))
+        self.assertNotEqual(digest.root, other.root)
+        other.update(versions(a="1"))
+        self.assertEqual(digest.root, other.root)
+
+    def test_descend_to_differing_bucket(self):
+        master = VersionDigest(versions(**{f"module{i}": "1" for i in range(100)}))
+        slave = VersionDigest(versions(**{f"module{i}": "1" for i in range(100)}))
+        slave.update(versions(module7="2"))
+        nodes = [(0, 0)]
+        for _ in range(DEPTH):
+            nodes = slave.differing(master.children(nodes))
+            self.assertEqual(len(nodes), 1)
+        self.assertEqual(nodes[0], (DEPTH, bucket_of("module7")))
+        self.assertEqual(master.bucket_versions([nodes[0][1]])[nodes[0][1]]["module7"], "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
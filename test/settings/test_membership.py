@@ -0,0 +1,54 @@
+"""
+子节点成员索引测试
+"""
+import tempfile
+import unittest
+
+from settings.membership import MembershipIndex
+from settings.repository import LocalNodeClientRepository
+
+
+class MembershipIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        self.repository = LocalNodeClientRepository(store_dir_path=self.__store_dir.name)
+
+    def tearDown(self):
+        self.__store_dir.cleanup()
+
+    def test_address_and_network(self):
+        self.repository.save_node("10.10.0.231")
+        self.repository.save_node("10.20.0.0/16")
+        self.repository.save_node("fd00::/64")
+        index = MembershipIndex(self.repository)
+        self.assertTrue(index.contains("10.10.0.231"))
+        self.assertFalse(index.contains("10.10.0.232"))
+        self.assertTrue(index.contains("10.20.3.4"))
+        self.assertTrue(index.contains("fd00::1"))
+        self.assertFalse(index.contains("fd01::1"))
+        self.assertFalse(index.contains("not an address"))
+
+    def test_record_without_ip_uses_record_id(self):
+        self.repository.save({"name": "node-1"}, "10.10.0.5")
+        self.repository.save(True, "10.10.0.6")
+        self.repository.save({}, "10.10.0.7")
+        self.repository.save({"name": "node-2"}, "invalid")
+        with self.assertLogs(level="WARNING") as logs:
+            index = MembershipIndex(self.repository)
+        self.assertTrue(index.contains("10.10.0.5"))
+        self.assertTrue(index.contains("10.10.0.6"))
+        self.assertFalse(index.contains("10.10.0.7"))
+        self.assertEqual(len(logs.records), 2)
+
+    def test_reload_after_save_and_delete(self):
+        index = MembershipIndex(self.repository)
+        self.assertFalse(index.contains("10.10.0.8"))
+        self.repository.save_node("10.10.0.8")
+        self.assertTrue(index.contains("10.10.0.8"))
+        self.repository.delete("10.10.0.8")
+        self.assertFalse(index.contains("10.10.0.8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+配置修订号测试
+"""
+import unittest
+
+from settings.revision import RevisionIndex
+from settings.setting import SettingVersion, SettingVersionType
+
+
+def versions(**kwargs):
+    return [SettingVersion(name, version, SettingVersionType.SECTION) for name, version in kwargs.items()]
+
+
+def names(setting_versions):
+    return [setting_version.name for setting_version in setting_versions]
+
+
+class RevisionIndexTest(unittest.TestCase):
+
+    def test_changes_since(self):
+        index = RevisionIndex()
+        self.assertEqual(names(index.update(versions(a="1", b="1", c="1"))), ["a", "b", "c"])
+        self.assertEqual(index.revision, 3)
+        self.assertEqual(names(index.update(versions(a="2", b="1"))), ["a"])
+        self.assertEqual(index.revision, 4)
+        self.assertEqual(names(index.changes_since(0)), ["b", "c", "a"])
+        self.assertEqual(names(index.changes_since(2)), ["c", "a"])
+        self.assertEqual(index.changes_since(4), [])
+
+    def test_complete_update_and_remove(self):
+        index = RevisionIndex()
+        index.update(versions(a="1", b="1", c="1"))
+        index.update(versions(a="1", c="2"), complete=True)
+        self.assertEqual(names(index.get_all()), ["a", "c"])
+        index.remove(["a"])
+        self.assertEqual(names(index.get_all()), ["c"])
+        self.assertEqual(names(index.changes_since(0)), ["c"])
+        self.assertEqual(index.revision, 4)
+
+    def test_epoch_rollover(self):
+        index = RevisionIndex()
+        index.update(versions(a="1", b="1", c="1"))
+        epoch, revision = index.epoch, index.revision
+        # 主节点重启后纪元变化，修订号重新从0开始
+        restarted = RevisionIndex()
+        self.assertNotEqual(restarted.epoch, epoch)
+        self.assertEqual(restarted.revision, 0)
+        restarted.update(versions(a="2"))
+        # 旧纪元的修订号在新纪元中没有意义：按修订号查询会漏掉变化，需要比较纪元后下发全部配置版本
+        self.assertEqual(restarted.changes_since(revision), [])
+        self.assertEqual(names(restarted.get_all()), ["a"])
+        self.assertEqual(index.epoch, epoch)
+
+
+if __name__ == "__main__":
+    unittest.main()
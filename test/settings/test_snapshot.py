@@ -0,0 +1,116 @@
+"""
+共享内存配置快照测试
+"""
+import os
+import struct
+import tempfile
+import unittest
+
+from settings.setting import SettingSection
+from settings.snapshot import HEADER, SnapshotReader, SnapshotWriter
+
+
+def sections(version: str, count: int = 3, description: str = None):
+    return {f"module{index}": SettingSection(f"section{index}", {}, f"module{index}", version, description) for index in range(count)}
+
+
+def to_dicts(setting_sections):
+    return {module_name: setting_section.to_dict() for module_name, setting_section in setting_sections.items()}
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.__directory.name, "snapshot", "config.snapshot")
+        self.writer = SnapshotWriter(self.path)
+        self.reader = SnapshotReader(self.path, max_retries=5)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+        self.__directory.cleanup()
+
+    def set_sequence(self, sequence: int):
+        """
+        直接修改文件头中的序列号，模拟写入方写入中途
+        :param sequence:
+        :return:
+        """
+        with open(self.path, "r+b") as f:
+            f.seek(8)
+            f.write(struct.pack("<Q", sequence))
+
+    def test_round_trip(self):
+        self.assertEqual(self.reader.read(), (0, {}))
+        generation = self.writer.publish(sections("v1"))
+        self.assertEqual(generation, 1)
+        self.assertEqual(self.reader.generation, 1)
+        read_generation, read_sections = self.reader.read()
+        self.assertEqual(read_generation, 1)
+        self.assertEqual(to_dicts(read_sections), to_dicts(sections("v1")))
+        # 代数未变化时返回同一结果
+        self.assertIs(self.reader.read()[1], read_sections)
+        self.writer.publish(sections("v2", 2))
+        read_generation, read_sections = self.reader.read()
+        self.assertEqual(read_generation, 2)
+        self.assertEqual(to_dicts(read_sections), to_dicts(sections("v2", 2)))
+
+    def test_file_growth_remaps_reader(self):
+        self.writer.publish(sections("v1"))
+        self.reader.read()
+        size = os.path.getsize(self.path)
+        large = sections("v2", 50, "x" * 4096)
+        self.assertEqual(self.writer.publish(large), 2)
+        self.assertGreater(os.path.getsize(self.path), size)
+        read_generation, read_sections = self.reader.read()
+        self.assertEqual(read_generation, 2)
+        self.assertEqual(to_dicts(read_sections), to_dicts(large))
+
+    def test_generation_persists_across_writer_restart(self):
+        self.writer.publish(sections("v1"))
+        self.writer.publish(sections("v2"))
+        self.writer.close()
+        # 从节点重启期间快照保留
+        self.assertEqual(self.reader.read()[0], 2)
+        self.writer = SnapshotWriter(self.path)
+        self.assertEqual(self.writer.generation, 2)
+        self.assertEqual(self.reader.read()[0], 2)
+        self.assertEqual(self.writer.publish(sections("v3")), 3)
+        read_generation, read_sections = self.reader.read()
+        self.assertEqual(read_generation, 3)
+        self.assertEqual(to_dicts(read_sections), to_dicts(sections("v3")))
+
+    def test_odd_sequence_falls_back_to_last_read(self):
+        self.writer.publish(sections("v1"))
+        self.reader.read()
+        self.writer.publish(sections("v2"))
+        self.writer.close()
+        # 写入方在写入中途退出，序列号停留在奇数
+        self.set_sequence(5)
+        read_generation, read_sections = self.reader.read()
+        self.assertEqual(read_generation, 1)
+        self.assertEqual(to_dicts(read_sections), to_dicts(sections("v1")))
+        # 新的读取方没有读取成功过的配置
+        fresh_reader = SnapshotReader(self.path, max_retries=5)
+        self.assertEqual(fresh_reader.read(), (0, {}))
+        fresh_reader.close()
+        # 写入方重启后恢复为偶数并继续发布
+        self.writer = SnapshotWriter(self.path)
+        self.assertEqual(self.writer.publish(sections("v3")), 3)
+        with open(self.path, "rb") as f:
+            self.assertEqual(HEADER.unpack(f.read(HEADER.size))[3] % 2, 0)
+        self.assertEqual(self.reader.read()[0], 3)
+
+    def test_invalid_file_is_ignored(self):
+        path = os.path.join(os.path.dirname(self.path), "invalid.snapshot")
+        with open(path, "wb") as f:
+            f.write(b"not a snapshot" * 10)
+        reader = SnapshotReader(path)
+        self.assertEqual(reader.generation, 0)
+        self.assertEqual(reader.read(), (0, {}))
+        self.assertEqual(SnapshotReader(os.path.join(os.path.dirname(self.path), "missing")).read(), (0, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
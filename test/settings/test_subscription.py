@@ -0,0 +1,159 @@
+"""
+模块订阅索引测试
+"""
+import socket
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from communication.message import MessagePackage, MessageType
+from communication.multicast_connection import MulticastServer
+from communication.nodes import MasterNode
+from communication.udp_connection import UdpServer
+from settings.digest import VersionDigest
+from settings.repository import LocalNodeClientRepository, LocalSettingRepository
+from settings.setting import SettingVersion, SettingVersionType
+from settings.subscription import SubscriptionIndex
+
+
+def versions(**kwargs):
+    return [SettingVersion(name, version, SettingVersionType.SECTION) for name, version in kwargs.items()]
+
+
+def free_port() -> int:
+    """
+    获取一个空闲的UDP端口
+    :return:
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+class SubscriptionIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.setting_versions = versions(a="1", b="1", c="1")
+        self.index = SubscriptionIndex()
+
+    def subscribe(self, key, modules, multicast=False):
+        self.index.subscribe(key, (key, 20001), modules, lambda: self.setting_versions, multicast)
+
+    def test_fan_out_uses_inverted_index(self):
+        self.subscribe("10.0.0.1", ["a"])
+        self.subscribe("10.0.0.2", ["a", "b"])
+        self.subscribe("10.0.0.3", ["b", "a"])
+        self.subscribe("10.0.0.4", ["c"])
+        self.assertEqual(len(self.index), 4)
+        groups = self.index.fan_out(["b"])
+        self.assertEqual(set(groups), {frozenset(["a", "b"])})
+        self.assertEqual(sorted(groups[frozenset(["a", "b"])]), [("10.0.0.2", 20001), ("10.0.0.3", 20001)])
+        self.assertEqual(set(self.index.fan_out(["a"])), {frozenset(["a"]), frozenset(["a", "b"])})
+        self.assertEqual(self.index.fan_out(["d"]), {})
+
+    def test_wildcard_subscribers_receive_all_modules(self):
+        self.subscribe("10.0.0.1", None)
+        self.subscribe("10.0.0.2", ["a"])
+        self.assertIsNone(self.index.subscription("10.0.0.1"))
+        self.assertEqual(self.index.fan_out(["d"]), {None: [("10.0.0.1", 20001)]})
+        self.assertEqual(set(self.index.fan_out(["a"])), {None, frozenset(["a"])})
+        self.assertEqual(set(self.index.groups()), {None, frozenset(["a"])})
+
+    def test_unicast_only_excludes_multicast_subscribers(self):
+        self.subscribe("10.0.0.1", ["a"], multicast=True)
+        self.subscribe("10.0.0.2", ["a"])
+        self.assertEqual(self.index.fan_out(["a"], unicast_only=True), {frozenset(["a"]): [("10.0.0.2", 20001)]})
+        self.assertEqual(len(self.index.fan_out(["a"])[frozenset(["a"])]), 2)
+
+    def test_digest_per_subscription(self):
+        self.subscribe("10.0.0.1", ["a", "b"])
+        self.subscribe("10.0.0.2", ["b", "a"])
+        self.subscribe("10.0.0.3", None)
+        digest = self.index.digest(frozenset(["a", "b"]))
+        # 相同模块集合共享摘要树，摘要树只包含订阅的模块
+        self.assertEqual(digest.root, VersionDigest(versions(a="1", b="1")).root)
+        self.assertIsNone(self.index.digest(None))
+        self.assertIsNone(self.index.digest(frozenset(["c"])))
+        self.index.update(versions(b="2", c="2"))
+        self.assertEqual(digest.root, VersionDigest(versions(a="1", b="2")).root)
+        self.index.update([], removed_names=["a", "c"])
+        self.assertEqual(digest.root, VersionDigest(versions(b="2")).root)
+        self.index.update(versions(a="3"), complete=True)
+        self.assertEqual(digest.root, VersionDigest(versions(a="3")).root)
+
+    def test_unsubscribe_removes_index_entries(self):
+        self.subscribe("10.0.0.1", ["a", "b"])
+        self.subscribe("10.0.0.2", ["a", "b"])
+        self.subscribe("10.0.0.3", None)
+        digest = self.index.digest(frozenset(["a", "b"]))
+        self.index.unsubscribe("10.0.0.1")
+        # 模块集合仍有订阅者时保留摘要树
+        self.assertIs(self.index.digest(frozenset(["a", "b"])), digest)
+        self.index.unsubscribe("10.0.0.2")
+        self.index.unsubscribe("10.0.0.3")
+        self.index.unsubscribe("10.0.0.4")
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.digest(frozenset(["a", "b"])))
+        self.assertEqual(self.index.fan_out(["a", "b"]), {})
+        self.assertEqual(self.index._SubscriptionIndex__subscribers, {})
+
+    def test_subscribe_again_replaces_subscription(self):
+        self.subscribe("10.0.0.1", ["a"], multicast=True)
+        self.index.subscribe("10.0.0.1", ("10.0.0.1", 20002), ["b"], lambda: self.setting_versions)
+        self.assertEqual(len(self.index), 1)
+        self.assertFalse(self.index.is_subscribed("10.0.0.1", ("10.0.0.1", 20001)))
+        self.assertTrue(self.index.is_subscribed("10.0.0.1", ("10.0.0.1", 20002)))
+        self.assertEqual(self.index.subscription("10.0.0.1"), frozenset(["b"]))
+        self.assertEqual(self.index.fan_out(["a"]), {})
+        self.assertIsNone(self.index.digest(frozenset(["a"])))
+        self.assertEqual(self.index.fan_out(["b"], unicast_only=True), {frozenset(["b"]): [("10.0.0.1", 20002)]})
+
+
+class MasterSubscriptionTest(unittest.TestCase):
+    """
+    主节点在子节点心跳超时或被释放时移除订阅
+    """
+
+    def setUp(self):
+        self.__store_dir = tempfile.TemporaryDirectory()
+        node_client_repository = LocalNodeClientRepository(store_dir_path=self.__store_dir.name)
+        node_client_repository.save_node("127.0.0.0/8")
+        self.multicast_server = MulticastServer("224.0.0.1", free_port())
+        self.udp_server = UdpServer("0.0.0.0", free_port())
+        self.node = MasterNode(self.multicast_server, self.udp_server, node_client_repository,
+                               LocalSettingRepository(store_dir_path=self.__store_dir.name), tcp_server=None,
+                               handshake_window=0, heartbeat_timeout=5)
+        self.subscriptions = self.node._MasterNode__subscriptions
+
+    def tearDown(self):
+        self.multicast_server.close()
+        self.udp_server.close()
+        self.__store_dir.cleanup()
+
+    def handshake(self, address, modules):
+        self.node._handle_multicast_message(MessagePackage(MessageType.HANDSHAKE_REQUEST, {"modules": modules}, sender="slave"),
+                                            address)
+
+    def test_expired_client_node_is_unsubscribed(self):
+        self.handshake(("127.0.0.2", 20001), ["a"])
+        self.handshake(("127.0.0.3", 20001), None)
+        self.assertEqual(len(self.subscriptions), 2)
+        with mock.patch("communication.timing_wheel.time.monotonic", return_value=time.monotonic() + 10):
+            self.node._expire_connections()
+        self.assertEqual(len(self.subscriptions), 0)
+        self.assertEqual(self.subscriptions.fan_out(["a"]), {})
+
+    def test_released_client_node_is_unsubscribed(self):
+        self.handshake(("127.0.0.2", 20001), ["a"])
+        self.assertTrue(self.subscriptions.is_subscribed("127.0.0.2", ("127.0.0.2", 20001)))
+        # 更换端口后未重新握手的子节点被释放
+        with self.assertLogs(level="INFO") as logs:
+            self.node._handle_multicast_message(MessagePackage(MessageType.HEARTBEAT_REQUEST, {}, sender="slave"), ("127.0.0.2", 20002))
+        self.assertTrue(any("handshake" in output for output in logs.output))
+        self.assertEqual(len(self.subscriptions), 0)
+        self.assertIsNone(self.subscriptions.digest(frozenset(["a"])))
+
+
+if __name__ == "__main__":
+    unittest.main()